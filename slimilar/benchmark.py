@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准脚本 v1.0
+功能：
+  1. 对比预处理新旧实现的单文档耗时
+  2. 对比各阶段脚本分词器启动耗时（传统加载 vs 预构建状态）
+  3. 近重复检测：LSH 相对精确余弦的召回率与吞吐量
+  4. 倒排索引 Top-K 检索延迟（对比全矩阵暴力计算，并校验结果一致）；另在 Zipf 分布词表的合成语料上测量
+用法：python benchmark.py（默认使用 preprocess.py 配置区中的初稿/终稿）
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import tempfile
+import subprocess
+import jieba
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from typing import Callable, List, Set, Tuple
+
+import preprocess
+import near_duplicate
+import similarity
+import retrieval_index
+from tfidf_io import save_tfidf_npz
+from text_pairs_io import read_text_pairs
+
+# ================= 配置区 =================
+BENCH_FILES = [preprocess.DRAFT_PATH, preprocess.FINAL_PATH]
+BENCH_REPEAT = 5  # 每个实现重复次数，取平均
+STARTUP_SCRIPTS = {  # 模块名: 分词器初始化函数
+    'preprocess': 'ensure_segmenter',
+    'pos_analysis': 'init_segmenter',
+    '初级主题词典代码': 'init_segmenter'
+}
+STARTUP_REPEAT = 3
+NEAR_DUP_SETTINGS = {
+    'input_path': near_duplicate.INPUT_PATH,  # 取其中的 *_clean 词列作为基础文档
+    'n_docs': 20000,  # 基础文档不足时从词表随机抽词补足（长度与基础文档相同）
+    'dup_ratio': 0.1,  # 其中多少比例再生成一份近重复副本
+    'mutate_ratio': 0.05,  # 副本中被随机替换的词比例
+    'cos_threshold': 0.8,  # 精确余弦（shingle 二值向量）不低于该值视为真实重复对
+    'seed': 0
+}
+RETRIEVAL_QUERIES = 50  # 从已建索引的文档中随机抽取的查询数
+ZIPF_CORPUS_SETTINGS = {  # 合成语料：词频服从 Zipf 分布，高频词的倒排链接近全体文档
+    'n_docs': 200000,
+    'n_terms': 50000,
+    'doc_length': 60,  # 每篇抽取的词数（含重复）
+    'exponent': 1.2,
+    'seed': 0
+}
+# =========================================
+
+
+def legacy_process_file(file_path: str, stopwords: Set[str]) -> Tuple[str, str]:
+    """旧版 process_file 的等价实现（两次读取 + 两次清洗 + 两次分词），仅作基准对照"""
+    raw_text = ""
+    for _ in range(2):
+        for encoding in ['utf-8', 'gbk']:
+            try:
+                with open(file_path, 'r', encoding=encoding) as f:
+                    raw_text = f.read()
+                break
+            except UnicodeDecodeError:
+                continue
+        cleaned_text = re.sub(r"[^\u4e00-\u9fa5a-zA-Z]", " ", raw_text)
+        cleaned_text = re.sub(r'\b\d+\b', ' ', cleaned_text)
+        words = jieba.lcut(cleaned_text)
+        filtered = [w.strip() for w in words
+                    if w.strip()
+                    and len(w.strip()) > 1
+                    and w not in stopwords
+                    and not w.isdigit()]
+    return raw_text, " ".join(filtered)
+
+
+def time_per_doc(func: Callable, files: List[str], stopwords: Set[str], repeat: int) -> float:
+    """返回单文档平均耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            func(path, stopwords)
+    return (time.perf_counter() - start) / (repeat * len(files))
+
+
+def bench_process_file(files: List[str] = None, repeat: int = BENCH_REPEAT) -> dict:
+    """对比新旧 process_file 的单文档耗时，并校验两者输出一致"""
+    files = [f for f in (files or BENCH_FILES) if os.path.exists(f)]
+    if not files:
+        print("⚠️ 基准文件不存在，请检查 BENCH_FILES 配置")
+        return {}
+
+    preprocess.ensure_segmenter()
+    stopwords = preprocess.load_stopwords(preprocess.STOPWORDS_PATH)
+
+    # 结果一致性校验
+    for path in files:
+        if legacy_process_file(path, stopwords)[1] != preprocess.process_file(path, stopwords)[1]:
+            print(f"⚠️ 新旧实现输出不一致：{os.path.basename(path)}")
+
+    legacy = time_per_doc(legacy_process_file, files, stopwords, repeat)
+    current = time_per_doc(preprocess.process_file, files, stopwords, repeat)
+
+    print("\n" + "=" * 30 + " process_file 基准 " + "=" * 30)
+    print(f"文档数：{len(files)} | 重复次数：{repeat}")
+    print(f"旧版单文档耗时：{legacy * 1000:.1f} ms")
+    print(f"新版单文档耗时：{current * 1000:.1f} ms")
+    print(f"加速比：{legacy / current:.2f}x")
+    return {'legacy': legacy, 'current': current, 'speedup': legacy / current}
+
+
+def _startup_once(module: str, init_func: str, prebuilt: bool) -> float:
+    """在全新解释器中导入模块并初始化分词器，返回分词器初始化耗时（秒）"""
+    code = (
+        "import time, {m} as m\n"
+        "m.SEGMENTER_SETTINGS['prebuilt'] = {p}\n"
+        "t = time.perf_counter()\n"
+        "m.{f}()\n"
+        "print('ELAPSED', time.perf_counter() - t)\n"
+    ).format(m=module, f=init_func, p=prebuilt)
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, encoding='utf-8', check=True
+    )
+    line = [l for l in result.stdout.splitlines() if l.startswith('ELAPSED')][-1]
+    return float(line.split()[1])
+
+
+def bench_startup(repeat: int = STARTUP_REPEAT) -> dict:
+    """各阶段脚本分词器启动耗时：传统 initialize+load_userdict vs 预构建状态"""
+    results = {}
+    print("\n" + "=" * 30 + " 分词器启动基准 " + "=" * 30)
+    for module, init_func in STARTUP_SCRIPTS.items():
+        _startup_once(module, init_func, True)  # 预热：确保预构建文件已生成
+        legacy = min(_startup_once(module, init_func, False) for _ in range(repeat))
+        prebuilt = min(_startup_once(module, init_func, True) for _ in range(repeat))
+        results[module] = {'legacy': legacy, 'prebuilt': prebuilt}
+        print(f"{module}.py | 传统加载：{legacy:.2f}s | 预构建：{prebuilt:.2f}s | "
+              f"加速比：{legacy / max(prebuilt, 1e-6):.1f}x")
+    return results
+
+
+def _near_dup_corpus(settings: dict) -> List[str]:
+    """基础文档 + 随机改写的近重复副本"""
+    rng = random.Random(settings['seed'])
+    df = read_text_pairs(settings['input_path'], columns=near_duplicate.LSH_SETTINGS['columns'])
+    base = [t.split() for col in df.columns for t in df[col].fillna("") if t.split()]
+    vocab = sorted({w for tokens in base for w in tokens})
+    docs = base[:settings['n_docs']]
+    docs += [rng.choices(vocab, k=len(base[i % len(base)])) for i in range(len(docs), settings['n_docs'])]
+    for i in rng.sample(range(len(docs)), int(len(docs) * settings['dup_ratio'])):
+        docs.append([rng.choice(vocab) if rng.random() < settings['mutate_ratio'] else w for w in docs[i]])
+    return [" ".join(tokens) for tokens in docs]
+
+
+def _exact_pairs(texts: List[str], shingle_size: int, cos_threshold: float) -> Set[Tuple[int, int]]:
+    """精确基线：shingle 二值向量的分块余弦，返回相似度不低于阈值的文档对"""
+    vectorizer = CountVectorizer(token_pattern=r'\S+', ngram_range=(shingle_size, shingle_size),
+                                 binary=True, lowercase=False)
+    matrix = similarity.prepare_matrix(vectorizer.fit_transform(texts))
+    pairs, start = set(), 0
+    for block in similarity.iter_blocks(matrix, 'full'):
+        rows, cols = np.nonzero(np.triu(block >= cos_threshold, k=start + 1))
+        pairs.update(zip((rows + start).tolist(), cols.tolist()))
+        start += block.shape[0]
+    return pairs
+
+
+def bench_near_duplicate(settings: dict = None) -> dict:
+    """LSH 近重复检测 vs 精确余弦：真实重复对的召回率与每秒处理文档数"""
+    settings = {**NEAR_DUP_SETTINGS, **(settings or {})}
+    if not os.path.exists(settings['input_path']):
+        print("⚠️ text_pairs 文件不存在，请检查 NEAR_DUP_SETTINGS 配置")
+        return {}
+    texts = _near_dup_corpus(settings)
+    lsh_settings = near_duplicate.LSH_SETTINGS
+
+    start = time.perf_counter()
+    exact = _exact_pairs(texts, lsh_settings['shingle_size'], settings['cos_threshold'])
+    exact_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        index = near_duplicate.NearDuplicateIndex(index_dir)
+        index.add([str(i) for i in range(len(texts))], texts)
+        # 等长集合下 Jaccard = cos / (2 - cos)，按同一标准取簇
+        clusters = index.clusters(settings['cos_threshold'] / (2 - settings['cos_threshold']))
+        lsh_time = time.perf_counter() - start
+
+    label = {int(key): cid for cid, members in enumerate(clusters) for key in members}
+    found = sum(1 for i, j in exact if i in label and label.get(i) == label.get(j))
+    recall = found / len(exact) if exact else 1.0
+
+    print("\n" + "=" * 30 + " 近重复检测基准 " + "=" * 30)
+    print(f"文档数：{len(texts)} | 真实重复对（余弦 ≥ {settings['cos_threshold']}）：{len(exact)}")
+    print(f"精确余弦：{exact_time:.2f}s（{len(texts) / exact_time:.0f} 篇/秒）")
+    print(f"MinHash LSH：{lsh_time:.2f}s（{len(texts) / lsh_time:.0f} 篇/秒）| 簇数：{len(clusters)}")
+    print(f"召回率：{recall:.3f}")
+    return {'exact': exact_time, 'lsh': lsh_time, 'recall': recall, 'pairs': len(exact)}
+
+
+def _time_retrieval(index, title: str, n_queries: int, k: int) -> dict:
+    """查询取自索引内文档，逐条对比倒排索引与暴力 X·q 的耗时和结果"""
+    rng = np.random.RandomState(0)
+    index_times, brute_times = [], []
+    for doc in rng.randint(0, index.n_docs, n_queries):
+        query = index.forward[doc]
+        start = time.perf_counter()
+        hits = index.search_vector(query, k)
+        index_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scores = (index.forward @ query.T).toarray().ravel()
+        expected = np.sort(scores[np.argpartition(-scores, k - 1)[:k]])[::-1]
+        brute_times.append(time.perf_counter() - start)
+        if not np.allclose([s for _, s in hits], expected[expected > 0]):
+            print(f"⚠️ 检索结果与暴力计算不一致：文档 {doc}")
+
+    print("\n" + "=" * 30 + f" {title} " + "=" * 30)
+    print(f"索引文档数：{index.n_docs} | 查询数：{n_queries} | k = {k}")
+    print(f"倒排索引：中位 {np.median(index_times) * 1000:.1f} ms | P90 {np.percentile(index_times, 90) * 1000:.1f} ms")
+    print(f"暴力计算：中位 {np.median(brute_times) * 1000:.1f} ms")
+    return {'index': float(np.median(index_times)), 'brute': float(np.median(brute_times))}
+
+
+def bench_retrieval(n_queries: int = RETRIEVAL_QUERIES, k: int = 10) -> dict:
+    """倒排索引精确 Top-K 与暴力 X·q 的单次查询延迟（使用已建好的索引）"""
+    if not os.path.exists(os.path.join(retrieval_index.INDEX_DIR, "meta.json")):
+        print("⚠️ 倒排索引不存在，请先运行 python retrieval_index.py build")
+        return {}
+    return _time_retrieval(retrieval_index.load_index(), "Top-K 检索基准", n_queries, k)
+
+
+def bench_retrieval_zipf(settings: dict = None, n_queries: int = RETRIEVAL_QUERIES, k: int = 10) -> dict:
+    """在 Zipf 分布词表的合成 TF-IDF 语料上重建索引并测量检索延迟（高频词链很长，是剪枝最不利的情形）"""
+    settings = {**ZIPF_CORPUS_SETTINGS, **(settings or {})}
+    rng = np.random.RandomState(settings['seed'])
+    n_docs, n_terms, length = settings['n_docs'], settings['n_terms'], settings['doc_length']
+    terms = np.empty(0, dtype=np.int64)
+    while len(terms) < n_docs * length:
+        draw = rng.zipf(settings['exponent'], n_docs * length) - 1
+        terms = np.concatenate([terms, draw[draw < n_terms]])
+    rows = np.repeat(np.arange(n_docs), length)
+    counts = sp.csr_matrix((np.ones(n_docs * length), (rows, terms[:n_docs * length])), shape=(n_docs, n_terms))
+    matrix = TfidfTransformer(sublinear_tf=True).fit_transform(counts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        matrix_path = os.path.join(tmp, "tfidf_matrix.npz")
+        save_tfidf_npz(matrix_path, matrix, [f"doc{i}" for i in range(n_docs)], [f"t{j}" for j in range(n_terms)])
+        retrieval_index.build_index(matrix_path, os.path.join(tmp, "index"))
+        index = retrieval_index.RetrievalIndex(os.path.join(tmp, "index"), mmap=False)
+        return _time_retrieval(index, "Top-K 检索基准（Zipf 词表）", n_queries, k)
+
+
+if __name__ == "__main__":
+    bench_process_file()
+    bench_startup()
+    bench_near_duplicate()
+    bench_retrieval()
+    bench_retrieval_zipf()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+文档变更跟踪 v1.0
+功能：记录每个输入文件的 mtime/大小/内容哈希，判断哪些文档需要重新计算
+  - mtime 与大小均未变：直接视为未变化，不读文件
+  - 否则计算哈希，哈希相同只刷新 mtime（如 touch / 复制覆盖）
+状态文件为 JSON，meta 区供各阶段传递本轮变更信息（如 changed_doc_ids）
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, Optional
+
+
+def content_hash(path: str) -> str:
+    """文件内容 SHA-1"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DocumentState:
+    """输入文件指纹 + 阶段间元数据"""
+
+    def __init__(self, state_path: str):
+        self.state_path = state_path
+        self.files: Dict[str, dict] = {}
+        self.meta: Dict[str, object] = {}
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.files = data.get('files', {})
+                self.meta = data.get('meta', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 状态文件损坏，将全量重建：{str(e)}")
+
+    def is_changed(self, path: str) -> bool:
+        """判断文件相对上次记录是否变化，并刷新记录（调用 save() 后生效）"""
+        old = self.files.get(path)
+        old_digest = old.get('sha1') if old else None
+        digest = self.fingerprint(path)
+        return digest is None or old_digest != digest
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        """文件内容哈希（mtime 与大小未变时直接取记录值），文件不存在返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.files.pop(path, None)
+            return None
+        old = self.files.get(path)
+        if old and old['mtime'] == st.st_mtime and old['size'] == st.st_size:
+            return old['sha1']
+
+        digest = content_hash(path)
+        self.files[path] = {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': digest}
+        return digest
+
+    def forget(self, keep_paths) -> None:
+        """移除不再出现的文件记录"""
+        keep = set(keep_paths)
+        self.files = {p: v for p, v in self.files.items() if p in keep}
+
+    def save(self) -> None:
+        """原子写回状态文件"""
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files, 'meta': self.meta}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
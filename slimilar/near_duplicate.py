@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+近重复文档检测 v1.0（MinHash + 分带 LSH）
+功能：在 preprocess.py 输出的 *_clean 词序列上查找近重复文档，不经过 TF-IDF/全量余弦
+  - 词级 shingle：相邻 shingle_size 个词组成一个片段，哈希为 32 位整数（逐词哈希后向量化组合）
+  - MinHash 签名：num_perm 个 (a·x + b) mod p 置换的最小值，签名一致比例即 Jaccard 估计
+  - 分带 LSH：签名切成 bands 段，任一段完全相同的文档成为候选对，再用签名估计 Jaccard 复核
+  - 持久化：签名与文本摘要存为 .npz，再次运行只为新增/变更文档计算签名（增量添加）
+  - 输出：Jaccard 不低于阈值的候选重复簇（连通分量）
+用法：python near_duplicate.py
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from text_pairs_io import read_text_pairs
+
+# ================= 配置区 =================
+INPUT_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.parquet"
+INDEX_DIR = r"D:\SASanalysis\SAS_text\python_SAS\output_neardup\lsh_index"
+OUTPUT_FILE = r"D:\SASanalysis\SAS_text\python_SAS\output_neardup\near_duplicate_clusters.csv"
+
+LSH_SETTINGS = {
+    'shingle_size': 2,  # 每个片段的词数（短于该长度的文档按单词处理）
+    'num_perm': 128,  # 签名长度
+    'bands': 32,  # 分带数，每带 num_perm / bands 行；阈值约为 (1/bands)^(bands/num_perm)
+    'seed': 42,  # 置换参数随机种子（改变后需重建索引）
+    'threshold': 0.8,  # 输出簇的 Jaccard 下限
+    'max_bucket': 200,  # 超过该大小的桶只与桶内首个文档比对，避免平方级候选对
+    'columns': ['draft_clean', 'final_clean'],  # 参与检测的词列
+    'prune_missing': True  # 本次输入中不存在的文档从索引中移除
+}
+# =========================================
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_EMPTY = np.uint32(0xFFFFFFFF)  # 空文档签名（不参与比对）
+
+
+def _permutations(num_perm, seed):
+    """置换参数 a, b（< 2^31，保证 a·x + b 不溢出 uint64）"""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+class NearDuplicateIndex:
+    """MinHash 签名 + 分带 LSH 索引（可持久化、可增量添加）"""
+
+    def __init__(self, index_dir, settings=None):
+        self.index_dir = index_dir
+        self.settings = {**LSH_SETTINGS, **(settings or {})}
+        num_perm, bands = self.settings['num_perm'], self.settings['bands']
+        if num_perm % bands:
+            raise ValueError(f"num_perm（{num_perm}）必须是 bands（{bands}）的整数倍")
+        self.rows = num_perm // bands
+        self._a, self._b = _permutations(num_perm, self.settings['seed'])
+        self._band_weights = np.random.RandomState(self.settings['seed'] + 1).randint(
+            1, 1 << 62, size=self.rows, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+        self._token_hash = {}
+
+        self.keys = []
+        self.digests = np.empty(0, dtype='S16')
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._position = {}
+        self._band_index = None  # (每带排序后的哈希, 对应文档下标)，查询时惰性构建
+        self._load()
+
+    # ----------------- 持久化 -----------------
+    def _params(self):
+        return {k: self.settings[k] for k in ('shingle_size', 'num_perm', 'bands', 'seed')}
+
+    def _path(self):
+        return os.path.join(self.index_dir, "minhash_index.npz")
+
+    def _load(self):
+        path = self._path()
+        if not os.path.exists(path):
+            return
+        with np.load(path) as f:
+            if json.loads(str(f['params'])) != self._params():
+                print("⚠️ LSH参数与已保存索引不一致，将重建索引")
+                return
+            self.keys = f['keys'].tolist()
+            self.digests = f['digests']
+            self.signatures = f['signatures']
+        self._position = {key: i for i, key in enumerate(self.keys)}
+        print(f"✅ 已加载LSH索引：{len(self.keys)} 篇文档")
+
+    def save(self):
+        """原子写回索引文件"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = self._path() + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            keys=np.array(self.keys, dtype=str),
+            digests=self.digests,
+            signatures=self.signatures,
+            params=np.array(json.dumps(self._params()))
+        )
+        os.replace(tmp_path, self._path())
+
+    # ----------------- 签名计算 -----------------
+    def _hash_tokens(self, tokens):
+        cache = self._token_hash
+        hashes = [cache.get(t) for t in tokens]
+        for i, h in enumerate(hashes):
+            if h is None:
+                hashes[i] = cache[tokens[i]] = zlib.crc32(tokens[i].encode('utf-8'))
+        return np.array(hashes, dtype=np.uint64)
+
+    def shingles(self, text):
+        """空格拼接的词串 -> 去重后的 shingle 哈希数组"""
+        tokens = text.split() if isinstance(text, str) else []
+        if not tokens:
+            return np.empty(0, dtype=np.uint64)
+        token_hashes = self._hash_tokens(tokens)
+        k = min(self.settings['shingle_size'], len(tokens))
+        combined = np.zeros(len(tokens) - k + 1, dtype=np.uint64)
+        for offset in range(k):  # 多项式组合相邻词哈希，截断为 32 位
+            combined = (combined * np.uint64(1000003) + token_hashes[offset:len(tokens) - k + 1 + offset]) & _MAX_HASH
+        return np.unique(combined)
+
+    def compute_signatures(self, texts, chunk_shingles=1 << 16):
+        """批量计算 MinHash 签名：所有文档的 shingle 拼接后分段置换，按文档 reduceat 取最小值
+
+        空文档的签名为全 _EMPTY，不参与比对。
+        """
+        num_perm = self.settings['num_perm']
+        result = np.full((len(texts), num_perm), _EMPTY, dtype=np.uint32)
+        shingle_sets = [self.shingles(t) for t in texts]
+        docs = [i for i, values in enumerate(shingle_sets) if len(values)]
+        start = 0
+        while start < len(docs):
+            # 每段累计约 chunk_shingles 个 shingle，控制 num_perm × 段长 的中间矩阵大小
+            end, total = start, 0
+            while end < len(docs) and (total == 0 or total + len(shingle_sets[docs[end]]) <= chunk_shingles):
+                total += len(shingle_sets[docs[end]])
+                end += 1
+            batch = docs[start:end]
+            values = np.concatenate([shingle_sets[i] for i in batch])
+            offsets = np.r_[0, np.cumsum([len(shingle_sets[i]) for i in batch])[:-1]]
+            permuted = ((values[None, :] * self._a[:, None] + self._b[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+            minimum = np.minimum.reduceat(permuted, offsets, axis=1).T
+            result[batch] = np.minimum(minimum, _MAX_HASH - np.uint64(1)).astype(np.uint32)
+            start = end
+        return result
+
+    def signature(self, text):
+        """单篇文档的 MinHash 签名"""
+        return self.compute_signatures([text])[0]
+
+    # ----------------- 增量添加 -----------------
+    @staticmethod
+    def text_digest(text):
+        return hashlib.sha1((text or "").encode('utf-8')).hexdigest()[:16].encode('ascii')
+
+    def add(self, keys, texts):
+        """添加/更新文档，只为新增或内容变化的文档计算签名；返回实际计算的文档数"""
+        changed, seen = {}, set()
+        for key, text in zip(keys, texts):
+            digest = self.text_digest(text)
+            i = self._position.get(key)
+            if key in seen or (i is not None and self.digests[i] == digest):
+                continue
+            seen.add(key)
+            changed[key] = (digest, text)
+        if not changed:
+            return 0
+
+        signatures = self.compute_signatures([text for _, text in changed.values()])
+        new_rows, new_digests = [], []
+        for row, (key, (digest, _)) in enumerate(changed.items()):
+            i = self._position.get(key)
+            if i is not None:
+                self.digests[i] = digest
+                self.signatures[i] = signatures[row]
+            else:
+                self._position[key] = len(self.keys)
+                self.keys.append(key)
+                new_rows.append(row)
+                new_digests.append(digest)
+        if new_rows:
+            self.digests = np.concatenate([self.digests, np.array(new_digests, dtype='S16')])
+            self.signatures = np.vstack([self.signatures, signatures[new_rows]])
+        self._band_index = None
+        return len(changed)
+
+    def remove_missing(self, keep_keys):
+        """移除不在 keep_keys 中的文档，返回移除数量"""
+        keep_keys = set(keep_keys)
+        keep = np.array([key in keep_keys for key in self.keys], dtype=bool)
+        removed = int((~keep).sum())
+        if removed:
+            self.keys = [key for key, k in zip(self.keys, keep) if k]
+            self.digests = self.digests[keep]
+            self.signatures = self.signatures[keep]
+            self._position = {key: i for i, key in enumerate(self.keys)}
+            self._band_index = None
+        return removed
+
+    # ----------------- 查询 -----------------
+    def _band_hashes(self, signatures):
+        """每带签名 -> 64 位带哈希，形状 (文档数, bands)"""
+        blocks = signatures.astype(np.uint64).reshape(len(signatures), self.settings['bands'], self.rows)
+        return (blocks * self._band_weights).sum(axis=2)
+
+    def _ensure_band_index(self):
+        if self._band_index is None:
+            hashes = self._band_hashes(self.signatures)
+            order = np.argsort(hashes, axis=0, kind='stable')
+            self._band_index = (np.take_along_axis(hashes, order, axis=0), order)
+        return self._band_index
+
+    def _valid(self):
+        return self.signatures[:, 0] != _EMPTY if len(self.keys) else np.empty(0, dtype=bool)
+
+    def query(self, text, threshold=None):
+        """查找与一篇文档近重复的已索引文档，返回 [(key, 估计Jaccard)]（降序）"""
+        threshold = self.settings['threshold'] if threshold is None else threshold
+        signature = self.signature(text)
+        if signature[0] == _EMPTY or not self.keys:
+            return []
+        sorted_hashes, order = self._ensure_band_index()
+        query_hashes = self._band_hashes(signature[None, :])[0]
+        candidates = set()
+        for band, h in enumerate(query_hashes):
+            column = sorted_hashes[:, band]
+            lo, hi = np.searchsorted(column, h, side='left'), np.searchsorted(column, h, side='right')
+            candidates.update(order[lo:hi, band].tolist())
+        if not candidates:
+            return []
+        candidates = np.array(sorted(candidates))
+        scores = (self.signatures[candidates] == signature).mean(axis=1)
+        hits = [(self.keys[i], float(s)) for i, s in zip(candidates, scores) if s >= threshold]
+        return sorted(hits, key=lambda x: -x[1])
+
+    def candidate_pairs(self):
+        """所有带中落入同一桶的文档对（去重后的 (i, j) 数组，i < j）"""
+        sorted_hashes, order = self._ensure_band_index()
+        valid = self._valid()
+        firsts, seconds = [], []
+        for band in range(self.settings['bands']):
+            members = order[:, band][valid[order[:, band]]]
+            hashes = sorted_hashes[:, band][valid[order[:, band]]]
+            if len(hashes) < 2:
+                continue
+            starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]])
+            sizes = np.diff(np.r_[starts, len(hashes)])
+            bucket_start = np.repeat(starts, sizes)
+            big = np.repeat(sizes > self.settings['max_bucket'], sizes)
+
+            # 超大桶：只与桶内首个文档配对
+            star = np.flatnonzero(big & (np.arange(len(hashes)) != bucket_start))
+            firsts.append(members[bucket_start[star]])
+            seconds.append(members[star])
+            # 普通桶：已排序，相距 d 且哈希相同即同桶，逐个距离向量化生成全部组合
+            for d in range(1, min(int(sizes.max()), self.settings['max_bucket'])):
+                same = np.flatnonzero((hashes[d:] == hashes[:-d]) & ~big[:-d])
+                if len(same) == 0:
+                    break
+                firsts.append(members[same])
+                seconds.append(members[same + d])
+        if not firsts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        pairs = np.unique(np.sort(np.column_stack([np.concatenate(firsts), np.concatenate(seconds)]), axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+    def clusters(self, threshold=None, chunk=100000):
+        """估计 Jaccard 不低于阈值的候选对组成的连通分量，返回 [[key, ...], ...]（按簇大小降序）"""
+        threshold = self.settings['threshold'] if threshold is None else threshold
+        first, second = self.candidate_pairs()
+        keep = np.zeros(len(first), dtype=bool)
+        for start in range(0, len(first), chunk):
+            a, b = first[start:start + chunk], second[start:start + chunk]
+            keep[start:start + chunk] = (self.signatures[a] == self.signatures[b]).mean(axis=1) >= threshold
+        n = len(self.keys)
+        graph = sp.coo_matrix((np.ones(int(keep.sum())), (first[keep], second[keep])), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        sizes = np.bincount(labels)
+        groups = {}
+        for i in np.flatnonzero(sizes[labels] > 1):
+            groups.setdefault(labels[i], []).append(self.keys[i])
+        return sorted(groups.values(), key=len, reverse=True)
+
+
+def build_documents(df, columns):
+    """text_pairs -> (文档键 doc_id:列前缀, 词串)"""
+    keys, texts = [], []
+    for col in columns:
+        suffix = col.replace('_clean', '')
+        keys.extend(f"{d}:{suffix}" for d in df['doc_id'].astype(str))
+        texts.extend(df[col].fillna("").tolist())
+    return keys, texts
+
+
+def write_clusters(clusters, output_path):
+    """写出重复簇：cluster_id, size, doc_key"""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    rows = [(cid, len(members), key) for cid, members in enumerate(clusters, 1) for key in members]
+    pd.DataFrame(rows, columns=['cluster_id', 'size', 'doc_key']).to_csv(
+        output_path, index=False, encoding='utf_8_sig')
+
+
+def main():
+    try:
+        print("[1/3] 读取输入文件...")
+        settings = LSH_SETTINGS
+        df = read_text_pairs(INPUT_PATH, columns=['doc_id'] + settings['columns'])
+        keys, texts = build_documents(df, settings['columns'])
+
+        print("[2/3] 更新LSH索引...")
+        index = NearDuplicateIndex(INDEX_DIR, settings)
+        removed = index.remove_missing(keys) if settings['prune_missing'] else 0
+        updated = index.add(keys, texts)
+        if updated or removed:
+            index.save()
+        print(f"✅ 索引文档 {len(index.keys)} 篇（新增/更新 {updated} | 移除 {removed}）")
+
+        print("[3/3] 查找近重复簇...")
+        clusters = index.clusters()
+        write_clusters(clusters, OUTPUT_FILE)
+        print(f"✅ 发现 {len(clusters)} 个近重复簇（Jaccard ≥ {settings['threshold']}）：{OUTPUT_FILE}")
+
+    except Exception as e:
+        print(f"\n❌ 错误：{str(e)}")
+        print("应急处理：")
+        print("1. 确认已运行 preprocess.py 生成 text_pairs")
+        print("2. 修改 LSH_SETTINGS 中签名参数后索引会自动重建")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+在线哈希 TF-IDF 向量器 v1.0
+功能：面向持续流入的语料，按小批量消费文档，内存与语料规模无关
+  - 特征哈希：词 -> murmurhash3 % n_features（与 sklearn HashingVectorizer 的桶号一致），无需预先建立词表
+  - 文档频率：每个桶一个累计计数器，每个小批量先更新 DF 再按当前 IDF 加权（IDF 随批次演进）
+  - 桶-词对照表：每个桶只保留一个代表词（加权多数投票，固定内存），用于把桶号还原为可读特征名
+  - 状态（DF、文档数、对照表）可保存为 .npz，持续流式场景下可跨运行继续累计；
+    同时记录本次输出矩阵各列对应的桶号，供可视化按列取回特征词
+"""
+
+import os
+import json
+import numpy as np
+import scipy.sparse as sp
+from collections import Counter
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+
+def _bucket(term, n_features):
+    """与 sklearn FeatureHasher 相同的桶号计算"""
+    h = murmurhash3_32(term, seed=0)
+    if h == -2147483648:
+        return (2147483647 - (n_features - 1)) % n_features
+    return abs(h) % n_features
+
+
+class OnlineTfidfVectorizer:
+    """哈希 TF-IDF：partial_fit_transform 逐批更新 DF 并输出加权矩阵"""
+
+    def __init__(self, n_features=2 ** 18, token_pattern=r'(?u)\b\w+\b', lowercase=True, norm='l2'):
+        self.n_features = n_features
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self.norm = norm
+        self._analyzer = CountVectorizer(token_pattern=token_pattern, lowercase=lowercase).build_analyzer()
+        self.n_docs = 0
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.bucket_terms = np.full(n_features, "", dtype=object)  # 每个桶的代表词
+        self.bucket_counts = np.zeros(n_features, dtype=np.int64)  # 代表词的投票余量
+
+    # ----------------- 核心计算 -----------------
+    def _count(self, texts):
+        """一个批量的词频矩阵（CSR，桶号为列）与本批次各词出现次数"""
+        buckets, term_counts = {}, Counter()
+        indptr, indices = [0], []
+        for text in texts:
+            tokens = self._analyzer(text if isinstance(text, str) else "")
+            term_counts.update(tokens)
+            for token in tokens:
+                b = buckets.get(token)
+                if b is None:
+                    b = buckets[token] = _bucket(token, self.n_features)
+                indices.append(b)
+            indptr.append(len(indices))
+        matrix = sp.csr_matrix(
+            (np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, self.n_features)
+        )
+        matrix.sum_duplicates()
+        return matrix, term_counts, buckets
+
+    def _update_terms(self, term_counts, buckets):
+        """桶-词对照表更新：同一桶内保留出现次数占多数的词（Misra-Gries，k=1）"""
+        terms, counts = self.bucket_terms, self.bucket_counts
+        for term, c in term_counts.items():
+            b = buckets[term]
+            if terms[b] == term:
+                counts[b] += c
+            elif counts[b] > c:
+                counts[b] -= c
+            else:
+                terms[b], counts[b] = term, c - counts[b]
+
+    @property
+    def idf(self):
+        """平滑 IDF（与 TfidfVectorizer(smooth_idf=True) 公式一致）"""
+        return np.log((1 + self.n_docs) / (1 + self.df)) + 1
+
+    def _weight(self, counts):
+        matrix = sp.csr_matrix(counts.multiply(self.idf[None, :]))
+        return normalize(matrix, norm=self.norm, copy=False) if self.norm else matrix
+
+    def partial_fit(self, texts):
+        """用一个批量更新文档频率与对照表"""
+        self.partial_fit_transform(texts)
+        return self
+
+    def partial_fit_transform(self, texts):
+        """先用本批次更新 DF，再按更新后的 IDF 输出本批次的 TF-IDF（CSR）"""
+        counts, term_counts, buckets = self._count(texts)
+        self.n_docs += counts.shape[0]
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self._update_terms(term_counts, buckets)
+        return self._weight(counts)
+
+    def transform(self, texts):
+        """只按当前 IDF 转换，不更新状态"""
+        return self._weight(self._count(texts)[0])
+
+    def feature_names(self):
+        """各桶的可读名称：代表词，未出现过的桶为 #桶号"""
+        return [term or f"#{b}" for b, term in enumerate(self.bucket_terms)]
+
+    # ----------------- 持久化 -----------------
+    def _params(self):
+        return {'n_features': self.n_features, 'token_pattern': self.token_pattern,
+                'lowercase': self.lowercase, 'norm': self.norm}
+
+    def save(self, path, used_buckets=None):
+        """原子保存状态；used_buckets 为输出矩阵各列对应的桶号（矩阵只保留用到的桶）"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            df=self.df,
+            n_docs=np.array(self.n_docs),
+            bucket_terms=self.bucket_terms.astype(str),
+            bucket_counts=self.bucket_counts,
+            params=np.array(json.dumps(self._params(), ensure_ascii=False)),
+            used_buckets=np.asarray(used_buckets if used_buckets is not None else [], dtype=np.int64)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取 save() 保存的状态"""
+        with np.load(path) as f:
+            vectorizer = cls(**json.loads(str(f['params'])))
+            vectorizer.df = f['df']
+            vectorizer.n_docs = int(f['n_docs'])
+            vectorizer.bucket_terms = f['bucket_terms'].astype(object)
+            vectorizer.bucket_counts = f['bucket_counts']
+        return vectorizer
+
+
+def load_term_labels(path):
+    """按状态文件记录的已用桶号返回输出矩阵各列的可读名称；未记录桶号（旧版状态文件）时返回 None"""
+    with np.load(path) as f:
+        if 'used_buckets' not in f.files:
+            return None
+        terms, used = f['bucket_terms'].tolist(), f['used_buckets'].tolist()
+    return [terms[b] or f"#{b}" for b in used]
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+流水线依赖图 v1.0
+功能：把流水线各阶段声明为有向无环图（DAG），按内容哈希判断是否需要重跑（类似 make）
+  - 阶段声明：name / script / inputs / outputs，输入输出可以是产物名（如 text_pairs）或文件、目录路径
+  - 依赖关系由“谁产出该产物”自动推出，按拓扑顺序执行
+  - 阶段签名 = 脚本（含其递归导入的同目录模块）与所有输入的内容哈希；签名与上次成功运行一致且输出齐全时跳过
+  - 上游重跑但产物内容未变（哈希相同）时，下游同样跳过
+  - 文件哈希按 mtime/大小缓存（doc_state.DocumentState），未改动的大文件不重复读取
+"""
+
+import os
+import ast
+import json
+import hashlib
+from collections import defaultdict
+from doc_state import DocumentState
+
+
+_IMPORT_CACHE = {}  # (路径, mtime, 大小) -> 导入的顶层模块名
+
+
+def _imported_modules(path):
+    """源码中 import / from ... import 的顶层模块名（含函数内的延迟导入）"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return []
+    key = (path, st.st_mtime, st.st_size)
+    if key not in _IMPORT_CACHE:
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (SyntaxError, ValueError):
+            tree = ast.Module(body=[], type_ignores=[])  # 无法解析时只哈希脚本本身
+        names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names.add(node.module.split('.')[0])
+        _IMPORT_CACHE[key] = sorted(names)
+    return _IMPORT_CACHE[key]
+
+
+def local_imports(script):
+    """脚本递归导入的、与脚本同目录的模块文件（如 建模.py -> text_pairs_io.py、tfidf_io.py ...）"""
+    directory = os.path.dirname(script)
+    found, stack = [], [script]
+    while stack:
+        for module in _imported_modules(stack.pop()):
+            path = os.path.join(directory, module + ".py")
+            if path != script and path not in found and os.path.exists(path):
+                found.append(path)
+                stack.append(path)
+    return sorted(found)
+
+
+class PipelineGraph:
+    """阶段依赖图：解析产物路径、生产者与拓扑顺序"""
+
+    def __init__(self, stages, artifacts):
+        self.stages = {stage['name']: stage for stage in stages}
+        self.artifacts = artifacts
+        self.producers = {}
+        for stage in stages:
+            for output in stage.get('outputs', []):
+                if output in self.producers:
+                    raise ValueError(f"产物 {output} 同时由 {self.producers[output]} 与 {stage['name']} 产出")
+                self.producers[output] = stage['name']
+        self.order = self._topological_order([stage['name'] for stage in stages])
+
+    def resolve(self, name):
+        """产物名 -> 路径；本身就是路径时原样返回"""
+        return self.artifacts.get(name, name)
+
+    def upstream(self, name):
+        """直接上游阶段"""
+        inputs = self.stages[name].get('inputs', [])
+        return sorted({self.producers[i] for i in inputs if i in self.producers})
+
+    def _topological_order(self, names):
+        """Kahn 算法；同层保持声明顺序"""
+        indegree = {name: len(self.upstream(name)) for name in names}
+        children = defaultdict(list)
+        for name in names:
+            for parent in self.upstream(name):
+                children[parent].append(name)
+        order, ready = [], [name for name in names if indegree[name] == 0]
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for child in children[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        if len(order) != len(names):
+            cycle = [name for name in names if name not in order]
+            raise ValueError(f"阶段依赖存在环：{', '.join(cycle)}")
+        return order
+
+    def code_paths(self, name):
+        """阶段代码：脚本本身、其导入的同目录模块及额外声明的 'code'（如脚本读取的 SAS 宏文件）"""
+        stage = self.stages[name]
+        paths = [stage['script']] + list(stage.get('code', [])) + local_imports(stage['script'])
+        return list(dict.fromkeys(paths))
+
+    def input_paths(self, name):
+        return [self.resolve(i) for i in self.stages[name].get('inputs', [])]
+
+    def output_paths(self, name):
+        return [self.resolve(o) for o in self.stages[name].get('outputs', [])]
+
+
+class BuildState:
+    """各阶段上次成功运行的签名（存于 DocumentState.meta['stages']）"""
+
+    def __init__(self, state_path):
+        self.state = DocumentState(state_path)
+        self.signatures = self.state.meta.setdefault('stages', {})
+
+    def path_digest(self, path):
+        """文件取内容哈希；目录取其下全部文件（相对路径 + 哈希）的组合哈希；不存在返回 None"""
+        if not os.path.isdir(path):
+            return self.state.fingerprint(path)
+        h = hashlib.sha1()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                h.update(os.path.relpath(file_path, path).encode('utf-8'))
+                h.update((self.state.fingerprint(file_path) or "").encode('ascii'))
+        return h.hexdigest()
+
+    def signature(self, graph, name):
+        """脚本与输入的内容哈希汇总"""
+        digests = {
+            'code': {p: self.path_digest(p) for p in graph.code_paths(name)},
+            'inputs': {p: self.path_digest(p) for p in graph.input_paths(name)}
+        }
+        return hashlib.sha1(json.dumps(digests, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def is_current(self, graph, name, signature=None):
+        """输出齐全且签名与上次成功运行一致"""
+        if not all(os.path.exists(p) for p in graph.output_paths(name)):
+            return False
+        return self.signatures.get(name) == (signature or self.signature(graph, name))
+
+    def record(self, graph, name, signature):
+        """阶段成功后记录签名，并刷新输出的哈希缓存
+        signature 须在阶段开始前计算：执行期间被修改的输入不能算作已处理，下一轮仍会重跑"""
+        self.signatures[name] = signature
+        for path in graph.output_paths(name):
+            self.path_digest(path)
+        self.state.save()
+
+    def forget(self, name):
+        self.signatures.pop(name, None)
+        self.state.save()
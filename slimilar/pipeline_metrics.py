@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+流水线阶段指标 v1.0
+功能：记录每个阶段与每轮运行的耗时、CPU 时间、峰值内存与吞吐量，用于定位随语料增长而变慢的阶段
+  - 墙钟时间 / CPU 时间（本进程 + 子进程，含 SAS、进程池等）/ 峰值 RSS（后台线程采样本进程与子进程之和）
+  - 吞吐量：文档/秒、词/秒（工作量取自阶段的 text_pairs 或 TF-IDF 矩阵）
+  - 导出：JSON Lines（每个阶段、每轮运行追加一行）与 Prometheus 文本格式（每轮覆盖写出，供本地采集器读取）
+峰值内存依赖 psutil；未安装时退回进程生命周期峰值（仅 POSIX），Windows 上记为空
+阶段并行执行时，CPU 时间与峰值内存按整个进程统计，时间上重叠的阶段会相互计入（为上界）；墙钟时间与吞吐量不受影响
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _cpu_seconds():
+    """本进程 + 已回收子进程的 CPU 时间"""
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+def _lifetime_peak_rss():
+    """无 psutil 时的退路：进程生命周期内的峰值（Linux 单位为 KB）"""
+    if resource is None:
+        return None
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(self_peak, child_peak) * 1024
+
+
+class ResourceSampler(threading.Thread):
+    """定时采样本进程与全部子进程的 RSS（取峰值）及子进程 CPU 时间"""
+
+    def __init__(self, interval=0.1):
+        super().__init__(name="metrics-sampler", daemon=True)
+        self.interval = interval
+        self.peak_rss = 0
+        self.children_cpu = {}  # pid -> 最近一次采样的 CPU 时间
+        self._stop_event = threading.Event()
+        self._process = psutil.Process() if psutil is not None else None
+
+    def sample(self):
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+                cpu = child.cpu_times()
+                self.children_cpu[child.pid] = cpu.user + cpu.system
+            except psutil.Error:  # 采样间隙中退出
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+class StageMetrics:
+    """一个阶段的测量结果；docs / tokens 由调用方在阶段完成后填入"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.status = 'ok'
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_bytes = None
+        self.docs = None
+        self.tokens = None
+
+    def summary(self):
+        """单行摘要，供控制台输出"""
+        parts = [f"耗时 {self.wall_seconds:.2f}s", f"CPU {self.cpu_seconds:.2f}s"]
+        if self.peak_rss_bytes is not None:
+            parts.append(f"峰值内存 {self.peak_rss_bytes / 2 ** 20:.0f}MB")
+        if self.docs is not None:
+            parts.append(f"{self.rate(self.docs):.1f} 文档/秒")
+        if self.tokens is not None:
+            parts.append(f"{self.rate(self.tokens):.0f} 词/秒")
+        return " | ".join(parts)
+
+    def rate(self, count):
+        return round(count / self.wall_seconds, 3) if count is not None and self.wall_seconds > 0 else None
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'status': self.status,
+            'wall_seconds': round(self.wall_seconds, 4),
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'docs': self.docs,
+            'tokens': self.tokens,
+            'docs_per_sec': self.rate(self.docs),
+            'tokens_per_sec': self.rate(self.tokens)
+        }
+
+
+class MetricsRecorder:
+    """按轮次收集阶段指标并导出；begin_run -> stage()/skip() -> finish_run"""
+
+    def __init__(self, jsonl_path, prom_path, sample_interval=0.1, prefix="slimilar"):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.sample_interval = sample_interval
+        self.prefix = prefix
+        self.latest = {}  # 阶段 -> 最近一次实际执行的指标（跳过的阶段在 Prometheus 中保留上次的值）
+        self.run = None
+        self._lock = threading.Lock()  # 并行阶段在各自线程中记录
+
+    def begin_run(self):
+        self.run = {
+            'run_id': time.strftime('%Y%m%d-%H%M%S'),
+            'wall_start': time.perf_counter(),
+            'stages': [],
+            'skipped': []
+        }
+
+    @contextmanager
+    def stage(self, name):
+        """测量一个阶段；阶段抛出异常时记为 failed 并继续抛出"""
+        metrics = StageMetrics(name)
+        sampler = ResourceSampler(self.sample_interval) if psutil is not None else None
+        if sampler is not None:
+            sampler.start()
+        self_cpu, child_cpu = _cpu_seconds()
+        start = time.perf_counter()
+        try:
+            yield metrics
+        except BaseException:
+            metrics.status = 'failed'
+            raise
+        finally:
+            metrics.wall_seconds = time.perf_counter() - start
+            self_end, child_end = _cpu_seconds()
+            children = child_end - child_cpu
+            if sampler is not None:
+                sampler.stop()
+                children = max(children, sum(sampler.children_cpu.values()))  # Windows 不统计已回收子进程
+                metrics.peak_rss_bytes = sampler.peak_rss
+            else:
+                metrics.peak_rss_bytes = _lifetime_peak_rss()
+            metrics.cpu_seconds = (self_end - self_cpu) + children
+            self._record_stage(metrics)
+
+    def skip(self, name):
+        with self._lock:
+            if self.run is not None:
+                self.run['skipped'].append(name)
+                self._append({'type': 'stage', 'run_id': self.run['run_id'], 'timestamp': time.time(),
+                              'stage': name, 'status': 'skipped'})
+
+    def _record_stage(self, metrics):
+        with self._lock:
+            self.latest[metrics.stage] = (metrics, time.time())
+            if self.run is not None:
+                self.run['stages'].append(metrics)
+                record = {'type': 'stage', 'run_id': self.run['run_id'], 'timestamp': time.time()}
+                record.update(metrics.to_dict())
+                self._append(record)
+
+    def finish_run(self, status='ok'):
+        """写出本轮汇总（JSON Lines）并刷新 Prometheus 文件，返回汇总 dict"""
+        if self.run is None:
+            return None
+        run, self.run = self.run, None
+        stages = run['stages']
+        peaks = [m.peak_rss_bytes for m in stages if m.peak_rss_bytes is not None]
+        summary = {
+            'type': 'run',
+            'run_id': run['run_id'],
+            'timestamp': time.time(),
+            'status': status,
+            'wall_seconds': round(time.perf_counter() - run['wall_start'], 4),
+            'cpu_seconds': round(sum(m.cpu_seconds for m in stages), 4),
+            'peak_rss_bytes': max(peaks) if peaks else None,
+            'stages_executed': len(stages),
+            'stages_skipped': len(run['skipped']),
+            'docs': max((m.docs for m in stages if m.docs is not None), default=None),
+            'tokens': max((m.tokens for m in stages if m.tokens is not None), default=None)
+        }
+        self._append(summary)
+        self._write_prometheus(summary)
+        return summary
+
+    # ----------------- 导出 -----------------
+    def _append(self, record):
+        if not self.jsonl_path:
+            return
+        os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+        with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _write_prometheus(self, summary):
+        """Prometheus 文本格式（node_exporter textfile 方式），原子覆盖"""
+        if not self.prom_path:
+            return
+        p = self.prefix
+        families = [
+            (f"{p}_stage_wall_seconds", "阶段墙钟耗时（秒）", 'wall_seconds'),
+            (f"{p}_stage_cpu_seconds", "阶段 CPU 时间（秒，含子进程）", 'cpu_seconds'),
+            (f"{p}_stage_peak_rss_bytes", "阶段峰值常驻内存（字节，含子进程）", 'peak_rss_bytes'),
+            (f"{p}_stage_docs_per_second", "阶段吞吐量（文档/秒）", 'docs_per_sec'),
+            (f"{p}_stage_tokens_per_second", "阶段吞吐量（词/秒）", 'tokens_per_sec'),
+            (f"{p}_stage_success", "阶段最近一次执行是否成功", 'success'),
+            (f"{p}_stage_last_run_timestamp_seconds", "阶段最近一次执行的时间戳", 'timestamp')
+        ]
+        lines = []
+        for name, help_text, key in families:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for stage, (metrics, finished_at) in sorted(self.latest.items()):
+                values = metrics.to_dict()
+                values['success'] = int(metrics.status == 'ok')
+                values['timestamp'] = round(finished_at, 3)
+                if values[key] is not None:
+                    lines.append(f'{name}{{stage="{stage}"}} {values[key]}')
+
+        run_families = [
+            ('wall_seconds', "最近一轮运行墙钟耗时（秒）"),
+            ('cpu_seconds', "最近一轮运行 CPU 时间（秒，含子进程）"),
+            ('peak_rss_bytes', "最近一轮运行峰值常驻内存（字节）"),
+            ('stages_executed', "最近一轮实际执行的阶段数"),
+            ('stages_skipped', "最近一轮因未变化而跳过的阶段数")
+        ]
+        for key, help_text in run_families:
+            if summary[key] is not None:
+                name = f"{p}_run_{key}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {summary[key]}"]
+        lines += [f"# HELP {p}_run_success 最近一轮运行是否成功", f"# TYPE {p}_run_success gauge",
+                  f"{p}_run_success {int(summary['status'] == 'ok')}",
+                  f"# HELP {p}_run_timestamp_seconds 最近一轮运行结束时间戳", f"# TYPE {p}_run_timestamp_seconds gauge",
+                  f"{p}_run_timestamp_seconds {round(summary['timestamp'], 3)}"]
+
+        os.makedirs(os.path.dirname(self.prom_path) or ".", exist_ok=True)
+        tmp_path = self.prom_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
@@ -1,14 +1,28 @@
 # -*- coding: utf-8 -*-
 """
-自动化流水线监控服务 v1.1
+自动化流水线监控服务 v1.2
 更新：增加输出文件完整性检查
+v1.2：阶段按依赖图（pipeline_dag）调度，脚本与输入内容未变化的阶段直接跳过
+v1.3：文件事件进入队列，由后台线程防抖合并后运行；忽略流水线自身的输出；运行期间的变更最多合并为一次后续运行
+v1.4：Python 阶段默认在常驻进程内执行（stage_runner），依赖只导入一次，阶段间在内存中传递数据
+v1.5：每个阶段记录耗时、CPU、峰值内存与吞吐量，导出 JSON Lines 与 Prometheus 文本格式（pipeline_metrics）
+v1.6：无依赖关系的阶段在有界线程池中并行执行，各阶段输出分别写入独立日志；失败只阻断其下游
 """
 
 import os
 import time
+import queue
 import jieba
+import threading
+import traceback
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd  # 新增必要库导入
+from text_pairs_io import read_text_pairs, count_tokens
+from tfidf_io import load_tfidf_npz
+from pipeline_dag import PipelineGraph, BuildState
+from stage_runner import WarmStageRunner, capture_output
+from pipeline_metrics import MetricsRecorder
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
@@ -17,20 +31,147 @@ WATCH_DIRS = [
     r"D:\SASanalysis\SAS_text",
     r"D:\SASanalysis\SAS_text\python_SAS"
 ]
-RELOAD_DELAY = 5
-SCRIPTS_ORDER = [
-    r"D:\SASanalysis\SAS_text\python_SAS\preprocess.py",
-    r"D:\SASanalysis\SAS_text\tfidf_analysis3.py",
-    r"D:\SASanalysis\SAS_text\python_SAS\visualization.py",
-    r"D:\SASanalysis\SAS_run\cos_sim_3.sas"
+RELOAD_DELAY = 5  # 防抖：最后一次变更后静默这么多秒才开始运行
+
+WATCH_SETTINGS = {
+    'extensions': ('.txt', '.py', '.sas'),  # 触发运行的文件类型
+    'ignore_dirs': [  # 流水线自身写入的目录，其中的变更不触发运行
+        r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli",
+        r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1",
+        r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1",
+        r"D:\SASanalysis\SAS_text\python_SAS\output_wordnum",
+        r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua",
+        r"D:\SASanalysis\SAS_text\python_SAS\segmenter_cache",
+        r"D:\SASanalysis\SAS_text\python_SAS\cache_tokens",
+        r"D:\SASanalysis\SAS_text\python_SAS\paper_text_cache",
+        r"D:\SASanalysis\SAS_text\python_SAS\metrics",
+        r"D:\SASanalysis\SAS_text\python_SAS\logs"
+    ]
+}
+
+# 流水线产物（阶段之间传递的文件）
+PIPELINE_ARTIFACTS = {
+    'text_pairs': r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.parquet",
+    'tfidf_matrix': r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz",
+    'cos_sim_result': r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_result4.csv",
+    'cos_sim_paired': r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_paired.csv",
+    'pos_distribution': r"D:\SASanalysis\SAS_text\python_SAS\output_wordnum\pos_distribution.csv",
+    'combined_dict': r"D:\SASanalysis\SAS_text\combined_dict.txt"
+}
+
+# 阶段声明（DAG）：按 inputs/outputs 自动排序；脚本（含其导入的同目录模块）与输入内容均未变化且输出齐全时跳过
+PIPELINE_STAGES = [
+    {
+        'name': 'preprocess',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\preprocess.py",
+        'inputs': [
+            r"D:\SASanalysis\SAS_text\head.txt",
+            r"D:\SASanalysis\SAS_text\lastx_04.txt",
+            r"D:\SASanalysis\SAS_text\batch_input",  # 批量模式的成对文件目录
+            r"D:\SASanalysis\SAS_text\stopwords.txt",
+            r"D:\SASanalysis\SAS_text\comnew_dict.txt"
+        ],
+        'outputs': ['text_pairs'],
+        'workload': 'text_pairs'  # 吞吐量统计口径（见 METRICS_SETTINGS）
+    },
+    {
+        'name': 'dictionary',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\初级主题词典代码.py",
+        'inputs': [
+            r"D:\SASanalysis\SAS_text\dictionary_create",
+            r"D:\SASanalysis\SAS_text\sample_doc_v1.txt"
+        ],
+        'outputs': ['combined_dict', r"D:\SASanalysis\SAS_text\common_words.txt"]
+    },
+    {
+        'name': 'tfidf',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\建模.py",
+        'inputs': ['text_pairs'],
+        'outputs': ['tfidf_matrix'],
+        'workload': 'text_pairs'  # 吞吐量统计口径（见 METRICS_SETTINGS）
+    },
+    {
+        'name': 'similarity',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\similarity.py",  # 分块稀疏相似度；仍可换回 SAS_run\cos_sim_sparse.sas
+        'inputs': ['tfidf_matrix'],
+        'outputs': ['cos_sim_result'],
+        'workload': 'tfidf_matrix'  # 吞吐量统计口径（见 METRICS_SETTINGS）
+    },
+    {
+        'name': 'similarity_paired',  # 每个 doc_id 的初稿/终稿相似度（similarity.py paired 模式）
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\similarity.py",
+        'args': ['paired'],
+        'inputs': ['tfidf_matrix'],
+        'outputs': ['cos_sim_paired'],
+        'workload': 'tfidf_matrix'  # 吞吐量统计口径（见 METRICS_SETTINGS）
+    },
+    {
+        'name': 'pos_analysis',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\pos_analysis.py",
+        'inputs': [
+            r"D:\SASanalysis\SAS_text\sample_doc_v1.txt",
+            r"D:\SASanalysis\SAS_text\lsample_doc_v2.txt"
+        ],
+        'outputs': ['pos_distribution']
+    },
+    {
+        'name': 'feature_diff',  # 差异特征图（静态 + 交互）与差异词导出
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\visualization.py",
+        'args': ['diff'],
+        'inputs': ['tfidf_matrix'],
+        'outputs': [
+            r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua\feature_diff.png",
+            r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua\feature_diff.html",
+            r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua\top_diff_words.csv"
+        ],
+        'workload': 'tfidf_matrix'  # 吞吐量统计口径（见 METRICS_SETTINGS）
+    },
+    {
+        'name': 'heatmap',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\visualization.py",
+        'args': ['heatmap'],
+        'inputs': ['cos_sim_result'],
+        'outputs': [r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua\heatmap.png"]
+    },
+    {
+        'name': 'pos_radar',
+        'script': r"D:\SASanalysis\SAS_text\python_SAS\visualization.py",
+        'args': ['radar'],
+        'inputs': ['pos_distribution'],
+        'outputs': [r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua\radar_compare.png"]
+    }
 ]
+RUNNER_SETTINGS = {
+    'in_process': True  # True：常驻进程内直接调用各阶段（stage_runner）；False：每步启动新的解释器
+}
+PARALLEL_SETTINGS = {  # 无依赖关系的阶段并行执行
+    'workers': 3,  # 同时执行的阶段数上限，1 表示逐个执行
+    'log_dir': r"D:\SASanalysis\SAS_text\python_SAS\logs"  # 每个阶段的输出单独写入 <阶段名>.log
+}
+METRICS_SETTINGS = {  # 阶段指标（pipeline_metrics）
+    'enabled': True,
+    'jsonl_path': r"D:\SASanalysis\SAS_text\python_SAS\metrics\pipeline_metrics.jsonl",  # 每个阶段/每轮追加一行
+    'prom_path': r"D:\SASanalysis\SAS_text\python_SAS\metrics\pipeline_metrics.prom",  # Prometheus 文本格式，每轮覆盖
+    'sample_interval': 0.1,  # 峰值内存采样间隔（秒）
+    'count_tokens': True  # 统计词数（列式 text_pairs 只读列表长度，开销很小）
+}
+DAG_STATE_PATH = r"D:\SASanalysis\SAS_text\python_SAS\pipeline_dag_state.json"  # 各阶段上次成功运行的签名
 
 OUTPUT_FILES = [  # 新增输出文件配置
-    r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.csv",
-    r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.csv",
+    r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.parquet",
+    r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz",
     r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_result4.csv"
 ]
 OUTPUT_DICT = r"D:\SASanalysis\SAS_text\combined_dict.txt"  # 新增配置项
+
+INCREMENTAL_SETTINGS = {  # 增量模式：预处理/建模/相似度只重算变更文档
+    'full_rebuild': False,  # True 时每次运行前删除增量状态，全部阶段全量重算
+    'state_files': [
+        r"D:\SASanalysis\SAS_text\python_SAS\pipeline_state.json",
+        r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_rows.json",  # similarity.py 增量记录
+        DAG_STATE_PATH
+    ]  # 已保存的TF-IDF模型不在此列，重新拟合见 python 建模.py refit
+}
 # ================= 配置区 =================
 # ...（原有配置不变）
 
@@ -39,8 +180,8 @@ PREVIEW_SETTINGS = {  # 新增预览配置
     'max_columns': 5,            # 最大显示列数
     'sample_text_length': 100,   # 文本采样长度
     'target_files': {            # 指定需要预览的文件及其方式
-        r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.csv": 'text',
-        r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.csv": 'matrix',
+        r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.parquet": 'text',
+        r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz": 'matrix',
         r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_result4.csv": 'similarity'
     }
 }
@@ -52,14 +193,21 @@ def preview_file_content(file_path, preview_type):
         if not os.path.exists(file_path):
             return f"⚠️ 文件不存在: {os.path.basename(file_path)}"
 
-        # 统一使用pandas读取保障编码兼容性
-        df = pd.read_csv(file_path, encoding='utf_8_sig', nrows=PREVIEW_SETTINGS['preview_lines'])
-
         # 根据文件类型生成预览
         if preview_type == 'text':
+            # text_pairs 可能是列式文件，只读取需要的列和行
+            df = read_text_pairs(file_path, columns=['draft_clean'], nrows=PREVIEW_SETTINGS['preview_lines'])
             sample_text = df.iloc[0]['draft_clean'][:PREVIEW_SETTINGS['sample_text_length']]
             return f"文本样例: {sample_text}..."
-        elif preview_type == 'matrix':
+        if file_path.endswith('.npz'):
+            # 稀疏矩阵只稠密化预览用的前几行/列
+            bundle = load_tfidf_npz(file_path)
+            rows, cols = PREVIEW_SETTINGS['preview_lines'], PREVIEW_SETTINGS['max_columns']
+            df = pd.DataFrame(bundle.matrix[:rows, :cols].toarray(), columns=bundle.features[:cols])
+        else:
+            # 统一使用pandas读取保障编码兼容性
+            df = pd.read_csv(file_path, encoding='utf_8_sig', nrows=PREVIEW_SETTINGS['preview_lines'])
+        if preview_type == 'matrix':
             # 限制显示列数
             cols = df.columns[:PREVIEW_SETTINGS['max_columns']]
             return df[cols].head().to_string(index=False)
@@ -87,57 +235,247 @@ def check_output():
             print(f"• {os.path.basename(f)} | 最后更新：{mtime}")
 
 
+def reset_incremental_state():
+    """全量重建：删除增量状态文件"""
+    for path in INCREMENTAL_SETTINGS['state_files']:
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"🧹 已清除增量状态：{os.path.basename(path)}")
+
+
+def _norm_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def pipeline_output_paths():
+    """流水线自身产出的文件/目录（其变更不应再次触发运行）"""
+    graph = PipelineGraph(PIPELINE_STAGES, PIPELINE_ARTIFACTS)
+    paths = [p for name in graph.order for p in graph.output_paths(name)]
+    paths += OUTPUT_FILES + INCREMENTAL_SETTINGS['state_files'] + WATCH_SETTINGS['ignore_dirs']
+    return [_norm_path(p) for p in paths]
+
+
 class ReloadHandler(FileSystemEventHandler):
+    """监控回调只把变更路径放入队列，由后台线程防抖、合并后运行流水线"""
+
     def __init__(self):
         super().__init__()
-        self.last_trigger = 0
+        self.events = queue.Queue()
+        self.ignored = pipeline_output_paths()
+        self.worker = threading.Thread(target=self._worker_loop, name="pipeline-worker", daemon=True)
+        self.runner = WarmStageRunner() if RUNNER_SETTINGS['in_process'] else None
+        enabled = METRICS_SETTINGS['enabled']
+        self.metrics = MetricsRecorder(
+            METRICS_SETTINGS['jsonl_path'] if enabled else None,
+            METRICS_SETTINGS['prom_path'] if enabled else None,
+            METRICS_SETTINGS['sample_interval']
+        )
+        self._workloads = {}
+
+    def start(self):
+        if self.runner is not None:
+            self.runner.warm_up()
+        self.worker.start()
+
+    def stop(self):
+        self.events.put(None)
+        self.worker.join()
+
+    def is_ignored(self, path):
+        """流水线输出、状态文件、原子写入的临时文件"""
+        if '.tmp' in os.path.basename(path):
+            return True
+        path = _norm_path(path)
+        return any(path == p or path.startswith(p + os.sep) for p in self.ignored)
+
+    def enqueue(self, path):
+        if not path.lower().endswith(WATCH_SETTINGS['extensions']) or self.is_ignored(path):
+            return
+        self.events.put(path)
 
     def on_modified(self, event):
-        if time.time() - self.last_trigger < RELOAD_DELAY:
-            return
+        if not event.is_directory:
+            self.enqueue(event.src_path)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.enqueue(event.src_path)
 
-        if any(ext in event.src_path for ext in ['.txt', '.py', '.sas']):
-            print(f"\n🔍 检测到变更：{os.path.basename(event.src_path)}")
+    def on_moved(self, event):  # 编辑器“写临时文件再改名”的保存方式
+        if not event.is_directory:
+            self.enqueue(event.dest_path)
+
+    def _collect_burst(self, first):
+        """从第一个事件起持续收集，直到静默 RELOAD_DELAY 秒；返回 (变更路径集合, 是否收到停止信号)"""
+        changed = {first}
+        while True:
+            try:
+                path = self.events.get(timeout=RELOAD_DELAY)
+            except queue.Empty:
+                return changed, False
+            if path is None:
+                return changed, True
+            changed.add(path)
+
+    def _worker_loop(self):
+        """运行期间到达的事件留在队列中，运行结束后合并为一次后续运行"""
+        while True:
+            path = self.events.get()
+            if path is None:
+                return
+            changed, stopping = self._collect_burst(path)
+            names = sorted({os.path.basename(p) for p in changed})
+            print(f"\n🔍 检测到变更：{', '.join(names[:5])}{' 等' if len(names) > 5 else ''}（{len(changed)} 个文件）")
             self.run_pipeline()
-            self.last_trigger = time.time()
             check_output()  # 流程结束后检查
+            if stopping:
+                return
 
     def run_pipeline(self):
-        """执行全流程（版本1.1优化）"""
+        """按依赖图执行流水线：只运行脚本或输入内容有变化的阶段（版本1.2），
+        上游均已完成的阶段并行执行（版本1.6），逐阶段记录指标（版本1.5）"""
+        status = 'failed'
+        self.metrics.begin_run()
+        self._workloads = {}
         try:
-            # 前置检查
-            if not all(os.path.exists(f) for f in OUTPUT_FILES[:1]):
-                print("⏳ 正在初始化缺失的输入文件...")
-                subprocess.run(['python', SCRIPTS_ORDER[0]], check=True)
-
-            # 执行流程
-            for idx, script in enumerate(SCRIPTS_ORDER):
-                print(f"\n🚀 步骤 {idx + 1}/{len(SCRIPTS_ORDER)}: 执行 {os.path.basename(script)}")
-
-                if script.endswith('.py'):
-                    self.run_python(script)
-                elif script.endswith('.sas'):
-                    self.run_sas(script)
-
-                if idx in [0, 1, 3]:  # 阶段检查
-                    check_output()
-
-            print("\n🎉 全流程更新完成！")
+            if INCREMENTAL_SETTINGS['full_rebuild']:
+                reset_incremental_state()
+
+            graph = PipelineGraph(PIPELINE_STAGES, PIPELINE_ARTIFACTS)
+            state = BuildState(DAG_STATE_PATH)
+            if self.runner is not None:
+                self.runner.begin_run()
+            os.makedirs(PARALLEL_SETTINGS['log_dir'], exist_ok=True)
+
+            pending, done, failed, running = list(graph.order), set(), [], {}
+            executed = 0
+            with ThreadPoolExecutor(max_workers=PARALLEL_SETTINGS['workers']) as pool:
+                while True:
+                    self.schedule_ready(graph, state, pool, pending, done, failed, running)
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name, signature = running.pop(future)
+                        metrics = future.result()
+                        if metrics.status == 'ok':
+                            state.record(graph, name, signature)
+                            done.add(name)
+                            executed += 1
+                            print(f"✔️ {name} 完成 | {metrics.summary()}")
+                        else:
+                            state.forget(name)
+                            failed.append(name)
+                            self.report_stage_failure(name)
+
+            if failed:
+                print(f"\n⚠️ 流程未全部完成：失败或被阻断的阶段 {', '.join(failed)}")
+                return
+            status = 'ok'
+            print(f"\n🎉 全流程更新完成！（执行 {executed} 个阶段，跳过 {len(graph.order) - executed} 个）")
             self.print_success()
 
-        except subprocess.CalledProcessError as e:
-            print(f"❌ 执行失败于 {os.path.basename(script)}")
-            print(f"错误详情：\n{e.stderr.decode('gbk')}")
         except Exception as e:
             print(f"🛑 未捕获异常：{str(e)}")
+        finally:
+            self.metrics.finish_run(status)
+
+    def schedule_ready(self, graph, state, pool, pending, done, failed, running):
+        """提交上游均已完成的阶段；未变化的直接跳过，上游失败的阻断"""
+        progressed = True
+        while progressed:
+            progressed = False
+            for name in list(pending):
+                upstream = graph.upstream(name)
+                if any(u in failed for u in upstream):
+                    print(f"⛔ {name}：上游阶段失败，本轮不执行")
+                    failed.append(name)
+                elif not all(u in done for u in upstream):
+                    continue
+                else:
+                    signature = state.signature(graph, name)  # 提交时的输入快照，执行期间的修改留给下一轮
+                    if state.is_current(graph, name, signature):
+                        print(f"⏭ {name}：脚本与输入均未变化，跳过")
+                        self.metrics.skip(name)
+                        done.add(name)
+                    else:
+                        print(f"🚀 {name}：开始执行（{os.path.basename(graph.stages[name]['script'])}）")
+                        running[pool.submit(self.execute_stage, graph.stages[name])] = (name, signature)
+                pending.remove(name)
+                progressed = True
+
+    def stage_log_path(self, name):
+        return os.path.join(PARALLEL_SETTINGS['log_dir'], f"{name}.log")
+
+    def execute_stage(self, stage):
+        """在线程池中执行一个阶段，输出写入阶段日志；返回 StageMetrics（失败时 status 为 failed）"""
+        name, script = stage['name'], stage['script']
+        with open(self.stage_log_path(name), 'w', encoding='utf-8') as log, capture_output(log):
+            with self.metrics.stage(name) as metrics:
+                try:
+                    if script.endswith('.py') and self.runner is not None and self.runner.supports(name):
+                        self.run_in_process(name, script)
+                    elif script.endswith('.py'):
+                        self.run_python(script, stage.get('args', []), log)
+                    elif script.endswith('.sas') and not self.run_sas(script):
+                        metrics.status = 'failed'
+                    metrics.docs, metrics.tokens = self.stage_workload(stage)
+                except Exception:
+                    metrics.status = 'failed'
+                    print(traceback.format_exc())
+        return metrics
+
+    def report_stage_failure(self, name):
+        """打印失败阶段日志的末尾"""
+        log_path = self.stage_log_path(name)
+        print(f"❌ {name} 执行失败，完整日志：{log_path}")
+        try:
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+                tail = f.read()[-1000:]  # 仅输出最后 1000 字符避免刷屏
+            print("=" * 50)
+            print(tail)
+            print("=" * 50)
+        except OSError as e:
+            print(f"⚠️ 无法读取日志文件: {str(e)}")
 
-    def run_python(self, script):
-        """执行Python脚本"""
+    def stage_workload(self, stage):
+        """阶段工作量 (文档数, 词数)，口径由 stage['workload'] 指定；优先取常驻执行器内存中的结果"""
+        kind = stage.get('workload')
+        if kind is None or not METRICS_SETTINGS['count_tokens']:
+            return None, None
+        if kind not in self._workloads:
+            memory = self.runner.memory if self.runner is not None else {}
+            path = PIPELINE_ARTIFACTS[kind]
+            try:
+                if kind == 'text_pairs':
+                    source = memory.get(kind)
+                    self._workloads[kind] = count_tokens(source if source is not None else path)
+                else:
+                    bundle = memory.get(kind)
+                    bundle = bundle if bundle is not None else load_tfidf_npz(path)
+                    self._workloads[kind] = (bundle.matrix.shape[0], None)
+            except Exception as e:
+                print(f"⚠️ 工作量统计失败：{str(e)}")
+                return None, None
+        return self._workloads[kind]
+
+    def run_in_process(self, name, script):
+        """在常驻进程内执行阶段（不重新导入依赖，上游结果直接取自内存）"""
+        start_time = time.perf_counter()
+        self.runner.run(name)
+        print(f"✔️ {os.path.basename(script)} 执行成功（进程内，{time.perf_counter() - start_time:.1f}s）")
+
+    def run_python(self, script, args=(), log=None):
+        """执行Python脚本；输出（含 stderr）写入阶段日志"""
+        if log is not None:
+            log.flush()  # 先写出本进程已缓冲的内容，再由子进程追加
         result = subprocess.run(
-            ['python', script],
-            capture_output=True,
+            ['python', script, *args],
+            stdout=log if log is not None else subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             text=True,
-            encoding='utf-8'
+            encoding='utf-8',
+            env=dict(os.environ, PYTHONIOENCODING='utf-8')  # 子进程输出重定向到文件时仍按 UTF-8 写出
         )
         self.handle_result(result, script)
 
@@ -162,8 +500,9 @@ class ReloadHandler(FileSystemEventHandler):
         # 错误处理
         if result.returncode != 0:
             self.handle_failure(script, log_file)
-        else:
-            self.handle_success(script)
+            return False
+        self.handle_success(script)
+        return True
 
     def handle_result(self, result, script):
         """统一处理执行结果"""
@@ -221,6 +560,7 @@ if __name__ == "__main__":
         observer.schedule(event_handler, directory, recursive=True)
 
     print("\n🖥 监控服务已启动，等待文件变更...")
+    event_handler.start()
     observer.start()
 
     try:
@@ -228,4 +568,5 @@ if __name__ == "__main__":
             time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
-    observer.join()
\ No newline at end of file
+    observer.join()
+    event_handler.stop()
\ No newline at end of file
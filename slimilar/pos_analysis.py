@@ -14,6 +14,8 @@ import os
 import jieba.posseg as pseg
 from collections import defaultdict
 import pandas as pd
+from text_io import read_text
+from segmenter_state import load_segmenter
 
 # ================= 配置区 =================
 INPUT_CONFIG = {
@@ -27,6 +29,12 @@ POS_MAPPING = {  # 词性标签映射
     'a': '形容词',
     'nz': '专业术语'
 }
+SEGMENTER_SETTINGS = {  # 分词器预构建配置
+    # 未标注词性的自定义词会被标为 'x'，影响分布统计，默认只用基础词典
+    'user_dicts': [],
+    'artifact_dir': r"D:\SASanalysis\SAS_text\python_SAS\segmenter_cache",
+    'prebuilt': True
+}
 # ==========================================
 
 def create_dir_if_needed(path):
@@ -37,16 +45,18 @@ def create_dir_if_needed(path):
         print(f"已创建目录：{dir_name}")
 
 def load_text(file_path):
-    """安全加载文本文件"""
+    """安全加载文本文件（自动识别编码，只读取一次）"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        text, encoding = read_text(file_path)
+        print(f"已加载：{os.path.basename(file_path)}（编码：{encoding}）")
+        return text
     except FileNotFoundError:
         print(f"错误：文件 {file_path} 不存在")
         return None
-    except UnicodeDecodeError:
-        print(f"错误：文件 {file_path} 编码非UTF-8，请转换编码")
-        return None
+
+def init_segmenter():
+    """加载（预构建的）分词器状态"""
+    load_segmenter(**SEGMENTER_SETTINGS)
 
 def analyze_pos(text):
     """分析文本词性分布"""
@@ -65,6 +75,8 @@ def analyze_pos(text):
 
 def generate_distribution_data():
     """生成分布数据"""
+    init_segmenter()
+
     # 加载文本
     data = {
         'chugao': load_text(INPUT_CONFIG['chugao']),
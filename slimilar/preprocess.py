@@ -8,129 +8,481 @@ import os
 import re
 import jieba
 import pandas as pd
-from typing import Tuple, Set
-from sklearn.feature_extraction.text import TfidfVectorizer
+from contextlib import ExitStack
+from token_cache import TokenCache, file_digest
+from doc_state import DocumentState
+from segmenter_state import load_segmenter
+from text_pairs_io import write_text_pairs, read_text_pairs, ChunkedTextPairsWriter
+from text_io import decode_bytes, read_text, sniff_file_encoding
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple, Set, List, Dict, Iterator, TextIO
 # ================= 配置区 =================
 CUSTOM_DICT_PATH = r"D:\SASanalysis\SAS_text\comnew_dict.txt"
 STOPWORDS_PATH = r"D:\SASanalysis\SAS_text\stopwords.txt"
 DRAFT_PATH = r"D:\SASanalysis\SAS_text\head.txt"
 FINAL_PATH = r"D:\SASanalysis\SAS_text\lastx_04.txt"
-OUTPUT_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.csv"
+OUTPUT_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.csv"  # CSV 导出（Excel 用户）
 DOC_ID_PREFIX = "P001"
 
+# === 列式输出配置 ===
+COLUMNAR_OUTPUT = {
+    'enabled': True,  # 输出 Parquet/Arrow（词列字典编码），下游建模只读 *_clean 列
+    'path': r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.parquet",  # .parquet 或 .arrow
+    'include_raw': False,  # 是否保留 draft/final 原文列
+    'csv_export': False  # 是否同时导出 OUTPUT_PATH 的 CSV（供 Excel 查看）
+}
+
+# === 批量模式配置 ===
+BATCH_SETTINGS = {
+    'enabled': False,  # True 时 main() 改走批量流程
+    'input_dir': r"D:\SASanalysis\SAS_text\batch_input",  # 成对文件目录
+    'manifest': None,  # 可选清单CSV（doc_id,draft_path,final_path），优先于目录扫描
+    'draft_suffix': '_draft.txt',  # 目录模式：<doc_id>_draft.txt
+    'final_suffix': '_final.txt',  # 目录模式：<doc_id>_final.txt
+    'workers': None,  # 进程数，None 表示 CPU 核数
+    'chunksize': 16,  # 每次派发给子进程的文档对数量
+    'progress_every': 500,  # 每处理多少对打印一次进度
+    'incremental': True,  # 只重算新增/修改的文档对，其余复用上次输出
+    'state_path': r"D:\SASanalysis\SAS_text\python_SAS\pipeline_state.json",  # 变更跟踪状态（与建模共用）
+    'full_rebuild': False  # True 时忽略状态全量重算
+}
+
+# === 流式模式配置（超大文件） ===
+STREAM_SETTINGS = {
+    'enabled': False,  # True 时 main() 以分块流式方式处理初稿/终稿，不保留原文列；输出位置与常规模式相同
+    'chunk_chars': 1 << 20,  # 每次读取的字符数
+    'sniff_bytes': 64 * 1024,  # 编码探测读取的字节数
+    'max_carry_chars': 4 << 20,  # 找不到切分点时允许累积的最大字符数
+    'chunk_tokens': 1 << 20  # 列式输出每攒够多少个词写出一个行组（读取时按 doc_id 拼接回一行）
+}
+
+# === 分词器预构建配置 ===
+SEGMENTER_SETTINGS = {
+    'user_dicts': [CUSTOM_DICT_PATH],  # 编译进预构建状态的自定义词典
+    'artifact_dir': r"D:\SASanalysis\SAS_text\python_SAS\segmenter_cache",
+    'prebuilt': True  # False 时退回 jieba.initialize() + load_userdict()
+}
+
+# === 分词缓存配置 ===
+CACHE_SETTINGS = {
+    'enabled': True,  # 按文件内容+词典+停用词版本缓存清洗结果
+    'cache_dir': r"D:\SASanalysis\SAS_text\python_SAS\cache_tokens",
+    'max_bytes': 2 << 30  # 缓存总大小上限（LRU淘汰）
+}
+
+# === 预编译正则 ===
+# 原两步清洗（去非中英文字符、去独立数字）合并：数字本身不在保留字符集内，
+# 第一步已将其替换为空格；连续的非法字符合并为一个空格，不影响分词结果
+_CLEAN_PATTERN = re.compile(r"[^\u4e00-\u9fa5a-zA-Z]+")
+# 流式切分点：句读标点或换行（在反转字符串上搜索，找最后一个切分点）
+_SENTENCE_BOUNDARY = re.compile(r"[\n。！？；!?;]")
+_ANY_BOUNDARY = re.compile(r"[^\u4e00-\u9fa5a-zA-Z]")
 
 # =========================================
+_SEGMENTER_READY = False
 
-def load_custom_dict(path: str) -> None:
-    """加载自定义词典"""
-    try:
-        if os.path.exists(path):
-            jieba.load_userdict(path)
-            print(f"✅ 自定义词典加载成功：{os.path.basename(path)}")
-        else:
-            print(f"⚠️ 警告：自定义词典文件 {path} 不存在")
-    except Exception as e:
-        print(f"❌ 词典加载异常：{str(e)}")
+
+def ensure_segmenter() -> None:
+    """按需初始化结巴与自定义词典（文档全部命中缓存时完全不加载分词器）"""
+    global _SEGMENTER_READY
+    if not _SEGMENTER_READY:
+        load_segmenter(**SEGMENTER_SETTINGS)
+        _SEGMENTER_READY = True
+
+
+def create_token_cache() -> TokenCache:
+    """按配置创建分词缓存，未启用时返回 None"""
+    if not CACHE_SETTINGS['enabled']:
+        return None
+    return TokenCache(
+        CACHE_SETTINGS['cache_dir'],
+        CACHE_SETTINGS['max_bytes'],
+        [CUSTOM_DICT_PATH, STOPWORDS_PATH]
+    )
 
 
 def load_stopwords(path: str) -> Set[str]:
-    """加载停用词表（增强编码兼容性）"""
+    """加载停用词表（字节前缀探测编码，只读取一次）"""
     stopwords = set()
-    encodings = ['utf-8', 'gbk', 'gb2312', 'big5']
-
     if os.path.exists(path):
-        for encoding in encodings:
-            try:
-                with open(path, 'r', encoding=encoding) as f:
-                    stopwords = {line.strip() for line in f if line.strip()}
-                print(f"✅ 停用词加载成功：{len(stopwords)} 个（编码：{encoding}）")
-                return stopwords
-            except UnicodeDecodeError:
-                continue
-        print("⚠️ 警告：未能识别停用词文件编码")
+        text, encoding = read_text(path)
+        stopwords = {line.strip() for line in text.splitlines() if line.strip()}
+        print(f"✅ 停用词加载成功：{len(stopwords)} 个（编码：{encoding}）")
     else:
         print("⚠️ 警告：停用词文件不存在，使用空集合")
     return stopwords
-    # 加强停用词加载验证
 
-def process_file(file_path: str, stopwords: Set[str]) -> Tuple[str, str]:
-    """
-    处理单个文件
-    返回：(原始文本, 清洗后文本)
-    """# ==== 文件读取 ====
-    raw_text = ""
-    for encoding in ['utf-8', 'gbk', 'ansi']:
-        try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                raw_text = f.read()
-            break
-        except UnicodeDecodeError:
-            continue
-        except Exception as e:
-            print(f"❌ 文件读取失败：{file_path} - {str(e)}")
-            return "", ""
-    # ==== 文本清洗 ====
-    cleaned_text = re.sub(r"[^\u4e00-\u9fa5a-zA-Z]", " ", raw_text)
-    cleaned_text = re.sub(r'\b\d+\b', ' ', cleaned_text)
-    words = jieba.lcut(cleaned_text)
-    # 过滤处理（增加中间输出）
+
+def clean_text(raw_text: str) -> str:
+    """文本清洗：非中英文字符（含数字）一次性替换为空格"""
+    return _CLEAN_PATTERN.sub(" ", raw_text)
+
+
+def filter_tokens(words, stopwords: Set[str]) -> List[str]:
+    """过滤空白、单字、停用词和纯数字"""
     filtered = []
     for w in words:
         w = w.strip()
-        if not w: continue
-        if w in stopwords:
-            # print(f"过滤停用词：{w}")  # 调试时启用
-            continue
-        if len(w) > 1 and not w.isdigit():
+        if len(w) > 1 and w not in stopwords and not w.isdigit():
             filtered.append(w)
-    print(f"正在处理：{os.path.basename(file_path)} | 使用停用词数量：{len(stopwords)}")
-    vectorizer = TfidfVectorizer(
-        stop_words=stopwords,
-        token_pattern=r'(?u)\b\w[\w-]*\w\b',  # 增强中文分词匹配
-        max_df=0.85  # 过滤高频词
-    )
-    # 读取原始内容
-    raw_text = ""
-    for encoding in ['utf-8', 'gbk', 'ansi']:
+    return filtered
+
+
+def process_file(file_path: str, stopwords: Set[str], cache: TokenCache = None) -> Tuple[str, str]:
+    """
+    处理单个文件（单次读取 + 单次清洗 + 单次分词）
+    传入 cache 时，内容与词典均未变化的文件直接复用缓存结果，不调用结巴
+    返回：(原始文本, 清洗后文本)
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        raw_text, encoding = decode_bytes(data)
+    except Exception as e:
+        print(f"❌ 文件读取失败：{file_path} - {str(e)}")
+        return "", ""
+
+    key = None
+    if cache is not None:
+        key = cache.make_key(data)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"命中缓存：{os.path.basename(file_path)} | 编码：{encoding}")
+            return raw_text, cached
+
+    ensure_segmenter()
+    print(f"正在处理：{os.path.basename(file_path)} | 编码：{encoding} | 使用停用词数量：{len(stopwords)}")
+    # 精确模式分词，直接消费生成器避免中间列表
+    cleaned = " ".join(filter_tokens(jieba.cut(clean_text(raw_text)), stopwords))
+    if cache is not None:
+        cache.put(key, cleaned)
+    return raw_text, cleaned
+
+
+# ================= 流式模式 =================
+def _find_cut(buf: str) -> int:
+    """返回最后一个切分点之后的位置；无切分点返回 0
+
+    切分点处的字符在清洗时都会变为空格，而结巴本身就在空格处断开，
+    因此在这些位置切块不会改变分词结果。优先按句切分，其次任意非中英文字符。
+    """
+    reversed_buf = buf[::-1]
+    for pattern in (_SENTENCE_BOUNDARY, _ANY_BOUNDARY):
+        m = pattern.search(reversed_buf)
+        if m:
+            return len(buf) - m.start()
+    return 0
+
+
+def iter_sentence_chunks(file_path: str, chunk_chars: int = None) -> Iterator[str]:
+    """按句读对齐分块读取文件，内存占用只与块大小相关"""
+    chunk_chars = chunk_chars or STREAM_SETTINGS['chunk_chars']
+    encoding = sniff_file_encoding(file_path, STREAM_SETTINGS['sniff_bytes'])
+    print(f"流式读取：{os.path.basename(file_path)} | 编码：{encoding}")
+    carry = ""
+    # 无法回退重读，个别非法字节替换后在清洗时变为空格
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        while True:
+            block = f.read(chunk_chars)
+            if not block:
+                break
+            buf = carry + block
+            cut = _find_cut(buf)
+            if cut == 0:
+                if len(buf) < STREAM_SETTINGS['max_carry_chars']:
+                    carry = buf
+                    continue
+                cut = len(buf)  # 超长无切分点文本：强制切块
+            yield buf[:cut]
+            carry = buf[cut:]
+    if carry:
+        yield carry
+
+
+def iter_clean_tokens(file_path: str, stopwords: Set[str], chunk_chars: int = None) -> Iterator[str]:
+    """流式分词：逐块清洗、分词、过滤，以生成器形式产出词语"""
+    for chunk in iter_sentence_chunks(file_path, chunk_chars):
+        yield from filter_tokens(jieba.cut(clean_text(chunk)), stopwords)
+
+
+def _write_token_field(out: TextIO, tokens: Iterator[str], flush_every: int = 10000) -> int:
+    """将词语流写成一个带引号的CSV字段，返回词数（清洗后的词只含中英文字符，无需转义）"""
+    out.write('"')
+    count = 0
+    buffer = []
+    for token in tokens:
+        buffer.append(token)
+        count += 1
+        if len(buffer) >= flush_every:
+            out.write((" " if count > len(buffer) else "") + " ".join(buffer))
+            buffer = []
+    if buffer:
+        out.write((" " if count > len(buffer) else "") + " ".join(buffer))
+    out.write('"')
+    return count
+
+
+def stream_main() -> pd.DataFrame:
+    """流式处理流程：边分词边写出 draft_clean/final_clean（draft/final 原文列留空）
+
+    输出位置与常规模式相同（COLUMNAR_OUTPUT，可选 CSV），下游建模与依赖图无需改动。
+    CSV 边分词边写出；列式文件每 chunk_tokens 个词写出一个行组，内存只占一块，与文件大小无关。
+    """
+    print("\n" + "=" * 30 + " 初始化配置 " + "=" * 30)
+    ensure_segmenter()
+    stopwords = load_stopwords(STOPWORDS_PATH)
+
+    print("\n" + "=" * 30 + " 流式处理文档 " + "=" * 30)
+    with ExitStack() as stack:
+        draft_tokens = iter_clean_tokens(DRAFT_PATH, stopwords)
+        final_tokens = iter_clean_tokens(FINAL_PATH, stopwords)
+        if COLUMNAR_OUTPUT['enabled']:
+            writer = stack.enter_context(ChunkedTextPairsWriter(
+                COLUMNAR_OUTPUT['path'], COLUMNAR_OUTPUT['include_raw'], STREAM_SETTINGS['chunk_tokens']))
+            draft_tokens = writer.feed(DOC_ID_PREFIX, 'draft_clean', draft_tokens)
+            final_tokens = writer.feed(DOC_ID_PREFIX, 'final_clean', final_tokens)
+        if COLUMNAR_OUTPUT['csv_export'] or not COLUMNAR_OUTPUT['enabled']:
+            os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+            with open(OUTPUT_PATH, 'w', encoding='utf_8_sig', newline='') as out:
+                out.write("doc_id,draft,final,draft_clean,final_clean\r\n")
+                out.write(f'"{DOC_ID_PREFIX}","","",')
+                draft_count = _write_token_field(out, draft_tokens)
+                out.write(",")
+                final_count = _write_token_field(out, final_tokens)
+                out.write("\r\n")
+            print(f"✅ 文件保存成功：{OUTPUT_PATH}")
+        else:
+            draft_count = sum(1 for _ in draft_tokens)
+            final_count = sum(1 for _ in final_tokens)
+
+        print("\n" + "=" * 30 + " 质量检查 " + "=" * 30)
+        print(f"初稿有效词数：{draft_count}")
+        print(f"终稿有效词数：{final_count}")
+        if not draft_count:
+            raise ValueError("初稿清洗结果为空，请检查输入文件或分词设置")
+        if not final_count:
+            raise ValueError("终稿清洗结果为空，请检查输入文件或分词设置")
+    if COLUMNAR_OUTPUT['enabled']:
+        print(f"✅ 文件保存成功：{COLUMNAR_OUTPUT['path']}（{writer.chunk} 个分块）")
+
+    return pd.DataFrame({
+        "doc_id": [DOC_ID_PREFIX],
+        "draft_tokens": [draft_count],
+        "final_tokens": [final_count]
+    })
+
+
+# ================= 批量模式 =================
+_WORKER_STOPWORDS: Set[str] = set()
+_WORKER_CACHE: TokenCache = None
+
+
+def discover_pairs(input_dir: str, draft_suffix: str, final_suffix: str) -> List[Tuple[str, str, str]]:
+    """扫描目录，按文件名后缀配对初稿/终稿，返回 [(doc_id, draft_path, final_path)]"""
+    drafts, finals = {}, {}
+    for filename in os.listdir(input_dir):
+        file_path = os.path.join(input_dir, filename)
+        if filename.endswith(draft_suffix):
+            drafts[filename[:-len(draft_suffix)]] = file_path
+        elif filename.endswith(final_suffix):
+            finals[filename[:-len(final_suffix)]] = file_path
+
+    unpaired = set(drafts) ^ set(finals)
+    if unpaired:
+        print(f"⚠️ 警告：{len(unpaired)} 个文档缺少配对文件，已跳过")
+    return [(doc_id, drafts[doc_id], finals[doc_id]) for doc_id in sorted(set(drafts) & set(finals))]
+
+
+def load_manifest(path: str) -> List[Tuple[str, str, str]]:
+    """读取清单CSV（doc_id,draft_path,final_path）"""
+    manifest = pd.read_csv(path, encoding='utf_8_sig', dtype=str)
+    required = {'doc_id', 'draft_path', 'final_path'}
+    if not required.issubset(manifest.columns):
+        raise ValueError(f"清单文件缺少必要列：{required - set(manifest.columns)}")
+    return list(manifest[['doc_id', 'draft_path', 'final_path']].itertuples(index=False, name=None))
+
+
+def _init_worker(stopwords_path: str) -> None:
+    """子进程初始化：每个进程只加载一次停用词和缓存；结巴与自定义词典在首次未命中时加载一次"""
+    global _WORKER_STOPWORDS, _WORKER_CACHE
+    _WORKER_STOPWORDS = load_stopwords(stopwords_path)
+    _WORKER_CACHE = create_token_cache()
+
+
+def _process_pair(pair: Tuple[str, str, str]) -> Tuple[Dict[str, str], int, int]:
+    """子进程任务：处理一对初稿/终稿，返回 (text_pairs 的一行, 缓存命中数, 未命中数)"""
+    doc_id, draft_path, final_path = pair
+    hits, misses = (_WORKER_CACHE.hits, _WORKER_CACHE.misses) if _WORKER_CACHE else (0, 0)
+    draft_raw, draft_clean = process_file(draft_path, _WORKER_STOPWORDS, _WORKER_CACHE)
+    final_raw, final_clean = process_file(final_path, _WORKER_STOPWORDS, _WORKER_CACHE)
+    if _WORKER_CACHE:
+        hits, misses = _WORKER_CACHE.hits - hits, _WORKER_CACHE.misses - misses
+    row = {
+        "doc_id": doc_id,
+        "draft": draft_raw,
+        "final": final_raw,
+        "draft_clean": draft_clean,
+        "final_clean": final_clean
+    }
+    return row, hits, misses
+
+
+def run_batch(pairs: List[Tuple[str, str, str]], workers: int = None, chunksize: int = 16) -> pd.DataFrame:
+    """多进程处理文档对，输出与单文档模式相同结构的 DataFrame（每个 doc_id 一行）"""
+    workers = workers or os.cpu_count() or 1
+    rows = []
+    hits = misses = 0
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(STOPWORDS_PATH,)
+    ) as executor:
+        for idx, (row, row_hits, row_misses) in enumerate(
+                executor.map(_process_pair, pairs, chunksize=chunksize), 1):
+            rows.append(row)
+            hits += row_hits
+            misses += row_misses
+            if idx % BATCH_SETTINGS['progress_every'] == 0:
+                print(f"⏳ 已处理 {idx}/{len(pairs)} 对文档")
+
+    if CACHE_SETTINGS['enabled']:
+        print(f"分词缓存：命中 {hits} | 未命中 {misses}")
+
+    return pd.DataFrame(rows, columns=["doc_id", "draft", "final", "draft_clean", "final_clean"])
+
+
+def save_results(df: pd.DataFrame) -> None:
+    """保存 text_pairs 结果：列式文件为主，CSV 为可选导出"""
+    targets = []
+    if COLUMNAR_OUTPUT['enabled']:
+        targets.append((COLUMNAR_OUTPUT['path'], COLUMNAR_OUTPUT['include_raw']))
+    if COLUMNAR_OUTPUT['csv_export'] or not COLUMNAR_OUTPUT['enabled']:
+        targets.append((OUTPUT_PATH, True))
+
+    for path, include_raw in targets:
         try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                raw_text = f.read()
-            break
-        except UnicodeDecodeError:
-            continue
+            write_text_pairs(df, path, include_raw)
+            print(f"✅ 文件保存成功：{path}")
         except Exception as e:
-            print(f"❌ 文件读取失败：{file_path} - {str(e)}")
-            return "", ""
+            print(f"❌ 保存失败：{str(e)}")
+            raise
+
+
+def _output_path() -> str:
+    """text_pairs 主输出路径"""
+    return COLUMNAR_OUTPUT['path'] if COLUMNAR_OUTPUT['enabled'] else OUTPUT_PATH
+
+
+def _file_stamp(path: str) -> list:
+    """输出文件戳（mtime + 大小），供下游确认 text_pairs 确实来自本次批量运行"""
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+
+def split_changed_pairs(pairs: List[Tuple[str, str, str]], state: DocumentState,
+                        previous: pd.DataFrame) -> Tuple[List[Tuple[str, str, str]], pd.DataFrame]:
+    """按文件指纹划分文档对，返回 (需重算的文档对, 可复用的旧行)"""
+    previous_ids = set(previous['doc_id']) if previous is not None else set()
+    todo, reused_ids = [], []
+    for pair in pairs:
+        doc_id, draft_path, final_path = pair
+        # 两个文件都要检查以刷新指纹，不能短路
+        changed = [state.is_changed(draft_path), state.is_changed(final_path)]
+        if any(changed) or doc_id not in previous_ids:
+            todo.append(pair)
+        else:
+            reused_ids.append(doc_id)
+    reused = previous[previous['doc_id'].isin(reused_ids)] if previous is not None else None
+    return todo, reused
 
-    # 文本清洗流程
-    cleaned_text = re.sub(r"[^\u4e00-\u9fa5a-zA-Z]", " ", raw_text)
-    cleaned_text = re.sub(r'\b\d+\b', ' ', cleaned_text)
 
-    # 精确模式分词
-    words = jieba.lcut(cleaned_text)
+def batch_main() -> pd.DataFrame:
+    """批量处理流程：目录或清单 -> （变更检测）-> 进程池 -> text_pairs"""
+    print("\n" + "=" * 30 + " 收集文档对 " + "=" * 30)
+    if BATCH_SETTINGS['manifest']:
+        pairs = load_manifest(BATCH_SETTINGS['manifest'])
+    else:
+        pairs = discover_pairs(
+            BATCH_SETTINGS['input_dir'],
+            BATCH_SETTINGS['draft_suffix'],
+            BATCH_SETTINGS['final_suffix']
+        )
+    if not pairs:
+        raise ValueError("未发现可处理的文档对，请检查批量输入配置")
+    print(f"共 {len(pairs)} 对文档")
+
+    # ==== 变更检测 ====
+    state, previous = None, None
+    if BATCH_SETTINGS['incremental']:
+        state = DocumentState(BATCH_SETTINGS['state_path'])
+        dict_version = f"{file_digest(CUSTOM_DICT_PATH)}|{file_digest(STOPWORDS_PATH)}"
+        output_path = _output_path()
+        reusable = (
+            not BATCH_SETTINGS['full_rebuild']
+            and state.meta.get('dict_version') == dict_version
+            and os.path.exists(output_path)
+            and state.meta.get('text_pairs_stamp') == _file_stamp(output_path)
+        )
+        if reusable:
+            previous = read_text_pairs(output_path)
+            previous['doc_id'] = previous['doc_id'].astype(str)
+        else:
+            print("ℹ️ 词典/停用词变化、无历史输出或要求全量重建，本次全量处理")
+        state.meta['dict_version'] = dict_version
+        todo, reused = split_changed_pairs(pairs, state, previous)
+        print(f"增量模式：需处理 {len(todo)} 对 | 复用 {len(pairs) - len(todo)} 对")
+    else:
+        todo, reused = pairs, None
 
-    # 过滤处理
-    filtered = [w.strip() for w in words
-                if w.strip()
-                and len(w.strip()) > 1
-                and w not in stopwords
-                and not w.isdigit()]
+    print("\n" + "=" * 30 + " 批量处理 " + "=" * 30)
+    df = run_batch(todo, BATCH_SETTINGS['workers'], BATCH_SETTINGS['chunksize']) if todo else None
+    if reused is not None and len(reused):
+        order = [doc_id for doc_id, _, _ in pairs]
+        df = pd.concat([df, reused], ignore_index=True) if df is not None else reused
+        df = df.set_index('doc_id').loc[order].reset_index()
+        # 列式输出可能未保存原文列，复用行的原文留空
+        df = df.reindex(columns=["doc_id", "draft", "final", "draft_clean", "final_clean"]).fillna("")
 
-    return raw_text, " ".join(filtered)
+    print("\n" + "=" * 30 + " 质量检查 " + "=" * 30)
+    empty = df[(df['draft_clean'] == "") | (df['final_clean'] == "")]['doc_id'].tolist()
+    if len(empty) == len(df):
+        raise ValueError("所有文档清洗结果为空，请检查输入文件或分词设置")
+    if empty:
+        print(f"⚠️ 警告：{len(empty)} 个文档清洗结果为空：{empty[:10]}...")
+
+    print("\n" + "=" * 30 + " 保存结果 " + "=" * 30)
+    save_results(df)
+
+    if state is not None:
+        # 累积待下游（建模）消费的变更，直到其成功运行后清空
+        pending = set(state.meta.get('pending_changed_doc_ids', [])) | {doc_id for doc_id, _, _ in todo}
+        state.meta['pending_changed_doc_ids'] = sorted(pending)
+        state.meta['pending_full_rebuild'] = state.meta.get('pending_full_rebuild', False) or previous is None
+        state.meta['text_pairs_stamp'] = _file_stamp(_output_path())
+        state.forget([path for _, draft, final in pairs for path in (draft, final)])
+        state.save()
+    return df
 
 
 def main() -> pd.DataFrame:
     """主处理流程（返回DataFrame用于调试）"""
+    if BATCH_SETTINGS['enabled']:
+        return batch_main()
+    if STREAM_SETTINGS['enabled']:
+        return stream_main()
+
     # ==== 初始化阶段 ====
     print("\n" + "=" * 30 + " 初始化配置 " + "=" * 30)
-    jieba.initialize()
-    load_custom_dict(CUSTOM_DICT_PATH)
     stopwords = load_stopwords(STOPWORDS_PATH)
+    cache = create_token_cache()
 
     # ==== 数据处理阶段 ====
     print("\n" + "=" * 30 + " 处理文档 " + "=" * 30)
-    draft_raw, draft_clean = process_file(DRAFT_PATH, stopwords)
-    final_raw, final_clean = process_file(FINAL_PATH, stopwords)
+    draft_raw, draft_clean = process_file(DRAFT_PATH, stopwords, cache)
+    final_raw, final_clean = process_file(FINAL_PATH, stopwords, cache)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"分词缓存：命中 {stats['hits']} | 未命中 {stats['misses']} | 淘汰 {stats['evictions']}")
 
     # ==== 数据验证阶段 ====
     print("\n" + "=" * 30 + " 质量检查 " + "=" * 30)
@@ -162,14 +514,8 @@ def main() -> pd.DataFrame:
         "final_clean": [final_clean]
     })
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    try:
-        df.to_csv(OUTPUT_PATH, index=False, encoding='utf_8_sig')
-        print(f"✅ 文件保存成功：{OUTPUT_PATH}")
-        return df
-    except Exception as e:
-        print(f"❌ 保存失败：{str(e)}")
-        raise
+    save_results(df)
+    return df
 
 
 def test_segmentation():
@@ -195,8 +541,9 @@ if __name__ == "__main__":
     print("\n" + "=" * 30 + " 调试信息 " + "=" * 30)
     print("生成文件列结构：")
     print(processed_df.dtypes)
-    print("\n前100字符示例：")
-    print(processed_df['draft_clean'].iloc[0][:100])
+    if 'draft_clean' in processed_df:
+        print("\n前100字符示例：")
+        print(processed_df['draft_clean'].iloc[0][:100])
 
     # 运行测试需要时取消注释
     # test_segmentation()
\ No newline at end of file
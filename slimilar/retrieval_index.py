@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+历史文档相似检索 v1.0（倒排索引 + 精确 Top-K）
+功能：回答“哪些历史报告和这篇新文档最像”，不再重算整个 TF-IDF 矩阵和相似度矩阵
+  - 建索引：读取 建模.py 输出的稀疏矩阵，每个特征词一条倒排链，链内按权重降序排列
+  - 查询：新文档用已保存的 TF-IDF 模型（tfidf_model）转换，得分即余弦相似度
+  - 剪枝：阈值算法（TA/NRA，与 MaxScore 同类）——按权重从高到低成倍加深读取各倒排链并累加部分得分，
+          未读部分的得分上界为各链当前位置权重之和；第 k 名精确得分不低于该上界即停止，
+          只对仍可能进入前 k 的文档用正排行精确打分，结果与暴力计算完全一致
+  - 存储：索引目录下为独立 .npy 文件，加载时内存映射，百万级文档也可快速就绪
+用法：
+  python retrieval_index.py build                  （由当前矩阵重建索引）
+  python retrieval_index.py query <文本文件> [k]    （检索与该文件最相似的历史文档）
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+import scipy.sparse as sp
+from tfidf_io import load_tfidf_npz
+from tfidf_model import load_model, latest_version
+from similarity import prepare_matrix
+
+# ================= 配置区 =================
+MATRIX_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz"
+MODEL_DIR = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_model"  # 与 建模.py MODEL_SETTINGS 一致
+INDEX_DIR = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\retrieval_index"
+
+SEARCH_SETTINGS = {
+    'top_k': 10,
+    'initial_depth': 64,  # 每条倒排链首次读取的条目数，之后每次加深读取量 ×4
+    'mmap': True  # 以内存映射方式加载索引文件
+}
+# =========================================
+
+_ARRAYS = ['post_indptr', 'post_docs', 'post_weights', 'fwd_indptr', 'fwd_indices', 'fwd_data']
+
+
+def build_index(matrix_path, index_dir, model_version=None):
+    """由 TF-IDF 稀疏矩阵构建倒排索引（链内按权重降序）并写入 index_dir"""
+    bundle = load_tfidf_npz(matrix_path)
+    matrix = prepare_matrix(bundle.matrix)
+    csc = matrix.tocsc()
+    columns = np.repeat(np.arange(csc.shape[1]), np.diff(csc.indptr))
+    order = np.lexsort((-csc.data, columns))  # 先按词、再按权重降序
+
+    arrays = {
+        'post_indptr': csc.indptr.astype(np.int64),
+        'post_docs': csc.indices[order].astype(np.int32),
+        'post_weights': csc.data[order],
+        'fwd_indptr': matrix.indptr.astype(np.int64),
+        'fwd_indices': matrix.indices.astype(np.int32),
+        'fwd_data': matrix.data
+    }
+    os.makedirs(index_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+    labels = bundle.row_keys or bundle.doc_labels
+    np.save(os.path.join(index_dir, "labels.npy"), np.array(labels, dtype=str))
+
+    meta = {
+        'n_docs': matrix.shape[0],
+        'n_terms': matrix.shape[1],
+        'nnz': int(matrix.nnz),
+        'model_version': model_version,
+        'matrix_mtime': os.path.getmtime(matrix_path),
+        'built_at': time.time()
+    }
+    with open(os.path.join(index_dir, "meta.json.tmp"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(os.path.join(index_dir, "meta.json.tmp"), os.path.join(index_dir, "meta.json"))
+    return meta
+
+
+class RetrievalIndex:
+    """已构建的倒排索引：search_vector 对查询向量做精确 Top-K"""
+
+    def __init__(self, index_dir, mmap=True):
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        mode = 'r' if mmap else None
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mode))
+        self.labels = np.load(os.path.join(index_dir, "labels.npy"))
+        self.n_docs, self.n_terms = self.meta['n_docs'], self.meta['n_terms']
+        self.forward = sp.csr_matrix((self.fwd_data, self.fwd_indices, self.fwd_indptr),
+                                     shape=(self.n_docs, self.n_terms), copy=False)
+        self._model = None
+
+    def _exact_scores(self, docs, q_dense):
+        """正排行精确打分（随机访问）"""
+        return self.forward[docs] @ q_dense if len(docs) else np.empty(0)
+
+    def search_vector(self, query, k=10, initial_depth=64, exclude=()):
+        """对 1×n_terms 的查询向量做精确 Top-K，返回 [(文档下标, 得分)]（降序）
+
+        每轮把各链新读到的条目累加为部分得分；设 B 为未读部分的得分上界（各链下一条目权重 × 查询权重之和），
+        则任一文档的真实得分 ≤ 部分得分 + B，未读到的文档 ≤ B。
+        当第 k 名精确得分 ≥ B 时停止加深，再只对“部分得分 + B”仍可能进入前 k 的文档精确打分。
+        每轮只加深对 B 贡献不低于最大贡献一半的链；部分得分与精确得分只为已读到的候选文档保存，
+        不随文档总数分配数组。
+        """
+        query = sp.csr_matrix(query)
+        keep = query.data > 0
+        terms, weights = query.indices[keep], query.data[keep]
+        if len(terms) == 0:
+            return []
+        q_dense = np.zeros(self.n_terms)
+        q_dense[terms] = weights
+        exclude = np.asarray(sorted(set(exclude)), dtype=np.int64)  # 排除的文档照常累加但不参与排名
+
+        starts = self.post_indptr[terms]
+        lengths = self.post_indptr[terms + 1] - starts
+        depth = np.zeros(len(terms), dtype=np.int64)
+        seen, partial = np.empty(0, dtype=np.int64), np.empty(0)  # 已读到的文档及其部分得分
+        scored, exact = np.empty(0, dtype=np.int64), np.empty(0)  # 已精确打分的文档及其得分
+        step = np.full(len(terms), initial_depth, dtype=np.int64)
+        advance = np.ones(len(terms), dtype=bool)  # 本轮要加深的链
+
+        def score(docs):
+            nonlocal scored, exact
+            docs = docs[~np.isin(docs, scored)]
+            scored = np.concatenate([scored, docs])
+            exact = np.concatenate([exact, self._exact_scores(docs, q_dense)])
+
+        while True:
+            new_depth = np.where(advance, np.minimum(depth + step, lengths), depth)
+            step[advance] *= 4
+            docs, contributions = [], []
+            for t in np.flatnonzero(advance):
+                s, d, e = starts[t], depth[t], new_depth[t]
+                docs.append(self.post_docs[s + d:s + e])
+                contributions.append(weights[t] * self.post_weights[s + d:s + e])
+            depth = new_depth
+            seen, inverse = np.unique(np.concatenate([seen] + docs), return_inverse=True)
+            partial = np.bincount(inverse.ravel(), weights=np.concatenate([partial] + contributions), minlength=len(seen))
+            ranked = ~np.isin(seen, exclude) if len(exclude) else slice(None)
+            docs, values = seen[ranked], partial[ranked]
+
+            open_lists = depth < lengths
+            if not open_lists.any():
+                result = docs  # 全部读完，部分得分即精确得分
+                break
+            remaining = np.zeros(len(terms))  # 各链未读部分的得分上界
+            remaining[open_lists] = weights[open_lists] * self.post_weights[starts[open_lists] + depth[open_lists]]
+            bound = float(remaining.sum())
+
+            # 部分得分最高的 k 篇先精确打分，得到第 k 名得分
+            score(docs[np.argpartition(-values, k - 1)[:k]] if len(docs) > k else docs)
+            kth = np.partition(exact, -k)[-k] if len(exact) >= k else -np.inf
+            if kth >= bound:
+                score(docs[values + bound > kth])
+                result, values = scored, exact
+                break
+            advance = remaining >= remaining.max() / 2  # 只加深对上界贡献大的链，低权重的长链（近似停用词）留到上界降下来后再读
+
+        top = np.argpartition(-values, k - 1)[:k] if len(values) > k else np.arange(len(values))
+        top = top[np.argsort(-values[top], kind='stable')]
+        return [(int(result[i]), float(values[i])) for i in top if values[i] > 0]
+
+    def load_query_model(self, model_dir):
+        """加载建索引时使用的 TF-IDF 模型（用于把新文档转换为查询向量）"""
+        if self._model is None:
+            tfidf, version, _ = load_model(model_dir, self.meta.get('model_version'))
+            if len(tfidf.vocabulary_) != self.n_terms:
+                raise ValueError(f"模型 {version} 词表大小与索引不一致，请重建索引")
+            self._model = tfidf
+        return self._model
+
+    def search_text(self, text, model_dir, k=10, initial_depth=64):
+        """检索与一篇（已分词、空格拼接）文档最相似的历史文档，返回 [(标签, 余弦相似度)]"""
+        query = self.load_query_model(model_dir).transform([text])
+        hits = self.search_vector(query, k, initial_depth)
+        return [(str(self.labels[i]), score) for i, score in hits]
+
+
+def load_index(index_dir=None, matrix_path=None):
+    """加载索引；矩阵比索引新时给出提示"""
+    index_dir, matrix_path = index_dir or INDEX_DIR, matrix_path or MATRIX_PATH
+    index = RetrievalIndex(index_dir, SEARCH_SETTINGS['mmap'])
+    if os.path.exists(matrix_path) and os.path.getmtime(matrix_path) > index.meta['matrix_mtime']:
+        print("⚠️ TF-IDF矩阵已更新，索引可能过期，请运行 python retrieval_index.py build")
+    return index
+
+
+def segment_file(path):
+    """按 preprocess.py 的规则读取并分词一个文本文件"""
+    import preprocess
+    stopwords = preprocess.load_stopwords(preprocess.STOPWORDS_PATH)
+    return preprocess.process_file(path, stopwords)[1]
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'build'
+    try:
+        if command == 'build':
+            start_time = time.perf_counter()
+            meta = build_index(MATRIX_PATH, INDEX_DIR, latest_version(MODEL_DIR))
+            print(f"✅ 倒排索引已保存：{INDEX_DIR}（文档 {meta['n_docs']} | 特征 {meta['n_terms']} | "
+                  f"倒排条目 {meta['nnz']}）耗时 {time.perf_counter() - start_time:.2f}s")
+        elif command == 'query' and len(argv) > 2:
+            k = int(argv[3]) if len(argv) > 3 else SEARCH_SETTINGS['top_k']
+            index = load_index()
+            text = segment_file(argv[2])
+            start_time = time.perf_counter()
+            hits = index.search_text(text, MODEL_DIR, k, SEARCH_SETTINGS['initial_depth'])
+            print(f"\n检索耗时 {(time.perf_counter() - start_time) * 1000:.1f} ms | Top-{k}：")
+            for rank, (label, score) in enumerate(hits, 1):
+                print(f"{rank:>3}. {label}  {score:.4f}")
+        else:
+            print("用法：python retrieval_index.py build | query <文本文件> [k]")
+    except Exception as e:
+        print(f"\n❌ 错误：{str(e)}")
+        print("应急处理：")
+        print("1. 确认已运行 建模.py 生成TF-IDF矩阵与模型")
+        print("2. 模型重新拟合后需重建索引（python retrieval_index.py build）")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+TF-IDF → SAS 交接模块 v1.0
+功能：
+  1. 生成与实际维度一致的 SAS 导入代码（tfidf_import.sas），由 cos_sim_3.sas / cos_sim_sparse.sas 通过 %include 引用，
+     不再在 SAS 中写死 word_1-word_296，也不再解析上千列的稠密 CSV
+  2. Python 参照实现：按 cos_sim_3.sas 的同一步骤（读长表 → 行范数归一化 → X_norm * X_norm`）计算相似度，
+     用于在没有 SAS 的环境（如 Linux）中校验交接文件与 SAS 结果的数值一致性
+用法：
+  python sas_handoff.py                     （校验长表交接文件与 .npz 矩阵的一致性）
+  python sas_handoff.py <SAS输出的cos_sim_result.csv>   （另外校验 SAS 结果）
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from tfidf_io import load_tfidf_npz, read_long_format, CSV_ENCODING
+
+# ================= 配置区 =================
+MATRIX_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz"
+LONG_FILE = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_long_2.csv"
+DOCS_FILE = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_docs_2.csv"
+SAS_RESULT_FILE = r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_result4.csv"
+
+PARITY_SETTINGS = {
+    'atol': 1e-6,  # 长表保留9位小数，相似度允许的最大绝对误差
+    'zero_norm': 1e-12  # 与 cos_sim_3.sas 中零向量保护阈值一致
+}
+# =========================================
+
+SAS_ENCODING = 'gbk'  # 与仓库中其他 .sas 文件一致
+
+_SAS_TEMPLATE = """/* 由 建模.py 自动生成（{generated}），请勿手工修改 */
+/* 文档数 {n_docs} | 特征数 {n_terms} | 非零项 {nnz} */
+%let n_docs = {n_docs};
+%let n_terms = {n_terms};
+%let long_file = {long_file};
+%let docs_file = {docs_file};
+
+data tfidf_long;
+    infile "&long_file" dlm=',' dsd truncover firstobs=2;
+    length doc_id $32 term $200;  /* 特征词放在最后一列，不影响数值读取 */
+    input doc_index doc_id $ term_id weight term $;
+run;
+
+data tfidf_docs;  /* 零向量文档在长表中没有记录，文档总数以文档表为准 */
+    infile "&docs_file" dlm=',' dsd truncover firstobs=2;
+    length doc_id $32;
+    input doc_index doc_id $;
+run;
+
+/* 在 PROC IML 中调用：%tfidf_matrix(X); 由长表三元组还原 &n_docs × &n_terms 矩阵 */
+%macro tfidf_matrix(mat);
+    use tfidf_long;
+    read all var {{doc_index term_id weight}};
+    close tfidf_long;
+    &mat = j(&n_docs, &n_terms, 0);
+    if nrow(weight) > 0 then
+        &mat[sub2ndx(&n_docs || &n_terms, doc_index || term_id)] = weight;
+%mend;
+"""
+
+
+def write_sas_import(path, n_docs, n_terms, nnz, long_file, docs_file):
+    """写出与当前矩阵维度一致的 SAS 导入代码"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    code = _SAS_TEMPLATE.format(
+        generated=time.strftime('%Y-%m-%d %H:%M:%S'),
+        n_docs=n_docs, n_terms=n_terms, nnz=nnz,
+        long_file=long_file, docs_file=docs_file
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding=SAS_ENCODING, newline='\r\n') as f:
+        f.write(code)
+    os.replace(tmp_path, path)
+
+
+def read_exchange(long_file, docs_file):
+    """按 SAS 的读取方式载入交接文件，返回 (CSR 矩阵, 文档标签)，维度以文档表和特征数为准"""
+    docs = pd.read_csv(docs_file, encoding=CSV_ENCODING)
+    bundle = read_long_format(long_file, n_docs=len(docs))
+    return bundle.matrix, docs['doc_id'].astype(str).tolist()
+
+
+def reference_cos_sim(matrix, zero_norm=None):
+    """cos_sim_3.sas 的 Python 参照实现：norms = sqrt(X[,##])，存在零向量时整体 + 1e-12，再 X_norm * X_norm`"""
+    zero_norm = PARITY_SETTINGS['zero_norm'] if zero_norm is None else zero_norm
+    X = matrix.toarray() if hasattr(matrix, 'toarray') else np.asarray(matrix, dtype=float)
+    norms = np.sqrt((X ** 2).sum(axis=1, keepdims=True))
+    if norms.min() < zero_norm:
+        norms = norms + zero_norm
+    X_norm = X / norms
+    return X_norm @ X_norm.T
+
+
+def read_sas_result(path):
+    """读取 SAS 导出的 cos_sim_result（doc_names, doc1..docN）"""
+    return pd.read_csv(path, index_col=0).values
+
+
+def check_parity(matrix_path=None, long_file=None, docs_file=None, sas_result=None, atol=None):
+    """数值一致性校验，返回 {检查项: 最大绝对误差}；任一项超过 atol 即打印警告
+
+    - exchange：长表交接文件还原的矩阵 vs 建模输出的 .npz（交接文件未截断/错位）
+    - reference：参照实现（SAS 算法）vs .npz 直接计算的余弦
+    - sas：SAS 实际输出 vs 参照实现（提供 sas_result 时）
+    """
+    atol = PARITY_SETTINGS['atol'] if atol is None else atol
+    bundle = load_tfidf_npz(matrix_path or MATRIX_PATH)
+    exchanged, labels = read_exchange(long_file or LONG_FILE, docs_file or DOCS_FILE)
+
+    results = {}
+    if exchanged.shape[0] != bundle.matrix.shape[0] or exchanged.shape[1] > bundle.matrix.shape[1]:
+        raise ValueError(f"交接文件维度 {exchanged.shape} 与矩阵 {bundle.matrix.shape} 不一致")
+    exchanged.resize(bundle.matrix.shape)  # 末尾全零的特征列在长表中没有记录
+    results['exchange'] = float(abs(exchanged - bundle.matrix).max()) if bundle.matrix.nnz else 0.0
+
+    reference = reference_cos_sim(exchanged)
+    direct = reference_cos_sim(bundle.matrix)
+    results['reference'] = float(np.abs(reference - direct).max())
+
+    if sas_result is not None:
+        sas = read_sas_result(sas_result)
+        if sas.shape != reference.shape:
+            raise ValueError(f"SAS 结果维度 {sas.shape} 与参照结果 {reference.shape} 不一致")
+        results['sas'] = float(np.abs(sas - reference).max())
+
+    for name, error in results.items():
+        mark = "✅" if error <= atol else "⚠️"
+        print(f"{mark} {name}：最大绝对误差 {error:.3e}（允许 {atol:.0e}）")
+    return results
+
+
+if __name__ == "__main__":
+    sas_result = sys.argv[1] if len(sys.argv) > 1 else None
+    try:
+        check_parity(sas_result=sas_result)
+    except Exception as e:
+        print(f"\n❌ 错误：{str(e)}")
+        print("应急处理：")
+        print("1. 确认已运行 建模.py 生成 .npz 与长表交接文件")
+        print("2. 维度不一致时重新运行 建模.py，SAS 端会自动使用新生成的 tfidf_import.sas")
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+分词器状态预构建 v1.0
+功能：将结巴基础词典 + 自定义词典编译后的前缀词典（FREQ/total/词性表）
+      序列化为单个 marshal 文件，后续进程一次 load 即可就绪，
+      不再重复 jieba.initialize() 和逐词 load_userdict()
+格式：前缀词典按列存储（词条以换行拼接的字符串 + int64 词频数组），
+      加载时 dict(zip()) 重建，比直接 marshal 几十万项的 dict 快数倍
+失效：文件名包含结巴版本、基础词典与各自定义词典的内容哈希，任一变化即重建
+"""
+
+import os
+import time
+import array
+import marshal
+import hashlib
+import jieba
+import jieba.finalseg
+from typing import List
+
+from token_cache import file_digest
+
+ARTIFACT_FORMAT_VERSION = "2"
+_LOADED_KEY = None  # 当前进程已加载的状态，避免重复加载
+
+
+def _base_dict_path() -> str:
+    """结巴内置基础词典路径"""
+    if jieba.dt.dictionary == jieba.DEFAULT_DICT:
+        return os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME)
+    return jieba.dt.dictionary
+
+
+def _short_hash(parts: List[str]) -> str:
+    return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def artifact_path(user_dicts: List[str], artifact_dir: str) -> str:
+    """根据词典组合与内容生成预构建文件路径"""
+    set_id = _short_hash([os.path.abspath(p) for p in user_dicts])
+    fingerprint = _short_hash(
+        [ARTIFACT_FORMAT_VERSION, jieba.__version__, file_digest(_base_dict_path())]
+        + [file_digest(p) for p in user_dicts]
+    )
+    return os.path.join(artifact_dir, f"segmenter_{set_id}_{fingerprint}.marshal")
+
+
+def _load_userdicts(user_dicts: List[str]) -> None:
+    """传统方式：逐个加载自定义词典"""
+    for path in user_dicts:
+        if os.path.exists(path):
+            jieba.load_userdict(path)
+            print(f"✅ 自定义词典加载成功：{os.path.basename(path)}")
+        else:
+            print(f"⚠️ 警告：自定义词典文件 {path} 不存在")
+
+
+def _dump_state(path: str) -> None:
+    """序列化当前分词器状态（先写临时文件再原子替换），并清理同组合的旧版本"""
+    dt = jieba.dt
+    state = {
+        'words': "\n".join(dt.FREQ.keys()),
+        'freqs': array.array('q', dt.FREQ.values()).tobytes(),
+        'total': dt.total,
+        'user_word_tag_tab': dt.user_word_tag_tab,
+        'force_split': set(jieba.finalseg.Force_Split_Words)
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        marshal.dump(state, f)
+    os.replace(tmp_path, path)
+
+    prefix = os.path.basename(path).rsplit('_', 1)[0] + '_'
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(prefix) and name.endswith('.marshal') and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(os.path.dirname(path), name))
+            except OSError:
+                pass
+
+
+def _restore_state(path: str) -> None:
+    """从预构建文件恢复分词器状态"""
+    with open(path, 'rb') as f:
+        state = marshal.load(f)
+    freqs = array.array('q')
+    freqs.frombytes(state['freqs'])
+    freq = dict(zip(state['words'].split("\n"), freqs))
+    total = state['total']
+    tags, force_split = state['user_word_tag_tab'], state['force_split']
+    dt = jieba.dt
+    with dt.lock:
+        dt.FREQ = freq
+        dt.total = total
+        dt.user_word_tag_tab = tags
+        dt.initialized = True
+    jieba.finalseg.Force_Split_Words.update(force_split)
+
+
+def load_segmenter(user_dicts: List[str], artifact_dir: str, prebuilt: bool = True) -> float:
+    """初始化结巴并加载自定义词典，返回耗时（秒）
+
+    prebuilt=True 时优先加载预构建状态；不存在或已失效则按传统方式构建后写出。
+    """
+    global _LOADED_KEY
+    start = time.perf_counter()
+    key = (tuple(user_dicts), artifact_dir, prebuilt)
+    if _LOADED_KEY == key:
+        return 0.0
+
+    if not prebuilt or jieba.dt.initialized:
+        # 当前进程已初始化过结巴时无法得到干净的快照，直接走传统方式
+        jieba.initialize()
+        _load_userdicts(user_dicts)
+    else:
+        path = artifact_path(user_dicts, artifact_dir)
+        try:
+            _restore_state(path)
+            print(f"✅ 已加载预构建分词器：{os.path.basename(path)}")
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            jieba.initialize()
+            _load_userdicts(user_dicts)
+            try:
+                _dump_state(path)
+                print(f"✅ 已生成预构建分词器：{os.path.basename(path)}")
+            except OSError as e:
+                print(f"⚠️ 预构建分词器写入失败：{str(e)}")
+
+    _LOADED_KEY = key
+    elapsed = time.perf_counter() - start
+    print(f"分词器就绪，耗时 {elapsed:.2f}s")
+    return elapsed
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+分块稀疏余弦相似度引擎 v1.0
+功能：替代 cos_sim_3.sas / cos_sim_sparse.sas 中 PROC IML 的 X_norm * X_norm` 全量计算
+  - 输入 建模.py 输出的稀疏 .npz（或长表 CSV），行向量做 L2 归一化后按行分块相乘
+  - 每次只持有 block_size × N 的结果块，内存由块大小而非 N² 决定
+  - full 模式：按块流式写出完整矩阵，格式与 SAS 导出的 cos_sim_result 一致；
+    记录各行的行键与内容指纹，下次只重算新增/内容变化的行与列，其余从上次结果复用
+  - topk 模式：每篇文档只保留相似度不低于阈值的前 k 个邻居（不含自身），输出长表
+  - paired 模式：只计算每个 doc_id 的初稿/终稿行间余弦，N 对文档只需 N 次行内积
+  - 多块并行：线程（稀疏乘法在 C 层执行）或进程，按块顺序写出
+用法：python similarity.py [full|topk|paired]
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import contextvars
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from sklearn.preprocessing import normalize
+from tfidf_io import load_tfidf_npz, read_long_format
+
+# ================= 配置区 =================
+INPUT_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz"  # 也支持长表 tfidf_long_2.csv
+OUTPUT_FILE = r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_result4.csv"  # full 模式输出（SAS原格式）
+TOPK_FILE = r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_topk.csv"  # topk 模式输出
+PAIRED_FILE = r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_paired.csv"  # paired 模式输出
+
+ENGINE_SETTINGS = {
+    'mode': 'full',  # full：完整 N×N 矩阵 | topk：每篇只保留最相似的 k 篇 | paired：每个doc_id初稿对终稿
+    'block_size': 256,  # 每块行数，单块内存约 block_size × N × 8 字节
+    'executor': 'thread',  # thread | process
+    'workers': os.cpu_count() or 1,
+    'top_k': 10,
+    'threshold': 0.0,  # topk 模式下低于该值的邻居不输出
+    'float_format': "%.9f"
+}
+
+INCREMENTAL_SETTINGS = {  # 仅 full 模式，且矩阵带行键（doc_id:draft / doc_id:final）时生效
+    'enabled': True,
+    'state_file': r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_rows.json",  # 上次结果的行键 + 行指纹
+    'max_dirty_ratio': 0.5  # 需重算的行超过该比例时直接全量计算
+}
+# =========================================
+
+_WORKER_MATRIX = None  # 进程模式下各子进程持有的 (X, X')
+
+
+def prepare_matrix(matrix):
+    """CSR + 行 L2 归一化（零向量行保持为零，相似度为0）"""
+    return normalize(sp.csr_matrix(matrix, dtype=np.float64), norm='l2', axis=1, copy=True)
+
+
+def similarity_rows(matrix, start, end, transposed=None):
+    """第 start~end-1 行与全部文档的余弦相似度（稠密块，matrix 需已归一化）"""
+    transposed = matrix.T.tocsr() if transposed is None else transposed
+    return (matrix[start:end] @ transposed).toarray()
+
+
+def select_topk(block, start, top_k, threshold):
+    """从相似度块中选出每行前 k 个邻居，返回 (行号, 邻居号, 相似度, 名次) 数组"""
+    block = block.copy()
+    block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = -np.inf  # 排除自身
+    k = min(top_k, block.shape[1] - 1)
+    if k <= 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([]), empty
+
+    candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(block, candidates, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+
+    keep = (scores >= threshold) & (scores > 0)  # 无共同特征词的文档不算邻居
+    rows = np.repeat(np.arange(start, start + block.shape[0]), k).reshape(-1, k)
+    ranks = np.tile(np.arange(1, k + 1), (block.shape[0], 1))
+    return rows[keep], candidates[keep], scores[keep], ranks[keep]
+
+
+def _compute_block(start, end, mode, top_k, threshold, matrices=None):
+    matrix, transposed = matrices if matrices is not None else _WORKER_MATRIX
+    block = similarity_rows(matrix, start, end, transposed)
+    if mode == 'topk':
+        return select_topk(block, start, top_k, threshold)
+    return block
+
+
+def _init_worker(matrix):
+    global _WORKER_MATRIX
+    _WORKER_MATRIX = (matrix, matrix.T.tocsr())
+
+
+def _ordered_results(executor, tasks, window):
+    """按提交顺序取回结果，同时在途的块不超过 window 个"""
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(*task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_blocks(matrix, mode='full', settings=None):
+    """逐块产出计算结果（按行顺序）：full 为稠密块，topk 为邻居数组"""
+    settings = {**ENGINE_SETTINGS, **(settings or {})}
+    n = matrix.shape[0]
+    block_size = max(1, settings['block_size'])
+    workers = max(1, min(settings['workers'], (n + block_size - 1) // block_size))
+    args = (mode, settings['top_k'], settings['threshold'])
+
+    if workers == 1:
+        matrices = (matrix, matrix.T.tocsr())
+        for start in range(0, n, block_size):
+            yield _compute_block(start, min(start + block_size, n), *args, matrices=matrices)
+        return
+
+    if settings['executor'] == 'process':
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix,))
+        tasks = ((_compute_block, s, min(s + block_size, n)) + args for s in range(0, n, block_size))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        matrices = (matrix, matrix.T.tocsr())
+        # 每个任务在提交时复制上下文，常驻进程内工作线程的输出仍写入所属阶段的日志
+        tasks = ((contextvars.copy_context().run, _compute_block, s, min(s + block_size, n)) + args + (matrices,)
+                 for s in range(0, n, block_size))
+    with executor:
+        yield from _ordered_results(executor, tasks, workers * 2)
+
+
+def write_full_matrix(matrix, output_path, settings=None):
+    """流式写出完整相似度矩阵：doc_names, doc1..docN（与SAS导出一致）"""
+    settings = {**ENGINE_SETTINGS, **(settings or {})}
+    n = matrix.shape[0]
+    labels = [f"doc{i + 1}" for i in range(n)]
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(",".join(['doc_names'] + labels) + "\n")
+        start = 0
+        for block in iter_blocks(matrix, 'full', settings):
+            index = pd.Index(labels[start:start + block.shape[0]], name='doc_names')
+            pd.DataFrame(block, index=index).to_csv(f, header=False, float_format=settings['float_format'])
+            start += block.shape[0]
+    os.replace(tmp_path, output_path)
+
+
+def row_fingerprints(matrix):
+    """各行内容指纹（列下标 + 权重），行向量不变则指纹不变"""
+    matrix = matrix if matrix.has_sorted_indices else matrix.sorted_indices()
+    return [hashlib.blake2b(matrix.indices[s:e].astype(np.int64).tobytes() + matrix.data[s:e].tobytes(),
+                            digest_size=8).hexdigest()
+            for s, e in zip(matrix.indptr[:-1], matrix.indptr[1:])]
+
+
+def load_row_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_row_state(path, row_keys, fingerprints, float_format):
+    """记录结果文件对应的行键与行指纹；没有行键时删除旧记录（结果文件已不对应）"""
+    if row_keys is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'row_keys': list(row_keys), 'fingerprints': fingerprints, 'float_format': float_format}, f)
+    os.replace(path + ".tmp", path)
+
+
+def update_full_matrix(matrix, row_keys, fingerprints, state, output_path, settings=None):
+    """增量更新完整相似度矩阵：行键与指纹都与上次（state）相同的行复用旧结果，只重算其余行/列（点积即余弦）
+
+    返回重算的行数；没有可用的上次结果、维度不符或变更过多时返回 None，由调用方全量计算
+    """
+    settings = {**ENGINE_SETTINGS, **(settings or {})}
+    if state is None or not os.path.exists(output_path) or state.get('float_format') != settings['float_format']:
+        return None
+    previous = {key: (i, fp) for i, (key, fp) in enumerate(zip(state['row_keys'], state['fingerprints']))}
+    dirty = [i for i, (key, fp) in enumerate(zip(row_keys, fingerprints)) if previous.get(key, (None, None))[1] != fp]
+    if len(dirty) > INCREMENTAL_SETTINGS['max_dirty_ratio'] * len(row_keys):
+        return None
+    previous_sim = pd.read_csv(output_path, index_col=0).values
+    if previous_sim.shape != (len(previous), len(previous)):
+        return None
+
+    dirty_set = set(dirty)
+    keep = [i for i in range(len(row_keys)) if i not in dirty_set]
+    old = [previous[row_keys[i]][0] for i in keep]
+    sim = np.empty((len(row_keys), len(row_keys)))
+    sim[np.ix_(keep, keep)] = previous_sim[np.ix_(old, old)]
+    dirty_sim = (matrix[dirty] @ matrix.T).toarray()
+    sim[dirty, :] = dirty_sim
+    sim[:, dirty] = dirty_sim.T
+
+    labels = [f"doc{i + 1}" for i in range(len(row_keys))]
+    tmp_path = output_path + ".tmp"
+    pd.DataFrame(sim, index=pd.Index(labels, name='doc_names'), columns=labels).to_csv(
+        tmp_path, float_format=settings['float_format'])
+    os.replace(tmp_path, output_path)
+    return len(dirty)
+
+
+def write_topk(matrix, labels, output_path, settings=None):
+    """写出 top-k 邻居长表：doc_index, doc_id, rank, neighbor_index, neighbor_id, cos_sim（下标从1开始）
+
+    labels 为各行的标识：矩阵带行键时传入行键（doc_id:draft / doc_id:final），可直接关联回 text_pairs；
+    长表输入没有行键，退回 docN 标签
+    """
+    settings = {**ENGINE_SETTINGS, **(settings or {})}
+    labels = np.asarray(labels, dtype=str)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    count = 0
+    with open(tmp_path, 'w', encoding='utf_8_sig', newline='') as f:
+        f.write("doc_index,doc_id,rank,neighbor_index,neighbor_id,cos_sim\n")
+        for rows, cols, scores, ranks in iter_blocks(matrix, 'topk', settings):
+            pd.DataFrame({
+                'doc_index': rows + 1,
+                'doc_id': labels[rows],
+                'rank': ranks,
+                'neighbor_index': cols + 1,
+                'neighbor_id': labels[cols],
+                'cos_sim': scores
+            }).to_csv(f, header=False, index=False, float_format=settings['float_format'])
+            count += len(rows)
+    os.replace(tmp_path, output_path)
+    return count
+
+
+def pair_rows(bundle):
+    """初稿/终稿行下标配对：优先按行键（doc_id:draft / doc_id:final），否则按 建模.py 的前后两半拼接顺序"""
+    if bundle.row_keys:
+        position = {key: i for i, key in enumerate(bundle.row_keys)}
+        doc_ids = [key.rsplit(':', 1)[0] for key in bundle.row_keys if key.endswith(':draft')]
+        pairs = [(d, position[f"{d}:draft"], position[f"{d}:final"])
+                 for d in doc_ids if f"{d}:final" in position]
+        doc_ids, draft_rows, final_rows = zip(*pairs) if pairs else ((), (), ())
+        return list(doc_ids), np.array(draft_rows, dtype=np.int64), np.array(final_rows, dtype=np.int64)
+
+    n = bundle.matrix.shape[0] // 2
+    return list(bundle.doc_labels[:n]), np.arange(n), np.arange(n, 2 * n)
+
+
+def paired_similarity(matrix, draft_rows, final_rows):
+    """逐对行余弦（matrix 需已归一化）：对应行逐元素相乘后按行求和，全程稀疏"""
+    return np.asarray(matrix[draft_rows].multiply(matrix[final_rows]).sum(axis=1)).ravel()
+
+
+def write_paired(bundle, matrix, output_path, settings=None):
+    """写出每个 doc_id 的初稿/终稿相似度：doc_id, cos_sim"""
+    settings = {**ENGINE_SETTINGS, **(settings or {})}
+    doc_ids, draft_rows, final_rows = pair_rows(bundle)
+    if not doc_ids:
+        raise ValueError("未找到初稿/终稿配对：行键中缺少成对的 doc_id:draft / doc_id:final，未写出结果")
+    scores = paired_similarity(matrix, draft_rows, final_rows)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    pd.DataFrame({'doc_id': doc_ids, 'cos_sim': scores}).to_csv(
+        output_path, index=False, float_format=settings['float_format'], encoding='utf_8_sig')
+    return scores
+
+
+def load_matrix(path):
+    """读取 TF-IDF 矩阵：.npz 或长表 CSV，返回 TfidfBundle"""
+    if path.endswith('.npz'):
+        return load_tfidf_npz(path)
+    return read_long_format(path)
+
+
+def main(mode=None, bundle=None):
+    """bundle 为建模阶段在内存中传入的 TfidfBundle（省去重新读取）；成功返回 True"""
+    mode = mode or ENGINE_SETTINGS['mode']
+    try:
+        start_time = time.perf_counter()
+        source = "内存" if bundle is not None else os.path.basename(INPUT_PATH)
+        bundle = bundle if bundle is not None else load_matrix(INPUT_PATH)
+        matrix = prepare_matrix(bundle.matrix)
+        n = matrix.shape[0]
+        print(f"✅ 成功加载矩阵：{source}（文档 {n} | 非零项 {matrix.nnz}）")
+        if n < 2:
+            print("❌ 错误：需要至少2个文档进行相似度分析")
+            return False
+
+        if mode == 'paired':
+            scores = write_paired(bundle, matrix, PAIRED_FILE)
+            print(f"✅ 初稿/终稿相似度已保存：{PAIRED_FILE}（{len(scores)} 对 | 平均 {scores.mean():.4f}）")
+        elif mode == 'topk':
+            count = write_topk(matrix, bundle.row_keys or bundle.doc_labels, TOPK_FILE)
+            print(f"✅ Top-{ENGINE_SETTINGS['top_k']} 邻居已保存：{TOPK_FILE}（{count} 条）")
+        else:
+            row_keys = bundle.row_keys if INCREMENTAL_SETTINGS['enabled'] else None
+            fingerprints = row_fingerprints(matrix) if row_keys else None
+            state = load_row_state(INCREMENTAL_SETTINGS['state_file']) if row_keys else None
+            save_row_state(INCREMENTAL_SETTINGS['state_file'], None, None, None)  # 写出期间中断时不留下过期记录
+            updated = update_full_matrix(matrix, row_keys, fingerprints, state, OUTPUT_FILE) if row_keys else None
+            if updated is None:
+                write_full_matrix(matrix, OUTPUT_FILE)
+                print(f"✅ 相似度矩阵已保存：{OUTPUT_FILE}")
+            else:
+                print(f"✅ 相似度矩阵已增量更新：{OUTPUT_FILE}（重算 {updated}/{n} 行）")
+            save_row_state(INCREMENTAL_SETTINGS['state_file'], row_keys, fingerprints, ENGINE_SETTINGS['float_format'])
+        print(f"耗时 {time.perf_counter() - start_time:.2f}s | "
+              f"{ENGINE_SETTINGS['executor']} × {ENGINE_SETTINGS['workers']} | 块大小 {ENGINE_SETTINGS['block_size']}")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ 错误：{str(e)}")
+        print("应急处理：")
+        print("1. 确认已运行 建模.py 生成TF-IDF矩阵")
+        print("2. 内存不足时减小 block_size 或 workers")
+
+
+if __name__ == "__main__":
+    arg = sys.argv[1] if len(sys.argv) > 1 else None
+    if arg not in (None, 'full', 'topk', 'paired'):
+        print("用法：python similarity.py [full|topk|paired]")
+        sys.exit(1)
+    main(arg)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+常驻进程阶段执行器 v1.0
+功能：监控服务内直接调用各阶段入口，替代每步启动一个新的 Python 解释器
+  - jieba / pandas / sklearn / matplotlib / seaborn / plotly 只在启动时导入一次，分词词典只加载一次
+  - 阶段之间在内存中传递结果：preprocess 的 DataFrame -> 建模 -> 稀疏 TfidfBundle -> similarity / 差异特征图，
+    下游不再重新读取解析上游文件；文件仍照常写出，作为最终产物与依赖图的判断依据
+  - 同目录下的模块源码有改动时自动重新加载（修改 visualization.py 后无需重启服务）
+  - 未注册的阶段（如 SAS 脚本）由调用方按原方式启动子进程
+  - 可在多个线程中同时执行不同阶段：capture_output 按上下文（contextvars）把各阶段的输出分别写入阶段日志，
+    阶段内复制了上下文的工作线程同样写入该日志；STAGE_LOCKS 中的阶段互斥
+  - 按当前配置会启动进程池的阶段（批量预处理、进程模式的相似度计算）不在进程内执行，子进程的输出不经过本进程
+"""
+
+import os
+import sys
+import threading
+import importlib
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# 常驻进程中不弹出图形窗口（也避免后台线程使用 GUI 后端）
+import matplotlib
+matplotlib.use('Agg')
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 阶段名 -> 模块名（阶段名与 pipeline_monitor.PIPELINE_STAGES 一致）
+# pos_analysis / 初级主题词典代码 使用与 preprocess 不同的分词词典，而结巴词典为进程全局状态，始终在独立进程中运行
+STAGE_MODULES = {
+    'preprocess': 'preprocess',
+    'tfidf': '建模',
+    'similarity': 'similarity',
+    'similarity_paired': 'similarity',
+    'feature_diff': 'visualization',
+    'heatmap': 'visualization',
+    'pos_radar': 'visualization'
+}
+# 并行执行时需要互斥的阶段：pyplot 状态机不是线程安全的
+STAGE_LOCKS = {
+    'feature_diff': 'pyplot',
+    'heatmap': 'pyplot',
+    'pos_radar': 'pyplot'
+}
+# 按当前配置会在内部启动进程池的阶段：模块名 -> 判断函数；子进程的输出无法按上下文分流，这类阶段交由调用方启动子进程
+PROCESS_POOL_STAGES = {
+    'preprocess': lambda m: m.BATCH_SETTINGS['enabled'],
+    'similarity': lambda m: m.ENGINE_SETTINGS['executor'] == 'process' and m.ENGINE_SETTINGS['workers'] > 1
+}
+_TEXT_COLUMNS = {'doc_id', 'draft_clean', 'final_clean'}
+_STAGE_OUTPUT = contextvars.ContextVar('stage_output', default=None)
+
+
+class _ContextRoutedStream:
+    """按上下文分流的输出流：capture_output 内（及复制其上下文的线程中）写入阶段日志，其余写原输出"""
+
+    def __init__(self, default):
+        self.default = default
+
+    def _target(self):
+        target = _STAGE_OUTPUT.get()
+        return self.default if target is None else target
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+
+def install_output_router():
+    """把 sys.stdout / sys.stderr 替换为按上下文分流的输出流（只需调用一次）"""
+    for name in ('stdout', 'stderr'):
+        if not isinstance(getattr(sys, name), _ContextRoutedStream):
+            setattr(sys, name, _ContextRoutedStream(getattr(sys, name)))
+
+
+@contextmanager
+def capture_output(stream):
+    """当前上下文的 print 输出（含 stderr）写入 stream；
+    阶段内的线程池需用 contextvars.copy_context().run 提交任务，工作线程的输出才会一并写入"""
+    install_output_router()
+    token = _STAGE_OUTPUT.set(stream)
+    try:
+        yield stream
+    finally:
+        _STAGE_OUTPUT.reset(token)
+
+
+class WarmStageRunner:
+    """在当前进程内执行阶段；memory 保存本轮各产物的内存结果"""
+
+    def __init__(self):
+        self.memory = {}
+        self._mtimes = {}
+        self._locks = defaultdict(threading.Lock)
+
+    def warm_up(self):
+        """预先导入全部阶段模块并加载分词器；缺少可选依赖的阶段留待运行时再报错"""
+        for name, module_name in STAGE_MODULES.items():
+            try:
+                self.module(module_name)
+            except ImportError as e:
+                print(f"⚠️ 阶段 {name} 暂不可用：{str(e)}")
+        if 'preprocess' in sys.modules:
+            sys.modules['preprocess'].ensure_segmenter()
+        print("✅ 常驻执行器已就绪（依赖与分词器已加载）")
+
+    def _local_modules(self):
+        """已导入的、位于本目录的模块"""
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None)
+            if path and os.path.dirname(os.path.abspath(path)) == _HERE and name != __name__:
+                yield name, module, path
+
+    def refresh(self):
+        """源码有改动时重新加载；改动的是辅助模块（如 tfidf_io）时，阶段模块一并重新加载以更新 from ... import 引用"""
+        changed = [name for name, module, path in self._local_modules()
+                   if self._mtimes.get(name) not in (None, os.path.getmtime(path))]
+        if not changed:
+            return
+        stage_names = set(STAGE_MODULES.values())
+        reload_names = list(changed)
+        if not stage_names.issuperset(changed):
+            reload_names += [name for name in stage_names if name in sys.modules and name not in changed]
+        for name in reload_names:
+            importlib.reload(sys.modules[name])
+        print(f"🔄 已重新加载：{', '.join(reload_names)}")
+        self._record_mtimes()
+
+    def _record_mtimes(self):
+        for name, module, path in self._local_modules():
+            self._mtimes[name] = os.path.getmtime(path)
+
+    def module(self, module_name):
+        module = importlib.import_module(module_name)
+        self._record_mtimes()
+        return module
+
+    def begin_run(self):
+        """新一轮运行：检查源码改动，清空上一轮的内存结果"""
+        self.refresh()
+        self.memory.clear()
+
+    def supports(self, stage_name):
+        """阶段可在进程内执行；按当前配置会启动进程池的阶段返回 False"""
+        if stage_name not in STAGE_MODULES:
+            return False
+        uses_pool = PROCESS_POOL_STAGES.get(stage_name)
+        return uses_pool is None or not uses_pool(self.module(STAGE_MODULES[stage_name]))
+
+    def run(self, stage_name):
+        """执行一个阶段；阶段报告失败时抛出 RuntimeError"""
+        lock = self._locks[STAGE_LOCKS[stage_name]] if stage_name in STAGE_LOCKS else nullcontext()
+        with lock:
+            getattr(self, f"_run_{stage_name}")(self.module(STAGE_MODULES[stage_name]))
+
+    # ----------------- 各阶段入口 -----------------
+    def _run_preprocess(self, module):
+        df = module.main()
+        if df is not None and _TEXT_COLUMNS.issubset(df.columns):  # 流式模式只返回统计信息
+            self.memory['text_pairs'] = df
+
+    def _run_tfidf(self, module):
+        bundle = module.main(df=self.memory.get('text_pairs'))
+        if bundle is None:
+            raise RuntimeError("建模未生成TF-IDF矩阵（详见上方错误信息）")
+        self.memory['tfidf_matrix'] = bundle
+
+    def _run_similarity(self, module):
+        if not module.main(bundle=self.memory.get('tfidf_matrix')):
+            raise RuntimeError("相似度计算失败（详见上方错误信息）")
+
+    def _run_similarity_paired(self, module):
+        if not module.main(mode='paired', bundle=self.memory.get('tfidf_matrix')):
+            raise RuntimeError("初稿/终稿相似度计算失败（详见上方错误信息）")
+
+    def _run_feature_diff(self, module):
+        if not module.main(tfidf=self.memory.get('tfidf_matrix'), parts=['diff']):
+            raise RuntimeError("差异特征图失败（详见上方错误信息）")
+
+    def _run_heatmap(self, module):
+        if not module.main(parts=['heatmap']):
+            raise RuntimeError("相似度热力图失败（详见上方错误信息）")
+
+    def _run_pos_radar(self, module):
+        if not module.main(parts=['radar']):
+            raise RuntimeError("词性雷达图失败（详见上方错误信息）")
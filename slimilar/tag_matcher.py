@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+标签与领域术语匹配 v1.0（Aho–Corasick 自动机）
+功能：把用户评论与产品标签、领域术语做多模式匹配（README 场景2 的 match_tags），不经过分词
+  - 模式来源：domain_dictionary.txt、combined_dict.txt（每行一词）与标签同义词表（标签: 同义词1, 同义词2）
+  - 一次扫描原文即找出全部命中，返回标签、触发词与位置 [start, end)；英文与全角字母数字不区分大小写/全半角
+  - 默认取最左最长且互不重叠的命中（“快速充电”不再重复报告“充电”）
+  - 词典变化时重建：新自动机构建完成后一次性替换引用，匹配线程无需加锁，也不会看到半成品
+用法：
+  python tag_matcher.py <文本文件>    （逐行匹配并输出命中的标签）
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+from collections import namedtuple
+from text_io import read_text
+
+# ================= 配置区 =================
+DICTIONARY_SOURCES = {  # 来源名 -> 词典文件（每行一词，命中时标签即该词）
+    'domain': r"D:\SASanalysis\SAS_text\python_SAS\domain_dictionary.txt",
+    'combined': r"D:\SASanalysis\SAS_text\combined_dict.txt"
+}
+TAG_SYNONYMS_PATH = r"D:\SASanalysis\SAS_text\python_SAS\tag_synonyms.txt"
+
+MATCH_SETTINGS = {
+    'overlapping': False,  # True 时报告全部命中（含相互重叠的）
+    'min_length': 2,  # 短于该长度的词不参与匹配，避免单字误报
+    'watch_interval': 5  # 后台检查词典变化的间隔（秒）
+}
+# =========================================
+
+Match = namedtuple('Match', ['tag', 'term', 'start', 'end', 'source'])
+
+# 全角字母数字 -> 半角，英文大写 -> 小写；逐字符映射，不改变文本长度，位置可直接对应原文
+_FOLD = str.maketrans(
+    {**{chr(c): chr(c + 32) for c in range(ord('A'), ord('Z') + 1)},
+     **{chr(c): chr(c - 0xFEE0).lower() for c in range(ord('Ａ'), ord('Ｚ') + 1)},
+     **{chr(c): chr(c - 0xFEE0) for c in range(ord('ａ'), ord('ｚ') + 1)},
+     **{chr(c): chr(c - 0xFEE0) for c in range(ord('０'), ord('９') + 1)}}
+)
+
+
+def normalize(text):
+    return text.translate(_FOLD)
+
+
+class Automaton:
+    """构建完成后只读的 Aho–Corasick 自动机：goto 为每个状态的转移表，out 为该状态结束的模式编号"""
+
+    def __init__(self, patterns):
+        """patterns: [(词, 标签, 来源)]，同一词重复出现时保留第一个"""
+        self.patterns = []
+        goto, out = [{}], [[]]
+        seen = set()
+        for term, tag, source in patterns:
+            key = normalize(term)
+            if key in seen:
+                continue
+            seen.add(key)
+            state = 0
+            for ch in key:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(len(self.patterns))
+            self.patterns.append((term, tag, source, len(key)))
+
+        # 广度优先求失败链接，并把失败链上的输出并入本状态
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+        self.goto = goto
+        self.fail = fail
+        self.out = [tuple(o) for o in out]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def scan(self, text):
+        """一次扫描，按结束位置顺序给出全部命中 (模式编号, 起点, 终点)"""
+        goto, fail, out, patterns = self.goto, self.fail, self.out, self.patterns
+        state = 0
+        for i, ch in enumerate(normalize(text)):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                yield pid, i + 1 - patterns[pid][3], i + 1
+
+
+def _read_lines(path):
+    """读取词典文件的有效行：忽略空行、# 注释与 ... 占位行"""
+    text, _ = read_text(path)
+    for line in text.splitlines():
+        line = line.strip().lstrip('\ufeff')
+        if line and not line.startswith('#') and line.strip('.…'):
+            yield line
+
+
+def load_dictionary(path, source):
+    return [(term, term, source) for term in _read_lines(path)]
+
+
+def load_synonyms(path):
+    """同义词表：每行“标签: 同义词1, 同义词2”，标签本身也作为模式"""
+    patterns = []
+    for line in _read_lines(path):
+        tag, *rest = re.split(r'[:：]', line, maxsplit=1)
+        tag = tag.strip()
+        rest = rest[0] if rest else ''
+        patterns.append((tag, tag, 'tag'))
+        patterns += [(term, tag, 'tag') for term in re.split(r'[,，、;；]', rest) if term.strip()]
+    return [(term.strip(), tag, source) for term, tag, source in patterns]
+
+
+class TagMatcher:
+    """线程安全的匹配器：match / match_tags 读取当前自动机，rebuild 构建新自动机后整体替换"""
+
+    def __init__(self, sources=None, synonyms_path=None, settings=None):
+        self.sources = dict(DICTIONARY_SOURCES if sources is None else sources)
+        self.synonyms_path = TAG_SYNONYMS_PATH if synonyms_path is None else synonyms_path
+        self.settings = {**MATCH_SETTINGS, **(settings or {})}
+        self._automaton = Automaton([])
+        self._signature = None
+        self._build_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+        self.rebuild()
+
+    # ----------------- 构建与切换 -----------------
+    def _paths(self):
+        """(来源, 路径)；同义词表优先，标签与术语同名时按标签报告"""
+        paths = [('tag', self.synonyms_path)] if self.synonyms_path else []
+        return paths + list(self.sources.items())
+
+    def _source_signature(self):
+        signature = []
+        for _, path in self._paths():
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def rebuild(self):
+        """重新读取全部词典并构建自动机；成功后原子替换，失败时保留旧自动机并返回 False"""
+        with self._build_lock:
+            signature = self._source_signature()
+            patterns = []
+            try:
+                for source, path in self._paths():
+                    if not os.path.exists(path):
+                        print(f"ℹ️ 词典不存在，已跳过：{path}")
+                        continue
+                    patterns += load_synonyms(path) if source == 'tag' else load_dictionary(path, source)
+                patterns = [p for p in patterns if len(p[0]) >= self.settings['min_length']]
+                start_time = time.perf_counter()
+                automaton = Automaton(patterns)
+            except Exception as e:
+                print(f"⚠️ 词典重建失败，继续使用旧词典：{str(e)}")
+                return False
+            self._automaton = automaton  # 单次引用赋值即切换，正在进行的匹配继续使用旧自动机
+            self._signature = signature
+            print(f"✅ 匹配词典已加载：{len(automaton)} 个模式（{(time.perf_counter() - start_time) * 1000:.0f} ms）")
+            return True
+
+    def refresh(self):
+        """词典文件有变化时重建；返回是否重建"""
+        if self._source_signature() == self._signature:
+            return False
+        return self.rebuild()
+
+    def start_watching(self, interval=None):
+        """后台线程定期检查词典变化并自动重建"""
+        if self._watcher is not None:
+            return
+        interval = interval or self.settings['watch_interval']
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.wait(interval):
+                self.refresh()
+
+        self._watcher = threading.Thread(target=loop, name="tag-matcher-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop_event.set()
+            self._watcher.join()
+            self._watcher = None
+
+    # ----------------- 匹配 -----------------
+    def match(self, text):
+        """返回命中列表 [Match]，按起点排序"""
+        automaton = self._automaton
+        hits = [(start, end, pid) for pid, start, end in automaton.scan(text)]
+        if not self.settings['overlapping']:
+            hits.sort(key=lambda h: (h[0], -h[1]))
+            kept, last_end = [], 0
+            for hit in hits:
+                if hit[0] >= last_end:
+                    kept.append(hit)
+                    last_end = hit[1]
+            hits = kept
+        else:
+            hits.sort()
+        return [Match(automaton.patterns[pid][1], text[start:end], start, end, automaton.patterns[pid][2])
+                for start, end, pid in hits]
+
+    def match_tags(self, text, tags=None):
+        """命中的标签（按首次出现顺序去重）；给定 tags 时只保留其中的标签"""
+        allowed = set(tags) if tags is not None else None
+        result = []
+        for m in self.match(text):
+            if m.tag not in result and (allowed is None or m.tag in allowed):
+                result.append(m.tag)
+        return result
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("用法：python tag_matcher.py <文本文件>")
+        return
+    try:
+        matcher = TagMatcher()
+        text, encoding = read_text(argv[1])
+        lines = text.splitlines()
+        start_time = time.perf_counter()
+        results = [matcher.match(line) for line in lines]
+        elapsed = time.perf_counter() - start_time
+        for idx, (line, matches) in enumerate(zip(lines, results), 1):
+            if matches:
+                tags = "、".join(f"{m.tag}({m.term}@{m.start})" for m in matches)
+                print(f"{idx:>5}. {tags}")
+        rate = len(lines) / elapsed if elapsed > 0 else float('inf')
+        print(f"\n✅ 共 {len(lines)} 行，命中 {sum(1 for r in results if r)} 行 | {rate:.0f} 行/秒")
+    except Exception as e:
+        print(f"\n❌ 错误：{str(e)}")
+        print("应急处理：")
+        print("1. 检查 DICTIONARY_SOURCES 与 TAG_SYNONYMS_PATH 路径")
+        print("2. 同义词表每行格式为“标签: 同义词1, 同义词2”")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline_monitor 回归测试
+运行：python -m unittest test_pipeline_monitor（在本目录下）
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import pipeline_monitor as pm
+
+STAGE_SCRIPT = '''import time
+with open(r"{inp}", encoding="utf-8") as f:
+    text = f.read().strip()
+time.sleep({delay})
+with open(r"{out}", "w", encoding="utf-8") as f:
+    f.write(text + "x")
+'''
+
+
+class EditDuringRunTest(unittest.TestCase):
+    """阶段执行期间修改输入：本轮产出旧结果，后续运行必须重跑而不是判定为未变化"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "in.txt")
+        self.output = os.path.join(self.dir, "out.txt")
+        script = os.path.join(self.dir, "stage.py")
+        with open(self.input, 'w', encoding='utf-8') as f:
+            f.write("1")
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(STAGE_SCRIPT.format(inp=self.input, out=self.output, delay=1.5))
+
+        self.saved = {name: getattr(pm, name) for name in
+                      ('PIPELINE_ARTIFACTS', 'PIPELINE_STAGES', 'DAG_STATE_PATH', 'OUTPUT_FILES', 'RELOAD_DELAY')}
+        self.saved_settings = [(d, dict(d)) for d in
+                               (pm.METRICS_SETTINGS, pm.RUNNER_SETTINGS, pm.PARALLEL_SETTINGS, pm.PREVIEW_SETTINGS,
+                                pm.INCREMENTAL_SETTINGS)]
+        pm.PIPELINE_ARTIFACTS = {}
+        pm.PIPELINE_STAGES = [{'name': 'stage', 'script': script, 'inputs': [self.input], 'outputs': [self.output]}]
+        pm.DAG_STATE_PATH = os.path.join(self.dir, "dag.json")
+        pm.OUTPUT_FILES = []
+        pm.RELOAD_DELAY = 0.2
+        pm.METRICS_SETTINGS['enabled'] = False
+        pm.RUNNER_SETTINGS['in_process'] = False
+        pm.PARALLEL_SETTINGS['log_dir'] = os.path.join(self.dir, "logs")
+        pm.PREVIEW_SETTINGS['target_files'] = {}
+        pm.INCREMENTAL_SETTINGS['full_rebuild'] = False
+
+        self.handler = pm.ReloadHandler()
+        self.handler.print_success = lambda: None
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(pm, name, value)
+        for settings, value in self.saved_settings:
+            settings.clear()
+            settings.update(value)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def edit_input(self, text, after):
+        def edit():
+            time.sleep(after)
+            with open(self.input, 'w', encoding='utf-8') as f:
+                f.write(text)
+            self.handler.enqueue(self.input)
+
+        thread = threading.Thread(target=edit)
+        thread.start()
+        return thread
+
+    def read_output(self):
+        with open(self.output, encoding='utf-8') as f:
+            return f.read()
+
+    def test_direct_runs(self):
+        editor = self.edit_input("2", after=0.7)
+        self.handler.run_pipeline()
+        editor.join()
+        self.assertEqual(self.read_output(), "1x")  # 阶段开始时读到的是旧内容
+
+        self.handler.run_pipeline()
+        self.assertEqual(self.read_output(), "2x")
+
+    def test_watcher_follow_up_run(self):
+        self.handler.start()
+        try:
+            self.handler.enqueue(self.input)
+            editor = self.edit_input("2", after=pm.RELOAD_DELAY + 0.7)
+            editor.join()
+            deadline = time.time() + 20
+            while time.time() < deadline:
+                if os.path.exists(self.output) and self.read_output() == "2x":
+                    break
+                time.sleep(0.1)
+        finally:
+            self.handler.stop()
+        self.assertEqual(self.read_output(), "2x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+text_io 编码探测测试
+运行：python -m unittest test_text_io（在本目录下）
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from text_io import decode_bytes, detect_encoding, read_text
+
+TRADITIONAL = ("本研究分析了論文初稿與終稿之間的文字差異，並透過詞頻與餘弦相似度衡量修改幅度。"
+               "實驗結果顯示，多數作者在審稿後會調整研究方法與結論的敘述。")
+SIMPLIFIED = ("本研究分析了论文初稿与终稿之间的文字差异，并通过词频与余弦相似度衡量修改幅度。"
+              "实验结果显示，多数作者在审稿后会调整研究方法与结论的叙述。")
+
+
+class DetectEncodingTest(unittest.TestCase):
+    """Big5 字节同样能按 GB18030 解码，必须按内容择优而不是取第一个能解码的编码"""
+
+    def test_big5(self):
+        data = TRADITIONAL.encode('big5')
+        self.assertEqual(detect_encoding(data), 'big5')
+        self.assertEqual(decode_bytes(data), (TRADITIONAL, 'big5'))
+
+    def test_gbk_simplified_and_traditional(self):
+        self.assertEqual(detect_encoding(SIMPLIFIED.encode('gbk')), 'gb18030')
+        self.assertEqual(detect_encoding(TRADITIONAL.encode('gbk')), 'gb18030')
+
+    def test_utf8(self):
+        self.assertEqual(detect_encoding(TRADITIONAL.encode('utf-8')), 'utf-8')
+
+    def test_big5_prefix_cut_mid_character(self):
+        text = "doc_id\n" + TRADITIONAL
+        data = text.encode('big5')
+        self.assertEqual(decode_bytes(data, sniff_bytes=len(data) - 1), (text, 'big5'))
+
+
+class ReadTextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_read_big5_file(self):
+        path = os.path.join(self.dir, "big5.txt")
+        with open(path, 'wb') as f:
+            f.write(TRADITIONAL.encode('big5'))
+        self.assertEqual(read_text(path), (TRADITIONAL, 'big5'))
+
+
+if __name__ == '__main__':
+    unittest.main()
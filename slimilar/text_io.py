@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+文本读取工具 v1.0
+功能：基于字节前缀探测编码，每个文件只读取、解码一次
+探测顺序：BOM -> UTF-8 合法性 -> GB18030（兼容 GBK/GB2312）/ Big5 择优
+  GB18030 几乎能解码任意字节，不能只看能否解码：两者都能解码时，比较解码结果中
+  一级常用汉字（及全角标点）所占比例，取比例高者，相同时取 GB18030
+"""
+
+import codecs
+from collections import Counter
+from typing import Optional, Tuple
+
+SNIFF_BYTES = 64 * 1024  # 编码探测使用的前缀字节数
+
+_BOMS = [  # UTF-32 的 BOM 以 UTF-16 的 BOM 开头，必须先判断
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+_CJK_CANDIDATES = {  # 编码 -> (常用字字符集, 一级汉字首字节范围)；按优先级排列
+    'gb18030': ('gb2312', 0xB0, 0xD7),
+    'big5': ('big5', 0xA4, 0xC6),
+}
+_PUNCT_LEADS = (0xA1, 0xA3)  # 两种字符集的全角标点首字节范围相同
+FALLBACK_ENCODING = 'gb18030'
+
+
+def _prefix_text(prefix: bytes, encoding: str) -> Optional[str]:
+    """按该编码解码前缀（允许末尾被截断的多字节字符），无法解码返回 None"""
+    try:
+        return codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return None
+
+
+def _common_ratio(text: str, charset: str, low: int, high: int) -> float:
+    """非ASCII字符中一级常用汉字与全角标点所占比例：用错编码解码时多为生僻字、假名、符号或私用区字符"""
+    common = total = 0
+    for char, count in Counter(text).items():  # 每个不同字符只判断一次
+        if char < '\x80':
+            continue
+        total += count
+        try:
+            lead = char.encode(charset)[0]
+        except UnicodeEncodeError:
+            continue
+        if low <= lead <= high or _PUNCT_LEADS[0] <= lead <= _PUNCT_LEADS[1]:
+            common += count
+    return common / total if total else 0.0
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """根据字节前缀判断编码；全部失败时返回 GB18030（解码时替换非法字节）"""
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if _prefix_text(prefix, 'utf-8') is not None:
+        return 'utf-8'
+    best, best_ratio = FALLBACK_ENCODING, -1.0
+    for encoding, (charset, low, high) in _CJK_CANDIDATES.items():
+        text = _prefix_text(prefix, encoding)
+        if text is None:
+            continue
+        ratio = _common_ratio(text, charset, low, high)
+        if ratio > best_ratio:
+            best, best_ratio = encoding, ratio
+    return best
+
+
+def sniff_file_encoding(path: str, sniff_bytes: int = SNIFF_BYTES) -> str:
+    """只读取文件前缀判断编码（供流式读取使用）"""
+    with open(path, 'rb') as f:
+        return detect_encoding(f.read(sniff_bytes))
+
+
+def decode_bytes(data: bytes, sniff_bytes: int = SNIFF_BYTES) -> Tuple[str, str]:
+    """解码已读入的字节，返回 (文本, 实际使用的编码)
+
+    前缀探测可能被纯ASCII开头误导（如后文才出现GBK字符），此时按
+    GB18030 再试一次；仍失败则以探测编码替换非法字节，并在编码名后标注。
+    """
+    encoding = detect_encoding(data[:sniff_bytes])
+    try:
+        return data.decode(encoding), encoding
+    except UnicodeDecodeError:
+        pass
+    if encoding != FALLBACK_ENCODING:
+        try:
+            return data.decode(FALLBACK_ENCODING), FALLBACK_ENCODING
+        except UnicodeDecodeError:
+            pass
+    return data.decode(encoding, errors='replace'), f"{encoding}(replace)"
+
+
+def read_text(path: str, sniff_bytes: int = SNIFF_BYTES) -> Tuple[str, str]:
+    """一次读取整个文件并解码，返回 (文本, 编码)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return decode_bytes(data, sniff_bytes)
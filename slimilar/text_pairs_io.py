@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+text_pairs 读写模块 v1.0
+功能：text_pairs 表的列式存储（Parquet / Arrow IPC）与 CSV 导出
+  - *_clean 列以 list<dictionary<string>> 存储：词表只存一份，文档内为整数索引
+  - 原文列 draft/final 可选省略
+  - 读取时可只取指定列，词列还原为空格拼接的字符串，与 CSV 版本结构一致
+  - 可按批次迭代读取，内存只占一个批次
+  - 可只统计文档数与词数（列式文件直接取列表长度，不解码词串）
+  - ChunkedTextPairsWriter：流式模式按词数分块写出，一块一行（一个行组），行以 chunk 列编号；
+    读取时按 doc_id 拼接回一行，与常规文件结构一致
+按扩展名选择格式：.parquet / .arrow(.feather) / .csv
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from typing import Iterator, List
+
+RAW_COLUMNS = ['draft', 'final']
+TOKEN_COLUMNS = ['draft_clean', 'final_clean']
+CHUNK_COLUMN = 'chunk'  # 分块写出的文件才有此列：同一 doc_id 的多行按块号顺序拼接
+CSV_ENCODING = 'utf_8_sig'  # 带BOM，兼容中文Excel
+
+
+def _format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return 'parquet'
+    if ext in ('.arrow', '.feather', '.ipc'):
+        return 'arrow'
+    return 'csv'
+
+
+def _token_array(texts: pd.Series) -> pa.Array:
+    """空格拼接的词串 -> 字典编码的词列表列"""
+    token_lists = [t.split() if isinstance(t, str) else [] for t in texts]
+    offsets = np.zeros(len(token_lists) + 1, dtype=np.int32)
+    np.cumsum([len(tokens) for tokens in token_lists], out=offsets[1:])
+    values = pa.array([w for tokens in token_lists for w in tokens], type=pa.string())
+    return pa.ListArray.from_arrays(pa.array(offsets), values.dictionary_encode())
+
+
+def to_arrow_table(df: pd.DataFrame, include_raw: bool = True) -> pa.Table:
+    """text_pairs DataFrame -> Arrow 表"""
+    columns = {'doc_id': pa.array(df['doc_id'].astype(str), type=pa.string())}
+    if include_raw:
+        for col in RAW_COLUMNS:
+            columns[col] = pa.array(df[col].fillna(""), type=pa.string())
+    for col in TOKEN_COLUMNS:
+        columns[col] = _token_array(df[col])
+    return pa.table(columns)
+
+
+def write_text_pairs(df: pd.DataFrame, path: str, include_raw: bool = True) -> None:
+    """按扩展名写出 text_pairs"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fmt = _format(path)
+    if fmt == 'csv':
+        columns = ['doc_id'] + (RAW_COLUMNS if include_raw else []) + TOKEN_COLUMNS
+        df[columns].to_csv(path, index=False, encoding=CSV_ENCODING)
+        return
+    write_arrow_table(to_arrow_table(df, include_raw), path)
+
+
+def write_arrow_table(table: pa.Table, path: str) -> None:
+    """Arrow 表按扩展名写出为 .parquet 或 .arrow"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if _format(path) == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+class ChunkedTextPairsWriter:
+    """流式写出 text_pairs：每攒够 chunk_tokens 个词写出一行（Parquet 中为一个行组），内存只占一块
+
+    同一文档的各块依次写出，初稿块的 final_clean 为空、终稿块的 draft_clean 为空；
+    Parquet 每个行组各自字典编码，Arrow IPC 文件只允许一份字典，词列改为普通字符串列表
+    """
+
+    def __init__(self, path: str, include_raw: bool = True, chunk_tokens: int = 1 << 20):
+        self.path, self.include_raw, self.chunk_tokens = path, include_raw, chunk_tokens
+        self.chunk = 0
+        self.tmp_path = path + ".tmp"
+        self.parquet = _format(path) == 'parquet'
+        token_type = pa.list_(pa.dictionary(pa.int32(), pa.string()) if self.parquet else pa.string())
+        fields = [('doc_id', pa.string()), (CHUNK_COLUMN, pa.int32())]
+        fields += [(col, pa.string()) for col in RAW_COLUMNS] if include_raw else []
+        self.schema = pa.schema(fields + [(col, token_type) for col in TOKEN_COLUMNS])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.parquet:
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression='zstd')
+        else:
+            self.sink = pa.OSFile(self.tmp_path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+
+    def _token_cell(self, tokens: List[str]) -> pa.Array:
+        values = pa.array(tokens, type=pa.string())
+        values = values.dictionary_encode() if self.parquet else values
+        return pa.ListArray.from_arrays(pa.array([0, len(tokens)], type=pa.int32()), values)
+
+    def write_chunk(self, doc_id: str, column: str, tokens: List[str]) -> None:
+        data = {'doc_id': pa.array([doc_id], type=pa.string()),
+                CHUNK_COLUMN: pa.array([self.chunk], type=pa.int32())}
+        if self.include_raw:
+            for col in RAW_COLUMNS:
+                data[col] = pa.array([""], type=pa.string())
+        for col in TOKEN_COLUMNS:
+            data[col] = self._token_cell(tokens if col == column else [])
+        self.writer.write_table(pa.table(data, schema=self.schema))
+        self.chunk += 1
+
+    def feed(self, doc_id: str, column: str, tokens: Iterator[str]) -> Iterator[str]:
+        """分块写出经过的每个词并原样产出，可串在其他写出步骤之前"""
+        buffer = []
+        for token in tokens:
+            buffer.append(token)
+            if len(buffer) >= self.chunk_tokens:
+                self.write_chunk(doc_id, column, buffer)
+                buffer = []
+            yield token
+        if buffer:
+            self.write_chunk(doc_id, column, buffer)
+
+    def close(self, commit: bool = True) -> None:
+        """关闭文件；commit 为 True 时替换正式文件，否则删除未完成的临时文件"""
+        self.writer.close()
+        if not self.parquet:
+            self.sink.close()
+        if commit:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+
+def _join_tokens(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """词列表列 -> 空格拼接的字符串列"""
+    if pa.types.is_list(column.type):
+        return pc.binary_join(column.cast(pa.list_(pa.string())), " ")
+    return column
+
+
+def _table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    for name in table.column_names:
+        if name in TOKEN_COLUMNS:
+            table = table.set_column(table.column_names.index(name), name, _join_tokens(table[name]))
+    return table.to_pandas()
+
+
+def _is_chunked(path: str) -> bool:
+    """列式文件是否由 ChunkedTextPairsWriter 分块写出"""
+    fmt = _format(path)
+    if fmt == 'csv':
+        return False
+    if fmt == 'parquet':
+        return CHUNK_COLUMN in pq.read_schema(path).names
+    with pa.memory_map(path, 'r') as source:
+        return CHUNK_COLUMN in pa.ipc.open_file(source).schema.names
+
+
+def _chunk_read_columns(columns: List[str]) -> List[str]:
+    """拼接分块需要 doc_id，即使调用方没有要求"""
+    return None if columns is None else list(dict.fromkeys(['doc_id'] + list(columns)))
+
+
+def _merge_chunks(df: pd.DataFrame, columns: List[str] = None) -> pd.DataFrame:
+    """同一 doc_id 的分块行拼接为一行：词列以空格连接（跳过空块），其余列取首块"""
+    agg = {col: (lambda texts: " ".join(t for t in texts if t)) if col in TOKEN_COLUMNS else 'first'
+           for col in df.columns if col not in ('doc_id', CHUNK_COLUMN)}
+    merged = df.groupby('doc_id', sort=False).agg(agg).reset_index() if agg else df[['doc_id']].drop_duplicates()
+    return merged[columns if columns is not None else [c for c in df.columns if c != CHUNK_COLUMN]]
+
+
+def _merge_chunk_batches(batches: Iterator[pd.DataFrame], columns: List[str]) -> Iterator[pd.DataFrame]:
+    """逐批拼接分块行；每批末尾的文档可能延续到下一批，留到下一批一起拼接"""
+    carry = None
+    for df in batches:
+        if carry is not None:
+            df = pd.concat([carry, df], ignore_index=True)
+        if df.empty:
+            continue
+        tail = df['doc_id'] == df['doc_id'].iloc[-1]
+        carry = df[tail]
+        if not tail.all():
+            yield _merge_chunks(df[~tail], columns)
+    if carry is not None:
+        yield _merge_chunks(carry, columns)
+
+
+def _read_table(path: str, columns: List[str] = None, nrows: int = None) -> pa.Table:
+    """读取列式文件（.parquet / .arrow）的指定列 / 前 nrows 行"""
+    if _format(path) == 'parquet':
+        if nrows is not None:
+            batch = next(pq.ParquetFile(path).iter_batches(batch_size=nrows, columns=columns), None)
+            return pa.Table.from_batches([batch]) if batch is not None else pq.read_table(path, columns=columns)
+        return pq.read_table(path, columns=columns)
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    if nrows is not None:
+        table = table.slice(0, nrows)
+    return table
+
+
+def read_text_pairs(path: str, columns: List[str] = None, nrows: int = None) -> pd.DataFrame:
+    """读取 text_pairs，可只读指定列 / 前 nrows 行；词列统一返回空格拼接的字符串，分块写出的文档拼接为一行"""
+    fmt = _format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, encoding=CSV_ENCODING, usecols=columns, nrows=nrows)
+
+    if _is_chunked(path):
+        df = _merge_chunks(_table_to_pandas(_read_table(path, _chunk_read_columns(columns))), columns)
+        return df if nrows is None else df.head(nrows)
+    return _table_to_pandas(_read_table(path, columns, nrows))
+
+
+def _iter_batches(path: str, columns: List[str], batch_size: int) -> Iterator[pd.DataFrame]:
+    fmt = _format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, encoding=CSV_ENCODING, usecols=columns, chunksize=batch_size)
+        return
+
+    if fmt == 'parquet':
+        # 逐行组读取：各行组的词列字典不同，跨行组的批次无法转换
+        parquet_file = pq.ParquetFile(path)
+        for group in range(parquet_file.num_row_groups):
+            for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[group], columns=columns):
+                yield _table_to_pandas(pa.Table.from_batches([batch]))
+        return
+
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            table = pa.Table.from_batches([reader.get_batch(i)])
+            if columns is not None:
+                table = table.select(columns)
+            for start in range(0, table.num_rows, batch_size):
+                yield _table_to_pandas(table.slice(start, batch_size))
+
+
+def iter_text_pairs(path: str, columns: List[str] = None, batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+    """按批次迭代读取 text_pairs（每批最多 batch_size 行），词列同样还原为空格拼接的字符串；
+    分块写出的文件按文档拼接后产出，一个文档不会跨批"""
+    if _is_chunked(path):
+        yield from _merge_chunk_batches(_iter_batches(path, _chunk_read_columns(columns), batch_size), columns)
+        return
+    yield from _iter_batches(path, columns, batch_size)
+
+
+def count_tokens(df_or_path) -> tuple:
+    """统计 (文档数, 词数)：每行的初稿、终稿各算一篇文档（分块文件按 doc_id 计）"""
+    if isinstance(df_or_path, pd.DataFrame):
+        texts = pd.concat([df_or_path[col] for col in TOKEN_COLUMNS], ignore_index=True).fillna("")
+        return len(texts), int((texts.str.count(" ") + (texts != "")).sum())
+
+    path = df_or_path
+    fmt = _format(path)
+    if fmt == 'csv':
+        return count_tokens(pd.read_csv(path, encoding=CSV_ENCODING, usecols=TOKEN_COLUMNS))
+    chunked = _is_chunked(path)
+    table = _read_table(path, ['doc_id'] + TOKEN_COLUMNS if chunked else TOKEN_COLUMNS)
+    n_tokens = sum(pc.sum(pc.list_value_length(table[col])).as_py() or 0 for col in TOKEN_COLUMNS)
+    n_rows = pc.count_distinct(table['doc_id']).as_py() if chunked else table.num_rows
+    return 2 * n_rows, int(n_tokens)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+TF-IDF 稀疏矩阵读写模块 v1.0
+功能：
+  - .npz：CSR 三元组 + 特征词 + 文档标签 + 行键，单文件自包含，读取不需稠密化
+  - 长表 CSV：(doc_index, doc_id, term_id, weight, term)，只含非零项，供 SAS 导入
+  - 文档表 CSV：(doc_index, doc_id)，零向量文档在长表中没有记录，由此确定文档总数
+  - CsrSpill：逐批把 CSR 行追加到磁盘，最终以内存映射方式组装矩阵（在线模式内存不随语料增长）
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from collections import namedtuple
+
+TfidfBundle = namedtuple('TfidfBundle', ['matrix', 'doc_labels', 'features', 'row_keys'])
+
+CSV_ENCODING = 'utf_8_sig'
+
+
+def save_tfidf_npz(path, matrix, doc_labels, features, row_keys=None):
+    """保存稀疏矩阵及其行列标签"""
+    matrix = sp.csr_matrix(matrix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(
+        path,
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        shape=np.array(matrix.shape),
+        doc_labels=np.array(doc_labels, dtype=str),
+        features=np.array(features, dtype=str),
+        row_keys=np.array(row_keys if row_keys is not None else [], dtype=str)
+    )
+
+
+def load_tfidf_npz(path):
+    """读取 save_tfidf_npz 保存的文件，返回 TfidfBundle（matrix 为 CSR）"""
+    with np.load(path) as f:
+        matrix = sp.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        row_keys = f['row_keys'].tolist()
+        return TfidfBundle(
+            matrix,
+            f['doc_labels'].tolist(),
+            f['features'].tolist(),
+            row_keys or None
+        )
+
+
+def write_long_format(path, matrix, doc_labels, features, float_format="%.9f", chunk_rows=10000):
+    """写出非零项长表（按文档顺序），doc_index/term_id 从1开始；按行分块写出，内存只占一个块"""
+    matrix = sp.csr_matrix(matrix)
+    doc_labels = np.asarray(doc_labels, dtype=str)
+    features = np.asarray(features, dtype=str)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding=CSV_ENCODING, newline='') as f:
+        for start in range(0, max(matrix.shape[0], 1), chunk_rows):
+            coo = matrix[start:start + chunk_rows].tocoo()
+            rows = coo.row + start
+            pd.DataFrame({
+                'doc_index': rows + 1,
+                'doc_id': doc_labels[rows],
+                'term_id': coo.col + 1,
+                'weight': coo.data,
+                'term': features[coo.col]
+            }).to_csv(f, header=start == 0, index=False, float_format=float_format)
+
+
+def write_doc_index(path, doc_labels, start=0, append=False):
+    """写出文档表；append=True 时追加一批（start 为该批第一篇的行号）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a' if append else 'w', encoding=CSV_ENCODING, newline='') as f:
+        pd.DataFrame({
+            'doc_index': np.arange(start + 1, start + len(doc_labels) + 1),
+            'doc_id': list(doc_labels)
+        }).to_csv(f, header=not append, index=False)
+
+
+class CsrSpill:
+    """逐批追加 CSR 行：data / indices 以原始二进制写入 directory，组装时内存映射，不整体载入内存"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, "data.bin")
+        self.indices_path = os.path.join(directory, "indices.bin")
+        self._data = open(self.data_path, 'wb')
+        self._indices = open(self.indices_path, 'wb')
+        self._row_nnz = []
+        self.nnz = 0
+
+    def append(self, block):
+        block = sp.csr_matrix(block)
+        block.data.astype(np.float64).tofile(self._data)
+        block.indices.astype(np.int32).tofile(self._indices)
+        self._row_nnz.append(np.diff(block.indptr))
+        self.nnz += block.nnz
+
+    def matrix(self, n_cols):
+        """结束写入，返回以内存映射数组为底的 CSR 矩阵"""
+        self._data.close()
+        self._indices.close()
+        row_nnz = np.concatenate(self._row_nnz) if self._row_nnz else np.zeros(0, dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(row_nnz)]).astype(np.int64)
+        if self.nnz:
+            data = np.memmap(self.data_path, dtype=np.float64, mode='r')
+            indices = np.memmap(self.indices_path, dtype=np.int32, mode='r')
+        else:  # 空文件无法映射
+            data, indices = np.zeros(0), np.zeros(0, dtype=np.int32)
+        return sp.csr_matrix((data, indices, indptr), shape=(len(row_nnz), n_cols), copy=False)
+
+
+def read_long_format(path, n_docs=None, n_features=None):
+    """长表 -> TfidfBundle（不经过稠密矩阵）"""
+    long_df = pd.read_csv(path, encoding=CSV_ENCODING)
+    n_docs = n_docs or int(long_df['doc_index'].max())
+    terms = long_df.drop_duplicates('term_id').set_index('term_id')['term']
+    n_features = n_features or int(terms.index.max())
+    matrix = sp.csr_matrix(
+        (long_df['weight'].values, (long_df['doc_index'].values - 1, long_df['term_id'].values - 1)),
+        shape=(n_docs, n_features)
+    )
+    features = terms.reindex(range(1, n_features + 1)).fillna("").tolist()
+    labels = long_df.drop_duplicates('doc_index').set_index('doc_index')['doc_id']
+    doc_labels = [labels.get(i, f"doc{i}") for i in range(1, n_docs + 1)]
+    return TfidfBundle(matrix, doc_labels, features, None)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+TF-IDF 模型持久化 v1.0
+功能：把拟合好的词表与 IDF 向量保存为带版本号的模型文件，
+      之后的新批次只做 transform，不同批次的得分可直接比较
+目录结构：
+  model_dir/v0001.npz, v0002.npz ...  （词表 + IDF + 向量器参数 + 拟合信息）
+  model_dir/LATEST                    （当前版本号）
+"""
+
+import os
+import json
+import time
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# 与词表/IDF 一起保存、加载时原样恢复的向量器参数
+_PERSISTED_PARAMS = [
+    'lowercase', 'token_pattern', 'ngram_range', 'norm',
+    'use_idf', 'smooth_idf', 'sublinear_tf', 'binary', 'strip_accents'
+]
+
+
+def list_versions(model_dir):
+    """已保存的版本号（升序）"""
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(name[:-4] for name in os.listdir(model_dir)
+                  if name.startswith('v') and name.endswith('.npz'))
+
+
+def latest_version(model_dir):
+    """当前版本号，没有模型时返回 None"""
+    pointer = os.path.join(model_dir, 'LATEST')
+    if os.path.exists(pointer):
+        with open(pointer, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    versions = list_versions(model_dir)
+    return versions[-1] if versions else None
+
+
+def save_model(tfidf, model_dir, n_docs):
+    """保存已拟合的向量器为新版本，返回版本号"""
+    os.makedirs(model_dir, exist_ok=True)
+    versions = list_versions(model_dir)
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1:04d}"
+
+    vocabulary = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get)
+    params = {k: v for k, v in tfidf.get_params().items() if k in _PERSISTED_PARAMS}
+    path = os.path.join(model_dir, f"{version}.npz")
+    np.savez_compressed(
+        path,
+        vocabulary=np.array(vocabulary, dtype=str),
+        idf=tfidf.idf_,
+        params=np.array(json.dumps(params, ensure_ascii=False)),
+        fitted_at=np.array(time.time()),
+        n_docs=np.array(n_docs)
+    )
+
+    pointer = os.path.join(model_dir, 'LATEST')
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer + '.tmp', pointer)
+    print(f"✅ TF-IDF模型已保存：{version}（词表 {len(vocabulary)} | 文档 {n_docs}）")
+    return version
+
+
+def load_model(model_dir, version=None):
+    """加载指定版本（默认最新），返回 (可直接 transform 的向量器, 版本号, 拟合信息)"""
+    version = version or latest_version(model_dir)
+    if version is None:
+        raise FileNotFoundError(f"模型目录中没有已保存的模型：{model_dir}")
+    path = os.path.join(model_dir, f"{version}.npz")
+    with np.load(path) as f:
+        vocabulary = f['vocabulary'].tolist()
+        idf = f['idf']
+        params = json.loads(str(f['params']))
+        info = {'fitted_at': float(f['fitted_at']), 'n_docs': int(f['n_docs'])}
+
+    params['ngram_range'] = tuple(params['ngram_range'])
+    tfidf = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(vocabulary)}, **params)
+    tfidf.idf_ = idf  # 固定词表 + 设定 IDF 后即为已拟合状态
+    return tfidf, version, info
+
+
+def model_age_days(info):
+    """模型拟合至今的天数"""
+    return (time.time() - info['fitted_at']) / 86400
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+分词结果缓存 v1.0
+功能：按内容寻址缓存清洗后的词语流，文档未变化时跳过分词
+键值：输入字节哈希 + 自定义词典哈希 + 停用词表哈希（任一变化自动失效）
+淘汰：按总字节数上限做LRU淘汰（以文件修改时间作为最近使用时间）
+"""
+
+import os
+import hashlib
+from typing import Iterable, Optional
+
+CACHE_FORMAT_VERSION = "1"  # 清洗/过滤规则变化时递增，使旧缓存全部失效
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容哈希，文件不存在时返回固定标记"""
+    if not path or not os.path.exists(path):
+        return "missing"
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class TokenCache:
+    """磁盘上的分词结果缓存"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, version_files: Iterable[str]):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 词典/停用词版本：内容哈希拼接后再哈希
+        versions = [CACHE_FORMAT_VERSION] + [file_digest(p) for p in version_files]
+        self.version = hashlib.sha256("|".join(versions).encode('utf-8')).hexdigest()[:16]
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def make_key(self, data: bytes) -> str:
+        """由输入字节与词典版本生成缓存键"""
+        return f"{hashlib.sha256(data).hexdigest()}-{self.version}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def get(self, key: str) -> Optional[str]:
+        """命中返回清洗后文本并刷新最近使用时间，未命中返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)
+        except OSError:
+            # 包括其他进程并发淘汰导致的文件消失
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        """写入缓存（先写临时文件再原子替换），超出上限时触发淘汰"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 缓存写入失败：{str(e)}")
+            return
+        self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """遍历缓存文件，返回 (路径, 修改时间, 大小)"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def evict(self, target_ratio: float = 0.9) -> None:
+        """按最近使用时间从旧到新删除，直到总大小低于上限的 target_ratio"""
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * target_ratio
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self._size = total
+
+    def stats(self) -> dict:
+        """命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': self._size
+        }
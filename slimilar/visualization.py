@@ -12,11 +12,16 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 from sklearn.metrics.pairwise import cosine_similarity
+from similarity import prepare_matrix, similarity_rows
+from online_vectorizer import load_term_labels
 import os
+import sys
+from tfidf_io import load_tfidf_npz
 
 # ================= 配置区 =================
-MATRIX_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.csv"
+MATRIX_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\tfidf_matrix_2.npz"  # 稀疏 .npz 或旧版稠密 .csv
 SIM_MATRIX_PATH = r"D:\SASanalysis\SAS_text\python_SAS\out_sasjisuan_1\cos_sim_result4.csv"
+ONLINE_STATE_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1\online_tfidf_state.npz"  # 在线哈希模式的桶-词对照表
 POS_DATA_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_wordnum\pos_distribution.csv"
 
 OUTPUT_DIR = r"D:\SASanalysis\SAS_text\python_SAS\output_keshihua"
@@ -42,12 +47,38 @@ def load_data(path, is_matrix=True):
         print(f"❌ 加载失败：{os.path.basename(path)} - {str(e)}")
         raise
 
+def load_tfidf(path):
+    """加载TF-IDF矩阵：.npz 返回稀疏 TfidfBundle（不稠密化），.csv 返回 DataFrame"""
+    if path.endswith('.npz'):
+        try:
+            bundle = load_tfidf_npz(path)
+            print(f"✅ 成功加载稀疏矩阵：{os.path.basename(path)} {bundle.matrix.shape}")
+            return label_hashed_features(bundle, path)
+        except Exception as e:
+            print(f"❌ 加载失败：{os.path.basename(path)} - {str(e)}")
+            raise
+    return load_data(path)
+
+def label_hashed_features(bundle, path):
+    """在线哈希模式的矩阵：按状态文件记录的已用桶号取各列的代表词（原词，不经 clean_feature_names 替换）"""
+    if not os.path.exists(ONLINE_STATE_PATH) or os.path.getmtime(ONLINE_STATE_PATH) < os.path.getmtime(path):
+        return bundle  # 矩阵比状态文件新：由常规模式生成
+    labels = load_term_labels(ONLINE_STATE_PATH)
+    return bundle if labels is None else bundle._replace(features=labels)
+
+def compute_feature_diff(tfidf):
+    """初稿/终稿（前两行）特征差异绝对值；稀疏矩阵只取两行计算"""
+    if isinstance(tfidf, pd.DataFrame):
+        return tfidf.diff().abs().iloc[1]
+    row = abs(tfidf.matrix[1] - tfidf.matrix[0]).toarray().ravel()
+    return pd.Series(row, index=tfidf.features, name=tfidf.doc_labels[1])
+
 # ----------------- 核心功能模块 -----------------
 def plot_feature_diff(df, top_n=30):
     """静态差异图"""
     plt.rcParams.update({'font.sans-serif': 'SimHei', 'axes.unicode_minus': False})
 
-    diff = df.diff().abs().iloc[1]
+    diff = compute_feature_diff(df)
     top_diff = diff.nlargest(top_n)
 
     plt.figure(figsize=(12, 8))
@@ -66,7 +97,7 @@ def plot_feature_diff(df, top_n=30):
 def interactive_plot(df, top_n=30):
     """交互式可视化"""
     try:
-        diff = df.diff().abs().iloc[1]
+        diff = compute_feature_diff(df)
         top_diff = diff.nlargest(top_n)
 
         fig = px.bar(
@@ -90,7 +121,7 @@ def interactive_plot(df, top_n=30):
 def export_diff_words(df, top_n=30):  # 补全缺失函数
     """导出差异词数据"""
     try:
-        diff = df.diff().abs().iloc[1]
+        diff = compute_feature_diff(df)
         diff.nlargest(top_n).to_csv(
             output_config['diff_csv'],
             header=['差异值'],
@@ -103,11 +134,18 @@ def export_diff_words(df, top_n=30):  # 补全缺失函数
 def plot_similarity_heatmap():
     """相似度热力图"""
     # 加载或计算相似度矩阵
+    n = len(DOC_NAMES)
     if os.path.exists(SIM_MATRIX_PATH):
-        sim_matrix = load_data(SIM_MATRIX_PATH).values
+        # 只读取热力图展示的前 n 行/列，不加载完整 N×N 矩阵
+        sim_matrix = pd.read_csv(SIM_MATRIX_PATH, index_col=0, nrows=n, usecols=range(n + 1)).values
+        print(f"✅ 成功加载数据：{os.path.basename(SIM_MATRIX_PATH)}")
     else:
-        tfidf_matrix = load_data(MATRIX_PATH).values
-        sim_matrix = cosine_similarity(tfidf_matrix)
+        tfidf = load_tfidf(MATRIX_PATH)
+        if isinstance(tfidf, pd.DataFrame):
+            sim_matrix = cosine_similarity(tfidf.values[:n])
+        else:
+            # 稀疏输入只计算热力图展示的文档
+            sim_matrix = similarity_rows(prepare_matrix(tfidf.matrix[:n]), 0, n)
         print("⚠️ 注意：使用实时计算的余弦相似度矩阵")
 
     # 绘图设置
@@ -150,20 +188,42 @@ def plot_pos_radar():
         print(f"⚠️ 跳过雷达图：{str(e)}")
 
 # ----------------- 主流程控制 -----------------
-if __name__ == "__main__":
+PARTS = ('diff', 'heatmap', 'radar')  # 差异特征图 / 相似度热力图 / 词性雷达图，三者互不依赖
+
+
+def main(tfidf=None, parts=None):
+    """生成图表（parts 为 PARTS 的子集，默认全部）；tfidf 为建模阶段在内存中传入的 TfidfBundle，成功返回 True"""
+    parts = parts or PARTS
     print("==== 可视化分析开始 ====")
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    plt.rcParams.update({'font.sans-serif': 'SimHei', 'axes.unicode_minus': False})
 
     try:
-        tfidf_df = load_data(MATRIX_PATH)
-        plot_feature_diff(tfidf_df, TOP_N)
-        interactive_plot(tfidf_df, TOP_N)
-        export_diff_words(tfidf_df, TOP_N)  # 现在可正常调用
-        plot_similarity_heatmap()
-        plot_pos_radar()
+        if 'diff' in parts:
+            tfidf_df = tfidf if tfidf is not None else load_tfidf(MATRIX_PATH)
+            plot_feature_diff(tfidf_df, TOP_N)
+            interactive_plot(tfidf_df, TOP_N)
+            export_diff_words(tfidf_df, TOP_N)  # 现在可正常调用
+        if 'heatmap' in parts:
+            plot_similarity_heatmap()
+        if 'radar' in parts:
+            plot_pos_radar()
     except Exception as e:
         print(f"🛑 主流程异常：{str(e)}")
-        exit(1)
+        return False
+    finally:
+        plt.close('all')  # 常驻进程中反复调用时释放图形
 
     print("\n==== 分析完成 ====")
-    [print(f"- {os.path.basename(v)}") for v in output_config.values()]
\ No newline at end of file
+    [print(f"- {os.path.basename(v)}") for v in output_config.values()]
+    return True
+
+
+if __name__ == "__main__":
+    # 用法：python visualization.py [diff|heatmap|radar]，缺省生成全部图表
+    part = sys.argv[1] if len(sys.argv) > 1 else None
+    if part not in (None,) + PARTS:
+        print("用法：python visualization.py [diff|heatmap|radar]")
+        sys.exit(1)
+    if not main(parts=[part] if part else None):
+        sys.exit(1)
@@ -1,15 +1,26 @@
 # -*- coding: utf-8 -*-
 """
-主题词典生成器 v2.0
+主题词典生成器 v2.3
 功能：按比例生成可定制规模的混合词典
+v2.1：论文文本抽取改为多进程并行，抽取结果按文件内容哈希缓存，未变化的论文不再重新解析
+v2.2：逐页读取、逐页分词计数后合并为整篇关键词得分，超大 PDF 的内存占用只与单页大小有关
+v2.3：语料级 IDF——全部论文只分词一次，按语料统计 IDF 并保存（供 jieba.analyse.set_idf_path 复用），
+      稀疏矩阵上批量计算各篇 top-K；组合词典用堆选取前 N 个候选词
 """
 import os
+import heapq
 import fitz
 import docx
+import numpy as np
 import jieba
 import jieba.analyse
 from collections import defaultdict
-from typing import Dict, Set
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from scipy.sparse import csr_matrix
+from doc_state import DocumentState
+from text_io import read_text
+from segmenter_state import load_segmenter
 
 # ================= 配置区 =================
 PAPER_DIR = r"D:\SASanalysis\SAS_text\dictionary_create"
@@ -28,49 +39,271 @@ EXTRACT_SETTINGS = {
     'topK': 200,
     'withWeight': False,
     'allowPOS': ('n', 'vn', 'ns'),
-    'stop_words': None
+    'stop_words': None,
+    'idf_source': 'corpus',  # corpus：按论文语料统计 IDF；jieba：使用结巴内置通用 IDF（逐篇提取）
+    'idf_path': r"D:\SASanalysis\SAS_text\python_SAS\segmenter_cache\paper_idf.txt"  # 语料 IDF 表（jieba 格式：词 IDF）
 }
 
+SEGMENTER_SETTINGS = {
+    'user_dicts': [],  # 关键词提取使用的自定义词典（如 comnew_dict.txt）
+    'artifact_dir': r"D:\SASanalysis\SAS_text\python_SAS\segmenter_cache",
+    'prebuilt': True
+}
+
+TEXT_CACHE_SETTINGS = {
+    'enabled': True,  # 按文件内容哈希缓存抽取的文本
+    'cache_dir': r"D:\SASanalysis\SAS_text\python_SAS\paper_text_cache",
+    'workers': None,  # 抽取进程数，None 表示 CPU 核数
+    'chunksize': 4,  # 每次派发给子进程的文件数
+    'progress_every': 200  # 每抽取多少个文件打印一次进度
+}
+PAPER_EXTENSIONS = ('.pdf', '.docx')  # iter_pages 支持的格式
+
+STREAM_SETTINGS = {
+    'docx_block': 200,  # DOCX 每多少个段落作为一“页”分词
+    'read_block': 1 << 20  # 读取缓存文本的块大小（字符）
+}
+PAGE_BREAK = "\f"  # 缓存文本中的分页符
+
 
 # =========================================
 
+def iter_pages(file_path: str) -> Iterator[str]:
+    """逐页读取文本：PDF 按页惰性读取，DOCX 按段落分块；内存只与单页大小有关"""
+    if file_path.endswith('.pdf'):
+        with fitz.open(file_path) as doc:
+            for page in doc:
+                yield page.get_text()
+    elif file_path.endswith('.docx'):
+        paragraphs = [para.text for para in docx.Document(file_path).paragraphs]
+        block = STREAM_SETTINGS['docx_block']
+        for start in range(0, len(paragraphs), block):
+            yield "\n".join(paragraphs[start:start + block])
+
+
 def safe_read_file(file_path: str) -> str:
     """安全读取不同格式文件"""
-    text = ""
     try:
-        if file_path.endswith('.pdf'):
-            with fitz.open(file_path) as doc:
-                text = "".join([page.get_text() for page in doc])
-        elif file_path.endswith('.docx'):
-            doc = docx.Document(file_path)
-            text = "\n".join([para.text for para in doc.paragraphs])
-        return text.strip()
+        separator = "\n" if file_path.endswith('.docx') else ""
+        return separator.join(iter_pages(file_path)).strip()
     except Exception as e:
         print(f"文件读取失败: {os.path.basename(file_path)} - {str(e)}")
         return ""
 
 
-def extract_paper_keywords() -> Dict[str, int]:
-    """从文中提取候选关键词"""
-    word_freq = defaultdict(int)
-
-    valid_files = 0
+def list_paper_files() -> List[str]:
+    """论文目录下可抽取文本的文件（其余格式读取结果必为空，直接跳过）"""
+    files = []
     for filename in os.listdir(PAPER_DIR):
         file_path = os.path.join(PAPER_DIR, filename)
-        if not os.path.isfile(file_path):
-            continue
+        if os.path.isfile(file_path) and filename.lower().endswith(PAPER_EXTENSIONS):
+            files.append(file_path)
+    return files
+
 
-        text = safe_read_file(file_path)
-        if len(text) < 100:
+def _cache_path(digest: str) -> str:
+    return os.path.join(TEXT_CACHE_SETTINGS['cache_dir'], f"{digest}.txt")
+
+
+def cache_paper_text(file_path: str, cache_path: str) -> int:
+    """逐页抽取并写入缓存（页间以换页符分隔），返回有效字符数；无文本或读取失败时留空文件作标记"""
+    tmp_path = cache_path + ".tmp"
+    chars = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for idx, page in enumerate(iter_pages(file_path)):
+                if idx:
+                    f.write(PAGE_BREAK)
+                f.write(page)
+                chars += len(page.strip())
+    except Exception as e:
+        print(f"文件读取失败: {os.path.basename(file_path)} - {str(e)}")
+        chars = 0
+    if chars == 0:  # 空标记：内容哈希不变就不再重复解析，文件修改后哈希变化自然重试
+        open(tmp_path, 'w', encoding='utf-8').close()
+    os.replace(tmp_path, cache_path)
+    return chars
+
+
+def iter_cached_pages(cache_path: str) -> Iterator[str]:
+    """按块读取缓存文本并按换页符切出各页，不整体载入"""
+    buffer = ""
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(STREAM_SETTINGS['read_block'])
+            if not chunk:
+                break
+            *pages, buffer = (buffer + chunk).split(PAGE_BREAK)
+            yield from pages
+    yield buffer
+
+
+def extract_to_cache(files: List[str], cache_paths: List[str]) -> None:
+    """多进程抽取文本写入缓存"""
+    if not files:
+        return
+    workers = TEXT_CACHE_SETTINGS['workers'] or os.cpu_count() or 1
+    if workers == 1 or len(files) == 1:
+        for file_path, cache_path in zip(files, cache_paths):
+            cache_paper_text(file_path, cache_path)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+        results = executor.map(cache_paper_text, files, cache_paths, chunksize=TEXT_CACHE_SETTINGS['chunksize'])
+        for idx, _ in enumerate(results, 1):
+            if idx % TEXT_CACHE_SETTINGS['progress_every'] == 0:
+                print(f"⏳ 已抽取 {idx}/{len(files)} 个文件")
+
+
+def prepare_text_cache(files: List[str]) -> Dict[str, str]:
+    """内容哈希未命中缓存的论文并行抽取，返回 论文路径 -> 缓存文本路径（无文本的论文不在其中）"""
+    cache_dir = TEXT_CACHE_SETTINGS['cache_dir']
+    os.makedirs(cache_dir, exist_ok=True)
+    state = DocumentState(os.path.join(cache_dir, "index.json"))  # mtime/大小未变时不重新计算哈希
+    digests = {f: state.fingerprint(f) for f in files}
+    files = [f for f in files if digests[f] is not None]  # 列目录后被删除的文件
+    cache_paths = {f: _cache_path(digests[f]) for f in files}
+
+    misses = {}  # 缓存路径 -> 论文路径；内容相同的文件只抽取一次
+    for file_path, cache_path in cache_paths.items():
+        if not os.path.exists(cache_path):
+            misses.setdefault(cache_path, file_path)
+    print(f"文本缓存：命中 {len(files) - len(misses)} | 需解析 {len(misses)}")
+    extract_to_cache(list(misses.values()), list(misses.keys()))
+
+    # 清理已删除/已修改论文的旧缓存
+    live = {os.path.basename(p) for p in cache_paths.values()}
+    for name in os.listdir(cache_dir):
+        if name.endswith('.txt') and name not in live:
+            os.remove(os.path.join(cache_dir, name))
+    state.forget(files)
+    state.save()
+    return {f: p for f, p in cache_paths.items() if os.path.exists(p) and os.path.getsize(p) > 0}
+
+
+def iter_paper_pages(files: List[str]) -> Iterator[Tuple[str, Iterator[str]]]:
+    """依次给出 (论文路径, 逐页文本迭代器)；启用缓存时从缓存读取，否则直接读原文件"""
+    if not TEXT_CACHE_SETTINGS['enabled']:
+        for file_path in files:
+            yield file_path, iter_pages(file_path)
+        return
+    for file_path, cache_path in prepare_text_cache(files).items():
+        yield file_path, iter_cached_pages(cache_path)
+
+
+def count_terms(pages: Iterable[str]) -> Tuple[Dict[str, int], int]:
+    """逐页分词并按词性过滤计数，返回 (词频, 有效字符数)；过滤规则与 jieba.analyse.extract_tags 一致"""
+    tfidf = jieba.analyse.default_tfidf
+    allow_pos = frozenset(EXTRACT_SETTINGS['allowPOS'])
+    freq = defaultdict(int)
+    chars = 0
+    for page in pages:
+        chars += len(page.strip())
+        for pair in tfidf.postokenizer.cut(page):
+            word = pair.word
+            if pair.flag not in allow_pos or len(word.strip()) < 2 or word.lower() in tfidf.stop_words:
+                continue
+            freq[word] += 1
+    return freq, chars
+
+
+def rank_terms(freq: Dict[str, int], top_k: int) -> List[str]:
+    """按 TF-IDF 取前 top_k 个词（与 extract_tags 的打分相同）"""
+    tfidf = jieba.analyse.default_tfidf
+    total = sum(freq.values())
+    if not total:
+        return []
+    score = lambda w: freq[w] * tfidf.idf_freq.get(w, tfidf.median_idf) / total
+    return heapq.nlargest(top_k, freq, key=score)
+
+
+def build_corpus_counts(files: List[str]) -> List[Dict[str, int]]:
+    """全部论文逐页分词、按词性过滤一次，返回各篇词频（不足 100 字的文件跳过）"""
+    counts = []
+    for file_path, pages in iter_paper_pages(files):
+        try:
+            freq, chars = count_terms(pages)
+        except Exception as e:
+            print(f"关键词提取失败: {os.path.basename(file_path)} - {str(e)}")
             continue
+        if chars >= 100:
+            counts.append(freq)
+    return counts
+
+
+def build_term_matrix(counts: List[Dict[str, int]]) -> Tuple[List[str], csr_matrix]:
+    """各篇词频 -> 文档×词 稀疏计数矩阵"""
+    vocab = {}
+    indptr, indices, data = [0], [], []
+    for freq in counts:
+        for word, count in freq.items():
+            indices.append(vocab.setdefault(word, len(vocab)))
+            data.append(count)
+        indptr.append(len(indices))
+    matrix = csr_matrix((np.asarray(data, dtype=np.float64), indices, indptr), shape=(len(counts), len(vocab)))
+    return list(vocab), matrix
+
+
+def compute_idf(matrix: csr_matrix) -> np.ndarray:
+    """平滑 IDF：ln((1 + N) / (1 + df)) + 1"""
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    return np.log((1 + matrix.shape[0]) / (1 + df)) + 1
+
+
+def save_idf_table(terms: List[str], idf: np.ndarray, path: str) -> None:
+    """原子写出 jieba 格式的 IDF 表，并设为 jieba.analyse 的当前 IDF"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(f"{term} {value:.6f}\n" for term, value in zip(terms, idf))
+    os.replace(tmp_path, path)
+    jieba.analyse.set_idf_path(path)
+    print(f"语料 IDF 表已保存至: {path}（{len(terms)} 词）")
+
+
+def top_k_indices(matrix: csr_matrix, idf: np.ndarray, top_k: int) -> np.ndarray:
+    """各篇 TF-IDF 得分前 top_k 的词下标（拼接为一维数组）
+    一次向量化完成：按 (行, -得分) 排序后，各行仍占据原 indptr 区段，区段内位次小于 top_k 的即入选；
+    同分按词首次出现的顺序（与 extract_tags 的稳定排序一致）"""
+    row_lengths = np.diff(matrix.indptr)
+    rows = np.repeat(np.arange(matrix.shape[0]), row_lengths)
+    row_totals = np.asarray(matrix.sum(axis=1)).ravel()
+    scores = matrix.data * idf[matrix.indices] / row_totals[rows]
+
+    order = np.lexsort((-scores, rows))
+    rank = np.arange(matrix.nnz) - np.repeat(matrix.indptr[:-1], row_lengths)
+    return matrix.indices[order[rank < top_k]]
+
+
+def extract_corpus_keywords(files: List[str]) -> Dict[str, int]:
+    """语料级 IDF 批量提取：返回 词 -> 入选 top-K 的论文篇数"""
+    counts = build_corpus_counts(files)
+    if not counts:
+        print("警告：未发现有效文件")
+        return {}
+    terms, matrix = build_term_matrix(counts)
+    idf = compute_idf(matrix)
+    save_idf_table(terms, idf, EXTRACT_SETTINGS['idf_path'])
+
+    hits = np.bincount(top_k_indices(matrix, idf, EXTRACT_SETTINGS['topK']), minlength=len(terms))
+    print(f"有效论文: {len(counts)} 篇 | 候选词: {len(terms)}")
+    return {terms[i]: int(hits[i]) for i in np.flatnonzero(hits)}
+
 
+def extract_paper_keywords() -> Dict[str, int]:
+    """从文中提取候选关键词：逐页分词计数后合并为整篇的关键词得分"""
+    if EXTRACT_SETTINGS['idf_source'] == 'corpus':
+        return extract_corpus_keywords(list_paper_files())
+
+    word_freq = defaultdict(int)
+
+    valid_files = 0
+    for file_path, pages in iter_paper_pages(list_paper_files()):
+        filename = os.path.basename(file_path)
         try:
-            words = jieba.analyse.extract_tags(
-                text,
-                topK=EXTRACT_SETTINGS['topK'],
-                allowPOS=EXTRACT_SETTINGS['allowPOS']
-            )
-            for word in words:
+            freq, chars = count_terms(pages)
+            if chars < 100:
+                continue
+            for word in rank_terms(freq, EXTRACT_SETTINGS['topK']):
                 word_freq[word] += 1
             valid_files += 1
         except Exception as e:
@@ -84,8 +317,9 @@ def extract_paper_keywords() -> Dict[str, int]:
 def load_existing_dict() -> Set[str]:
     """加载现有船山术语词典"""
     try:
-        with open(THEME_DICT_PATH, 'r', encoding='utf-8') as f:
-            return set(line.strip() for line in f if line.strip())
+        text, encoding = read_text(THEME_DICT_PATH)
+        print(f"术语词典编码：{encoding}")
+        return set(line.strip() for line in text.splitlines() if line.strip())
     except FileNotFoundError:
         print(f"词典文件不存在：{THEME_DICT_PATH}")
         return set()
@@ -121,8 +355,12 @@ def generate_combined_dict(paper_words: Dict[str, int], theme_words: Set[str]) -
     # 动态分配词数
     cross_actual = min(cross_target, len(cross_words))
     paper_target = int(remain * DICT_SETTINGS['paper_ratio'])
-    paper_candidates = [w for w in paper_words if w not in theme_words]
-    paper_candidates = sorted(paper_candidates, key=lambda x: paper_words[x], reverse=True)
+    # 最多取用 total 个论文词（含缺口补足），堆选取即可，无需对全部候选词排序
+    paper_candidates = heapq.nlargest(
+        total,
+        (w for w in paper_words if w not in theme_words),
+        key=lambda x: paper_words[x]
+    )
     paper_actual = min(paper_target, len(paper_candidates))
 
     theme_target = remain - paper_actual
@@ -162,8 +400,14 @@ def generate_combined_dict(paper_words: Dict[str, int], theme_words: Set[str]) -
         }
     }
 
+def init_segmenter():
+    """加载（预构建的）分词器状态"""
+    load_segmenter(**SEGMENTER_SETTINGS)
+
+
 def main():
     print("开始生成主题词典...")
+    init_segmenter()
 
     # 阶段1：提取论文关键词
     print("正在分析...")
@@ -1,13 +1,32 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
+import numpy as np
 import os
 import re
+import sys
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
+from text_pairs_io import read_text_pairs, iter_text_pairs
+from doc_state import DocumentState
+from tfidf_io import TfidfBundle, CsrSpill, save_tfidf_npz, load_tfidf_npz, write_long_format, write_doc_index
+from tfidf_model import save_model, load_model, latest_version, model_age_days
+from sas_handoff import write_sas_import
+from online_vectorizer import OnlineTfidfVectorizer
 
 # ================= 配置区 =================
-INPUT_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.csv"
+INPUT_PATH = r"D:\SASanalysis\SAS_text\python_SAS\output_yuchuli\text_pairs_2.parquet"  # 也支持 .arrow/.csv
 OUTPUT_DIR = r"D:\SASanalysis\SAS_text\python_SAS\output_jianmo_1"
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, "tfidf_matrix_2.csv")  # 保持.csv扩展名
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, "tfidf_matrix_2.csv")  # 旧版稠密CSV（保持.csv扩展名）
+
+# === 稀疏输出配置 ===
+SPARSE_OUTPUT = {
+    'enabled': True,  # 输出稀疏矩阵，不再 toarray()
+    'npz_file': os.path.join(OUTPUT_DIR, "tfidf_matrix_2.npz"),  # CSR + 特征词 + 文档标签
+    'long_file': os.path.join(OUTPUT_DIR, "tfidf_long_2.csv"),  # (doc_index, doc_id, term_id, weight, term)，供SAS
+    'docs_file': os.path.join(OUTPUT_DIR, "tfidf_docs_2.csv"),  # (doc_index, doc_id)
+    'sas_import_file': os.path.join(OUTPUT_DIR, "tfidf_import.sas"),  # 按实际维度生成，供SAS脚本 %include
+    'dense_csv': False  # 是否仍输出旧版稠密 OUTPUT_FILE（仅适合小语料）
+}
 
 # === SAS/Excel兼容配置 ===
 OUTPUT_SETTINGS = {
@@ -25,6 +44,31 @@ FEATURE_SETTINGS = {
     'norm': 'l2' # 仅一元语法# 必须显式设置
 }
 
+# === 模型持久化配置 ===
+MODEL_SETTINGS = {
+    'mode': 'auto',  # fit：重新拟合并保存新版本 | transform：只用已保存模型 | auto：模型过期或缺失时才拟合
+    'model_dir': os.path.join(OUTPUT_DIR, "tfidf_model"),  # 词表 + IDF（带版本号）
+    'version': None,  # 指定加载的版本（如 "v0003"），None 为最新
+    'refit_days': 7  # auto 模式下模型超过该天数即重新拟合
+}
+
+# === 在线（哈希）模式配置 ===
+ONLINE_SETTINGS = {
+    'enabled': False,  # True 时改用特征哈希 + 累计文档频率，按小批量流式读取，不受 max_features 限制
+    'n_features': 2 ** 18,  # 哈希桶数（固定内存，与语料规模无关）
+    'batch_size': 5000,  # 每个小批量的文档数，每批更新一次 IDF
+    'state_file': os.path.join(OUTPUT_DIR, "online_tfidf_state.npz"),  # 文档频率 + 桶-词对照表
+    'spill_dir': os.path.join(OUTPUT_DIR, "online_spill"),  # 各批次结果逐批写入此处，矩阵以内存映射方式组装
+    'resume': False  # True：在已保存的计数上继续累计（输入只包含新文档的持续流场景）
+}
+
+# === 增量模式配置 ===
+INCREMENTAL_SETTINGS = {
+    'enabled': True,  # 只重算变更文档所在行，复用其余行（需 preprocess 批量增量模式）
+    'state_path': r"D:\SASanalysis\SAS_text\python_SAS\pipeline_state.json",  # 与 preprocess 共用
+    'full_rebuild': False  # True 时强制全量 transform
+}
+
 
 # =========================================
 
@@ -34,20 +78,219 @@ def clean_feature_names(features):
     return [re.sub(r'[^\w]', '_', f) for f in features]
 
 
-def main():
+def build_row_keys(doc_ids):
+    """矩阵行键（doc_id:draft / doc_id:final），顺序与 pd.concat 合并顺序一致"""
+    return [f"{d}:draft" for d in doc_ids] + [f"{d}:final" for d in doc_ids]
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+
+def resolve_model(mode):
+    """按模式取得向量器：返回 (已加载的向量器, 版本号)，需要重新拟合时返回 (None, None)"""
+    if mode == 'fit':
+        return None, None
+    if latest_version(MODEL_SETTINGS['model_dir']) is None:
+        if mode == 'transform':
+            raise FileNotFoundError(f"transform 模式需要已保存的模型，请先运行 fit：{MODEL_SETTINGS['model_dir']}")
+        print("ℹ️ 尚无已保存的模型，执行拟合")
+        return None, None
+
+    tfidf, version, info = load_model(MODEL_SETTINGS['model_dir'], MODEL_SETTINGS['version'])
+    age = model_age_days(info)
+    if mode == 'auto' and age > MODEL_SETTINGS['refit_days']:
+        print(f"ℹ️ 模型 {version} 已拟合 {age:.1f} 天，超过 {MODEL_SETTINGS['refit_days']} 天，重新拟合")
+        return None, None
+    print(f"✅ 已加载TF-IDF模型：{version}（拟合于 {age:.1f} 天前，{info['n_docs']} 篇文档）")
+    return tfidf, version
+
+
+def load_incremental_context(row_keys, version):
+    """检查增量条件，满足时返回 (上次行键, 需重算的行下标)，否则返回 None
+
+    词表与 IDF 固定后每行只取决于本行文本，因此未变更行可直接复用。
+    """
+    settings = INCREMENTAL_SETTINGS
+    if not settings['enabled'] or settings['full_rebuild']:
+        return None
+    if not os.path.exists(settings['state_path']) or not os.path.exists(_previous_matrix_path()):
+        return None
+
+    meta = DocumentState(settings['state_path']).meta
+    if meta.get('pending_full_rebuild', True):
+        return None
+    # 上次矩阵必须由同一版本模型生成，text_pairs 必须来自记录状态的那次批量运行
+    if meta.get('tfidf_model_version') != version:
+        return None
+    if meta.get('text_pairs_stamp') != _file_stamp(INPUT_PATH):
+        return None
+
+    previous_keys = load_tfidf_npz(_previous_matrix_path()).row_keys if SPARSE_OUTPUT['enabled'] else None
+    if not previous_keys:
+        return None
+    pending = set(meta.get('pending_changed_doc_ids', []))
+    previous = set(previous_keys)
+    dirty = [i for i, key in enumerate(row_keys)
+             if key.rsplit(':', 1)[0] in pending or key not in previous]
+    return previous_keys, dirty
+
+
+def _previous_matrix_path():
+    """上次运行的矩阵文件（稀疏优先）"""
+    return SPARSE_OUTPUT['npz_file'] if SPARSE_OUTPUT['enabled'] else OUTPUT_FILE
+
+
+def load_previous_matrix():
+    """读取上次运行的矩阵（CSR）"""
+    path = _previous_matrix_path()
+    if path.endswith('.npz'):
+        return load_tfidf_npz(path).matrix
+    previous = pd.read_csv(path, index_col=0, encoding=OUTPUT_SETTINGS['encoding'])
+    return sp.csr_matrix(previous.values)
+
+
+def splice_rows(previous, previous_keys, row_keys, dirty, dirty_rows):
+    """用上次矩阵的未变更行 + 本次重算的行拼出新矩阵（全程稀疏）"""
+    position = {key: i for i, key in enumerate(previous_keys)}
+    dirty_position = {i: previous.shape[0] + j for j, i in enumerate(dirty)}
+    order = [dirty_position.get(i, position.get(key)) for i, key in enumerate(row_keys)]
+    return sp.vstack([previous, dirty_rows], format='csr')[order]
+
+
+def save_outputs(matrix, doc_ids, features, row_keys, doc_index_written=False):
+    """保存TF-IDF结果：稀疏 .npz + 长表 + 文档表，可选旧版稠密CSV"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if SPARSE_OUTPUT['enabled']:
+        save_tfidf_npz(SPARSE_OUTPUT['npz_file'], matrix, doc_ids, features, row_keys)
+        write_long_format(SPARSE_OUTPUT['long_file'], matrix, doc_ids, features,
+                          OUTPUT_SETTINGS['float_format'])
+        if not doc_index_written:
+            write_doc_index(SPARSE_OUTPUT['docs_file'], doc_ids)
+        write_sas_import(SPARSE_OUTPUT['sas_import_file'], matrix.shape[0], matrix.shape[1], matrix.nnz,
+                         SPARSE_OUTPUT['long_file'], SPARSE_OUTPUT['docs_file'])
+        print(f"✅ 稀疏矩阵已保存：{SPARSE_OUTPUT['npz_file']}（非零项 {matrix.nnz}）")
+    if SPARSE_OUTPUT['dense_csv'] or not SPARSE_OUTPUT['enabled']:
+        df_matrix = pd.DataFrame(matrix.toarray(), index=doc_ids, columns=features)
+        df_matrix.to_csv(OUTPUT_FILE, **OUTPUT_SETTINGS)
+        print(f"✅ 成功生成兼容旧版格式的文件：{OUTPUT_FILE}")
+
+
+def save_run_state(version):
+    """记录本次矩阵所用的模型版本，并清空待处理变更"""
+    settings = INCREMENTAL_SETTINGS
+    if not settings['enabled'] or not os.path.exists(settings['state_path']):
+        return
+    state = DocumentState(settings['state_path'])
+    state.meta['tfidf_model_version'] = version
+    state.meta['pending_changed_doc_ids'] = []
+    state.meta['pending_full_rebuild'] = False
+    state.save()
+
+
+def iter_text_batches(path, batch_size):
+    """按列依次流式产出文本批次：先全部初稿、再全部终稿，与 build_row_keys 的行顺序一致"""
+    for column in ('draft_clean', 'final_clean'):
+        for batch in iter_text_pairs(path, columns=[column], batch_size=batch_size):
+            yield batch[column].fillna("").tolist()
+
+
+def online_main():
+    """在线模式：小批量消费文档，DF 计数器逐批更新 IDF
+    每批结果随即追加到磁盘（CsrSpill）与文档表，常驻内存只有一个批次 + 固定大小的状态；
+    矩阵以内存映射方式组装，长表、.npz 按块从磁盘写出。只输出本次实际出现过的哈希桶（按首次出现排列）"""
+    settings = ONLINE_SETTINGS
+    try:
+        print("[1/3] 读取文档ID...")
+        doc_ids = read_text_pairs(INPUT_PATH, columns=['doc_id'])['doc_id'].astype(str)
+        row_keys = build_row_keys(doc_ids)
+
+        if settings['resume'] and os.path.exists(settings['state_file']):
+            vectorizer = OnlineTfidfVectorizer.load(settings['state_file'])
+            print(f"✅ 已加载在线向量器状态：累计 {vectorizer.n_docs} 篇文档")
+        else:
+            vectorizer = OnlineTfidfVectorizer(
+                n_features=settings['n_features'],
+                token_pattern=FEATURE_SETTINGS['token_pattern'],
+                norm=FEATURE_SETTINGS['norm']
+            )
+
+        print(f"[2/3] 哈希向量化（{settings['n_features']} 桶，每批 {settings['batch_size']} 篇）...")
+        spill = CsrSpill(settings['spill_dir'])
+        column_of = np.full(settings['n_features'], -1, dtype=np.int64)  # 桶号 -> 输出列号
+        buckets = []  # 输出列对应的桶号
+        n_rows = 0
+        for texts in iter_text_batches(INPUT_PATH, settings['batch_size']):
+            block = vectorizer.partial_fit_transform(texts)
+            new = np.unique(block.indices)
+            new = new[column_of[new] < 0]
+            column_of[new] = np.arange(len(buckets), len(buckets) + len(new))
+            buckets.extend(new.tolist())
+            block.indices = column_of[block.indices].astype(np.int32)
+            spill.append(block)
+            write_doc_index(SPARSE_OUTPUT['docs_file'], [f"doc{i + 1}" for i in range(n_rows, n_rows + block.shape[0])],
+                            start=n_rows, append=n_rows > 0)
+            n_rows += block.shape[0]
+            print(f"  已处理 {n_rows}/{len(row_keys)} 篇")
+        if n_rows == 0:
+            write_doc_index(SPARSE_OUTPUT['docs_file'], [])
+        tfidf_matrix = spill.matrix(len(buckets))
+
+        print("[3/3] 保存结果...")
+        names = vectorizer.feature_names()
+        features = clean_feature_names([names[b] for b in buckets])
+        doc_labels = [f"doc{i + 1}" for i in range(n_rows)]
+        save_outputs(tfidf_matrix, doc_labels, features, row_keys, doc_index_written=True)
+        vectorizer.save(settings['state_file'], used_buckets=buckets)  # 须在矩阵之后写出，可视化据此判断对照表是否对应当前矩阵
+        save_run_state('online')  # 该矩阵不对应已保存的模型版本，下次常规运行全量转换
+        print(f"特征维度：{tfidf_matrix.shape[1]}（已用桶）| 文档数量：{tfidf_matrix.shape[0]} | 非零项：{tfidf_matrix.nnz}")
+        return TfidfBundle(tfidf_matrix, doc_labels, features, row_keys)
+
+    except Exception as e:
+        print(f"\n❌ 错误：{str(e)}")
+        print("应急处理：")
+        print("1. 检查输入文件是否包含draft_clean/final_clean列")
+        print("2. 哈希桶数变化后需关闭 resume 重新累计")
+
+
+def main(mode=None, df=None):
+    """建模主流程；df 为预处理阶段在内存中传入的 text_pairs（省去重新读取），返回 TfidfBundle，失败返回 None"""
+    if mode == 'online' or (mode is None and ONLINE_SETTINGS['enabled']):
+        return online_main()
+    mode = mode or MODEL_SETTINGS['mode']
     try:
         # === 数据加载 ===
-        print("[1/4] 读取输入文件...")
-        df = pd.read_csv(INPUT_PATH, encoding='utf_8_sig')
+        if df is None:
+            print("[1/4] 读取输入文件...")
+            # 列式文件只读取清洗后的两列，不加载原文
+            df = read_text_pairs(INPUT_PATH, columns=['doc_id', 'draft_clean', 'final_clean'])
+        else:
+            print("[1/4] 使用内存中的预处理结果...")
+        df = df[['doc_id', 'draft_clean', 'final_clean']].fillna("")
 
         # === 文本合并 ===
         all_texts = pd.concat([df['draft_clean'], df['final_clean']], ignore_index=True)
+        row_keys = build_row_keys(df['doc_id'].astype(str))
         print(f"[2/4] 合并完成，文档总数：{len(all_texts)}")
 
         # === 核心建模 ===
-        print("[3/4] 计算TF-IDF矩阵...")
-        tfidf = TfidfVectorizer(**FEATURE_SETTINGS)
-        tfidf_matrix = tfidf.fit_transform(all_texts)
+        tfidf, version = resolve_model(mode)
+        context = load_incremental_context(row_keys, version) if tfidf is not None else None
+        if context is not None:
+            previous_keys, dirty = context
+            print(f"[3/4] 增量更新TF-IDF矩阵：重算 {len(dirty)}/{len(row_keys)} 行...")
+            dirty_rows = (tfidf.transform(all_texts.iloc[dirty]) if dirty
+                          else sp.csr_matrix((0, len(tfidf.vocabulary_))))
+            tfidf_matrix = splice_rows(load_previous_matrix(), previous_keys, row_keys, dirty, dirty_rows)
+        elif tfidf is not None:
+            print(f"[3/4] 使用模型 {version} 转换TF-IDF矩阵...")
+            tfidf_matrix = tfidf.transform(all_texts)
+        else:
+            print("[3/4] 拟合TF-IDF矩阵...")
+            tfidf = TfidfVectorizer(**FEATURE_SETTINGS)
+            tfidf_matrix = tfidf.fit_transform(all_texts)
+            version = save_model(tfidf, MODEL_SETTINGS['model_dir'], len(all_texts))
 
         # === 格式标准化 ===
         print("[4/4] 执行格式处理...")
@@ -56,19 +299,12 @@ def main():
         # 生成文档ID（与旧版完全一致）
         doc_ids = [f"doc{i + 1}" for i in range(len(all_texts))]
 
-        # 构建DataFrame
-        df_matrix = pd.DataFrame(
-            tfidf_matrix.toarray(),
-            index=doc_ids,
-            columns=features
-        )
-
         # === 保存结果 ===
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        df_matrix.to_csv(OUTPUT_FILE, **OUTPUT_SETTINGS)
+        save_outputs(tfidf_matrix, doc_ids, features, row_keys)
+        save_run_state(version)
 
-        print(f"✅ 成功生成兼容旧版格式的文件：{OUTPUT_FILE}")
-        print(f"特征维度：{df_matrix.shape[1]} | 文档数量：{df_matrix.shape[0]}")
+        print(f"特征维度：{tfidf_matrix.shape[1]} | 文档数量：{tfidf_matrix.shape[0]}")
+        return TfidfBundle(tfidf_matrix, doc_ids, features, row_keys)
 
     except Exception as e:
         print(f"\n❌ 错误：{str(e)}")
@@ -78,4 +314,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 用法：python 建模.py [fit|refit|transform|auto|online]
+    #   refit 与 fit 相同，供定期（如每周）计划任务重新拟合词表与 IDF
+    #   online 为哈希在线模式（见 ONLINE_SETTINGS）
+    arg = sys.argv[1] if len(sys.argv) > 1 else None
+    if arg not in (None, 'fit', 'refit', 'transform', 'auto', 'online'):
+        print("用法：python 建模.py [fit|refit|transform|auto|online]")
+        sys.exit(1)
+    main('fit' if arg == 'refit' else arg)
\ No newline at end of file